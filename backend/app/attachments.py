@@ -0,0 +1,393 @@
+import hashlib
+import json
+import os
+import re
+import time
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are only serialised within one worker
+    fcntl = None
+
+# Attachment storage on local disk (served under /uploads by main.py).
+# Content-addressed: every blob is stored once as uploads/cas/<aa>/<bb>/<sha256><ext>, so
+# the same file shared in many rooms takes the space of one and the directories stay
+# small. Files uploaded before this layout keep their flat uploads/<ts>_<name> URLs.
+#
+#   MYCAMPUS_UPLOADS_DIR         where attachments are stored (default: app/uploads)
+#   MYCAMPUS_UPLOAD_MAX_BYTES    largest accepted attachment (default 512 MiB)
+#   MYCAMPUS_UPLOAD_CHUNK_BYTES  largest chunk per resumable PUT, also the copy buffer (default 8 MiB)
+#   MYCAMPUS_UPLOAD_SESSION_TTL  seconds an unfinished resumable upload is kept (default 24 h)
+#   MYCAMPUS_BLOB_GC_GRACE       seconds an unreferenced blob is kept before GC (default 24 h);
+#                                uploads happen before the message that references them is sent
+#   MYCAMPUS_BLOB_GC_INTERVAL    seconds between background GC runs, 0 disables (default 1 h)
+
+UPLOADS_DIR = os.environ.get('MYCAMPUS_UPLOADS_DIR') or os.path.join(os.path.dirname(__file__), 'uploads')
+PARTIAL_DIR = os.path.join(UPLOADS_DIR, '.partial')
+CAS_DIR = os.path.join(UPLOADS_DIR, 'cas')
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MYCAMPUS_UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+CHUNK_BYTES = int(os.environ.get('MYCAMPUS_UPLOAD_CHUNK_BYTES', str(8 * 1024 * 1024)))
+SESSION_TTL = float(os.environ.get('MYCAMPUS_UPLOAD_SESSION_TTL', str(24 * 3600)))
+GC_GRACE = float(os.environ.get('MYCAMPUS_BLOB_GC_GRACE', str(24 * 3600)))
+GC_INTERVAL = float(os.environ.get('MYCAMPUS_BLOB_GC_INTERVAL', '3600'))
+COPY_BUFFER = 1024 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_CAS_URL_RE = re.compile(r'/uploads/cas/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})')
+_EXT_RE = re.compile(r'^\.[A-Za-z0-9]{1,10}$')
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadNotFound(Exception):
+    pass
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected: int):
+        super().__init__(f'expected offset {expected}')
+        self.expected = expected
+
+def safe_name(filename: Optional[str]) -> str:
+    # Keep the original name readable but never let it escape the uploads directory
+    name = os.path.basename(filename or 'file').replace('\x00', '')
+    return name or 'file'
+
+def _ext(filename: Optional[str]) -> str:
+    # Kept on the blob so StaticFiles can still guess the content type
+    ext = os.path.splitext(safe_name(filename))[1].lower()
+    return ext if _EXT_RE.match(ext) else ''
+
+def blob_dir(sha256: str) -> str:
+    return os.path.join(CAS_DIR, sha256[:2], sha256[2:4])
+
+def find_blob(sha256: str) -> Optional[str]:
+    # Stored path relative to UPLOADS_DIR, or None. The shard directory holds a handful of
+    # files at most, so the listing is cheap.
+    if not _SHA256_RE.match(sha256 or ''):
+        return None
+    d = blob_dir(sha256)
+    try:
+        for name in os.listdir(d):
+            if name.startswith(sha256) and not name.endswith('.tmp'):
+                return os.path.relpath(os.path.join(d, name), UPLOADS_DIR).replace(os.sep, '/')
+    except FileNotFoundError:
+        pass
+    return None
+
+def commit_blob(tmp_path: str, sha256: str, filename: Optional[str], size: int, mime: Optional[str]) -> tuple[str, bool]:
+    # Moves a fully written temp file into the store and registers it. If the content is
+    # already there the temp file is dropped and the existing blob is left untouched.
+    # Returns (relpath, created).
+    from .db import engine
+    now = _now_iso()
+    with engine.begin() as conn:
+        # Upsert first: it takes the write lock, and the collector only deletes a row and
+        # unlinks its file while holding that lock, so the file found (or written) below
+        # is still there when this commits. A re-upload refreshes last_seen_at so the GC
+        # grace period covers the message that is about to reference it.
+        conn.exec_driver_sql(
+            "INSERT INTO attachment_blobs (sha256, path, size, mime, ref_count, created_at, last_seen_at) "
+            "VALUES (?, '', ?, ?, 0, ?, ?) "
+            "ON CONFLICT(sha256) DO UPDATE SET last_seen_at = excluded.last_seen_at",
+            (sha256, size, mime, now, now),
+        )
+        existing = find_blob(sha256)
+        if existing:
+            os.remove(tmp_path)
+            stored_as, created = existing, False
+        else:
+            d = blob_dir(sha256)
+            os.makedirs(d, exist_ok=True)
+            dest = os.path.join(d, sha256 + _ext(filename))
+            os.replace(tmp_path, dest)
+            stored_as, created = os.path.relpath(dest, UPLOADS_DIR).replace(os.sep, '/'), True
+        conn.exec_driver_sql(
+            "UPDATE attachment_blobs SET path = ? WHERE sha256 = ? AND path != ?", (stored_as, sha256, stored_as)
+        )
+    return stored_as, created
+
+def blob_refs(meta: Optional[str]) -> set[str]:
+    # SHA-256s of the stored blobs a message's meta JSON points at: any "sha256" value or
+    # /uploads/cas/... URL, at any depth (meta.attachment, meta.attachments[], ...)
+    if not meta:
+        return set()
+    try:
+        data = json.loads(meta)
+    except (TypeError, ValueError):
+        return set()
+    refs: set[str] = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for key, value in item.items():
+                if key == 'sha256' and isinstance(value, str) and _SHA256_RE.match(value):
+                    refs.add(value)
+                else:
+                    stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, str):
+            m = _CAS_URL_RE.search(item)
+            if m:
+                refs.add(m.group(1))
+    return refs
+
+def describe(original: Optional[str], stored_as: str, mime: Optional[str], size: int, sha256: str) -> dict:
+    # Response shape of POST /uploads
+    return {
+        'filename': original,
+        'stored_as': stored_as,
+        'url': f"/uploads/{stored_as}",
+        'mime': mime,
+        'size': size,
+        'sha256': sha256,
+    }
+
+def save_stream(src: BinaryIO, filename: Optional[str], mime: Optional[str], max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[str, int, str, bool]:
+    # Copies src into the store COPY_BUFFER bytes at a time, hashing as it goes.
+    # Returns (stored_as, size, sha256, created); nothing is left behind if the limit is exceeded.
+    os.makedirs(CAS_DIR, exist_ok=True)
+    tmp = os.path.join(CAS_DIR, uuid.uuid4().hex + '.tmp')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, 'wb') as out:
+            while True:
+                chunk = src.read(COPY_BUFFER)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        stored_as, created = commit_blob(tmp, sha256, filename, size, mime)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return stored_as, size, sha256, created
+
+# ---- Resumable uploads: init / PUT chunk at offset / finalize ----
+# State lives next to the partial file so any worker can continue a session. The running
+# SHA-256 is kept in memory by the worker that received the chunks; if a session moves
+# to another worker the hash is recomputed from the partial file at finalize.
+
+_hashers: dict[str, tuple[int, 'hashlib._Hash']] = {}
+_fallback_lock = threading.Lock()
+
+def _paths(upload_id: str) -> tuple[str, str]:
+    if not _UPLOAD_ID_RE.match(upload_id):
+        raise UploadNotFound()
+    return os.path.join(PARTIAL_DIR, upload_id + '.part'), os.path.join(PARTIAL_DIR, upload_id + '.json')
+
+@contextmanager
+def _session_lock(part: str):
+    # One writer per session at a time, across threads and workers: an exclusive flock on
+    # the partial file (each open() is its own lock owner, so threads contend too)
+    if fcntl is None:
+        with _fallback_lock:
+            yield
+        return
+    try:
+        fd = os.open(part, os.O_RDWR)
+    except FileNotFoundError:
+        raise UploadNotFound()
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def create_session(filename: Optional[str], size: int, mime: Optional[str], sha256: Optional[str] = None) -> dict:
+    # A client-computed sha256 is kept and checked at finalize. It never stands in for the
+    # bytes: a hash alone proves nothing about holding the content.
+    if size < 0 or size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge()
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    _cleanup_expired()
+    upload_id = uuid.uuid4().hex
+    part, meta = _paths(upload_id)
+    info = {'filename': filename, 'size': size, 'mime': mime, 'sha256': (sha256 or '').lower() or None, 'created': time.time()}
+    with open(meta, 'w') as f:
+        json.dump(info, f)
+    open(part, 'wb').close()
+    _hashers[upload_id] = (0, hashlib.sha256())
+    return {'upload_id': upload_id, 'offset': 0, 'size': size, 'chunk_size': CHUNK_BYTES}
+
+def session_info(upload_id: str) -> dict:
+    part, meta = _paths(upload_id)
+    try:
+        with open(meta) as f:
+            info = json.load(f)
+        offset = os.path.getsize(part)
+    except FileNotFoundError:
+        raise UploadNotFound()
+    return {'upload_id': upload_id, 'offset': offset, 'size': info['size'], 'chunk_size': CHUNK_BYTES,
+            'filename': info['filename'], 'mime': info['mime'], 'sha256': info.get('sha256')}
+
+def write_chunk(upload_id: str, offset: int, data: bytes) -> int:
+    # Appends data at offset; the offset must match what is already on disk, so a client
+    # that lost a response just asks for the session offset and resends from there. The
+    # check and the write happen under the session lock: of two overlapping retries of
+    # one chunk, the second gets the offset mismatch instead of appending it again.
+    part, _ = _paths(upload_id)
+    with _session_lock(part):
+        info = session_info(upload_id)
+        if offset != info['offset']:
+            raise OffsetMismatch(info['offset'])
+        if len(data) > CHUNK_BYTES or offset + len(data) > info['size']:
+            raise UploadTooLarge()
+        try:
+            # Not 'ab': a session aborted meanwhile must not get its partial file back
+            f = open(part, 'r+b')
+        except FileNotFoundError:
+            raise UploadNotFound()
+        with f:
+            f.seek(offset)
+            f.write(data)
+        state = _hashers.get(upload_id)
+        if state is not None and state[0] == offset:
+            state[1].update(data)
+            _hashers[upload_id] = (offset + len(data), state[1])
+        else:
+            _hashers.pop(upload_id, None)
+    return offset + len(data)
+
+def finalize_session(upload_id: str, expected_sha256: Optional[str] = None) -> dict:
+    part, meta = _paths(upload_id)
+    with _session_lock(part):
+        info = session_info(upload_id)
+        if info['offset'] != info['size']:
+            raise OffsetMismatch(info['offset'])
+        state = _hashers.pop(upload_id, None)
+        if state is not None and state[0] == info['size']:
+            sha256 = state[1].hexdigest()
+        else:
+            digest = hashlib.sha256()
+            with open(part, 'rb') as f:
+                for chunk in iter(lambda: f.read(COPY_BUFFER), b''):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        expected_sha256 = expected_sha256 or info['sha256']
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise ValueError('sha256 mismatch')
+        stored_as, _ = commit_blob(part, sha256, info['filename'], info['size'], info['mime'])
+        os.remove(meta)
+    return describe(info['filename'], stored_as, info['mime'], info['size'], sha256)
+
+def abort_session(upload_id: str):
+    part, meta = _paths(upload_id)
+    _hashers.pop(upload_id, None)
+    for path in (part, meta):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _cleanup_expired():
+    cutoff = time.time() - SESSION_TTL
+    for name in os.listdir(PARTIAL_DIR):
+        path = os.path.join(PARTIAL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# ---- Blob registry and garbage collection ----
+# attachment_blobs has one row per stored blob with the number of live messages whose
+# meta references it (kept by chat.send_message / delete_message). The collector removes
+# blobs at zero references once they are older than the grace period, after checking
+# that no non-deleted message mentions them.
+
+def _now_iso(delta: float = 0.0) -> str:
+    return (datetime.utcnow() + timedelta(seconds=delta)).isoformat(timespec='seconds') + 'Z'
+
+def recount_refs(conn) -> int:
+    # Rebuild ref_count from message meta (full scan; repair tool, not the hot path)
+    counts: dict[str, int] = {}
+    rows = conn.exec_driver_sql("SELECT meta FROM messages WHERE deleted = 0 AND meta IS NOT NULL")
+    for (meta,) in rows:
+        for sha in blob_refs(meta):
+            counts[sha] = counts.get(sha, 0) + 1
+    conn.exec_driver_sql("UPDATE attachment_blobs SET ref_count = 0")
+    if counts:
+        conn.exec_driver_sql(
+            "UPDATE attachment_blobs SET ref_count = ? WHERE sha256 = ?",
+            [(n, sha) for sha, n in counts.items()],
+        )
+    return len(counts)
+
+def _register_untracked(conn):
+    # Blobs on disk without a row (e.g. written before the row insert failed)
+    now = _now_iso()
+    for root, _, files in os.walk(CAS_DIR):
+        for name in files:
+            sha = name[:64]
+            if name.endswith('.tmp') or not _SHA256_RE.match(sha):
+                continue
+            path = os.path.join(root, name)
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO attachment_blobs (sha256, path, size, mime, ref_count, created_at, last_seen_at) "
+                "VALUES (?, ?, ?, NULL, 0, ?, ?)",
+                (sha, os.path.relpath(path, UPLOADS_DIR).replace(os.sep, '/'), os.path.getsize(path), now, now),
+            )
+
+def collect_garbage(grace: float = GC_GRACE, recount: bool = False) -> dict:
+    from .db import engine
+    removed = kept = freed = 0
+    cutoff = _now_iso(-grace)
+    with engine.begin() as conn:
+        if recount:
+            _register_untracked(conn)
+            recount_refs(conn)
+        candidates = conn.exec_driver_sql(
+            "SELECT sha256, path, size FROM attachment_blobs WHERE ref_count <= 0 AND last_seen_at < ?",
+            (cutoff,),
+        ).fetchall()
+    for sha, path, size in candidates:
+        with engine.begin() as conn:
+            still_used = conn.exec_driver_sql(
+                "SELECT 1 FROM messages WHERE deleted = 0 AND meta LIKE ? LIMIT 1", (f'%{sha}%',)
+            ).first()
+            if still_used:
+                conn.exec_driver_sql("UPDATE attachment_blobs SET ref_count = 1 WHERE sha256 = ?", (sha,))
+                kept += 1
+                continue
+            # The condition is checked again by the DELETE: an upload of the same content
+            # since the SELECT refreshed last_seen_at (or a send took a reference) and the
+            # blob stays
+            deleted = conn.exec_driver_sql(
+                "DELETE FROM attachment_blobs WHERE sha256 = ? AND ref_count <= 0 AND last_seen_at < ?",
+                (sha, cutoff),
+            ).rowcount
+            if not deleted:
+                kept += 1
+                continue
+            # Unlinked before the commit, while this transaction holds the write lock, so
+            # no commit_blob for the same content can find the file and then lose it
+            try:
+                os.remove(os.path.join(UPLOADS_DIR, path))
+            except FileNotFoundError:
+                pass
+        removed += 1
+        freed += size or 0
+    return {'removed': removed, 'kept': kept, 'bytes_freed': freed}
+
+if __name__ == '__main__':
+    # cd backend && python -m app.attachments gc [--recount] [--grace SECONDS]
+    args = sys.argv[1:]
+    if not args or args[0] != 'gc':
+        print('usage: python -m app.attachments gc [--recount] [--grace SECONDS]')
+        sys.exit(2)
+    grace = float(args[args.index('--grace') + 1]) if '--grace' in args else GC_GRACE
+    print(collect_garbage(grace=grace, recount='--recount' in args))
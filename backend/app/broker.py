@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+# Fan-out transport behind ConnectionManager.broadcast.
+# A broker takes (room_id, event) from whichever worker handled the request and hands
+# it to `deliver` in every worker that may hold sockets for that room.
+#
+#   MYCAMPUS_BROKER=memory   single process (default)
+#   MYCAMPUS_BROKER=sqlite   several uvicorn workers on one host, sharing an event log
+#   MYCAMPUS_BROKER_PATH     event log file for the sqlite broker (default: app/broker.db)
+#   MYCAMPUS_BROKER_POLL_MS  poll interval for the sqlite broker (default: 25)
+
+Deliver = Callable[[int, dict], Awaitable[None]]
+
+class Broker(ABC):
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    @abstractmethod
+    async def publish(self, room_id: int, message: dict) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+class InProcessBroker(Broker):
+    # Current behaviour: only sockets held by this process are reached.
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def publish(self, room_id: int, message: dict) -> None:
+        if self._deliver is not None:
+            await self._deliver(room_id, message)
+
+class SQLiteLogBroker(Broker):
+    # Append-only event log in its own WAL-mode SQLite file. Each worker delivers its own
+    # events immediately and tails the log for events written by the other workers.
+    def __init__(self, path: str, poll_interval: float = 0.025, retention: float = 60.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS broker_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, room_id INTEGER NOT NULL, "
+            "origin TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        return conn
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._conn = await asyncio.to_thread(self._open)
+        # Only events published after this worker came up are of interest
+        self._last_id = await asyncio.to_thread(self._query_one, "SELECT COALESCE(MAX(id), 0) FROM broker_events")
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _query_one(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def _append(self, room_id: int, payload: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO broker_events (room_id, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+                (room_id, self.origin, payload, time.time()),
+            )
+
+    def _read_new(self) -> list[tuple[int, int, str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, room_id, origin, payload FROM broker_events WHERE id > ? ORDER BY id",
+                (self._last_id,),
+            ).fetchall()
+
+    def _prune(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM broker_events WHERE created_at < ?", (time.time() - self.retention,))
+
+    async def publish(self, room_id: int, message: dict) -> None:
+        await asyncio.to_thread(self._append, room_id, json.dumps(message))
+        if self._deliver is not None:
+            await self._deliver(room_id, message)
+
+    async def _poll_loop(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            try:
+                for event_id, room_id, origin, payload in await asyncio.to_thread(self._read_new):
+                    # Our own events were delivered at publish time
+                    if origin != self.origin:
+                        try:
+                            await self._deliver(room_id, json.loads(payload))
+                        except Exception:
+                            # Skip just this event: the rest of the batch still goes out
+                            pass
+                    self._last_id = event_id
+                if time.monotonic() - last_prune > self.retention:
+                    await asyncio.to_thread(self._prune)
+                    last_prune = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Keep tailing; a transient lock must not stop fan-out
+                pass
+            await asyncio.sleep(self.poll_interval)
+
+def broker_from_env() -> Broker:
+    kind = os.environ.get("MYCAMPUS_BROKER", "memory").lower()
+    if kind == "memory":
+        return InProcessBroker()
+    if kind == "sqlite":
+        default = Path(__file__).resolve().parent / "broker.db"
+        path = os.environ.get("MYCAMPUS_BROKER_PATH", default.as_posix())
+        poll_ms = float(os.environ.get("MYCAMPUS_BROKER_POLL_MS", "25"))
+        return SQLiteLogBroker(path, poll_interval=poll_ms / 1000.0)
+    raise ValueError(f"Unknown MYCAMPUS_BROKER: {kind!r}")
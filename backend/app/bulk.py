@@ -0,0 +1,260 @@
+import asyncio
+import csv
+import io
+import json
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Table, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Bulk import / export for whole tables (routers/bulk.py exposes them per table).
+# Import reads the request body as it arrives: chunks go through a small bounded queue
+# to a parser thread (csv / NDJSON over a file-like view of the queue), rows are
+# validated with the API's pydantic model plus the rules its write endpoints apply
+# (TableSpec.check), and inserted with executemany in batches,
+# one transaction per batch so other writers get the lock in between. Rows that fail
+# validation or a constraint are reported by row number and skipped; the rest commit.
+# A file that cannot be read further (bad UTF-8, broken CSV quoting) ends the import with
+# ValueError, after the rows before it have committed.
+# Export streams rows from a server-side cursor in partitions and encodes each
+# partition on its own, so memory is bounded by the partition size, not the table.
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+EXPORT_PARTITION = 1000
+QUEUE_CHUNKS = 16
+
+class TableSpec:
+    def __init__(
+        self,
+        name: str,
+        table: Table,
+        schema: type[BaseModel],
+        optional_id: bool = False,
+        after_insert: Optional[Callable[[Connection, list[dict]], None]] = None,
+        decode: Optional[Callable[[dict], dict]] = None,
+        check: Optional[Callable[[BaseModel], None]] = None,
+        encode: Optional[Callable[[dict], dict]] = None,
+        export_partition: Optional[Callable[[AsyncConnection, list], Awaitable[list]]] = None,
+    ):
+        self.name = name
+        self.table = table
+        self.schema = schema
+        # id may be left out (autoincrement); otherwise the file supplies it
+        self.optional_id = optional_id
+        # Runs in the batch's transaction with the rows that were inserted
+        self.after_insert = after_insert
+        # Parsed record -> record for the schema (e.g. a JSON column read from CSV text)
+        self.decode = decode
+        # Rules beyond the schema that the API's write endpoints enforce; raises ValueError
+        self.check = check
+        # Validated values -> table row
+        self.encode = encode
+        # Rewrites one export partition of rows (in `columns` order) before encoding
+        self.export_partition = export_partition
+        self.columns = list(schema.model_fields)
+
+class _QueueReader(io.RawIOBase):
+    # File-like view over byte chunks handed over by the event loop; None marks EOF
+    def __init__(self, chunks: "queue.Queue[Optional[bytes]]"):
+        self.chunks = chunks
+        self.pending = b""
+        self.eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending and not self.eof:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+            else:
+                self.pending = chunk
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+def _records(stream: io.TextIOBase, fmt: str):
+    # (row number, dict) pairs; a line that cannot be parsed yields its error instead
+    if fmt == "csv":
+        # strict: an unterminated quote is an error instead of swallowing the rest of the file
+        reader = csv.DictReader(stream, strict=True)
+        try:
+            for n, record in enumerate(reader, 1):
+                record.pop(None, None)  # surplus fields
+                yield n, {k: (v if v != "" else None) for k, v in record.items()}
+        except csv.Error as exc:
+            # The reader cannot resynchronise after a broken record, so the import stops
+            # there; line_num counts the lines of the records read before it
+            raise ValueError(f"line {reader.line_num + 1}: {exc}") from None
+        return
+    n = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        n += 1
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield n, ValueError(f"invalid JSON: {exc}")
+            continue
+        yield n, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+class _Importer:
+    def __init__(self, engine, spec: TableSpec, batch_size: int, max_errors: int):
+        self.engine = engine
+        self.spec = spec
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.report = {"rows": 0, "inserted": 0, "failed": 0, "batches": 0, "errors": [], "errors_truncated": False}
+
+    def _error(self, row: int, message: str):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < self.max_errors:
+            self.report["errors"].append({"row": row, "error": message})
+        else:
+            self.report["errors_truncated"] = True
+
+    def _validate(self, record: dict) -> dict:
+        spec = self.spec
+        if spec.decode is not None:
+            record = spec.decode(record)
+        no_id = spec.optional_id and record.get("id") is None
+        if no_id:
+            record = {**record, "id": 0}
+        model = spec.schema.model_validate(record)
+        if spec.check is not None:
+            spec.check(model)
+        values = model.model_dump()
+        if no_id:
+            del values["id"]
+        return spec.encode(values) if spec.encode is not None else values
+
+    def _insert(self, conn: Connection, rows: list[dict]):
+        conn.execute(insert(self.spec.table), rows)
+        if self.spec.after_insert is not None:
+            self.spec.after_insert(conn, rows)
+
+    def _flush(self, batch: list[tuple[int, dict]]):
+        if not batch:
+            return
+        self.report["batches"] += 1
+        try:
+            with self.engine.begin() as conn:
+                self._insert(conn, [values for _, values in batch])
+            self.report["inserted"] += len(batch)
+            return
+        except DBAPIError:
+            pass
+        # Some row broke a constraint: redo the batch a row at a time to find it
+        for n, values in batch:
+            try:
+                with self.engine.begin() as conn:
+                    self._insert(conn, [values])
+                self.report["inserted"] += 1
+            except DBAPIError as exc:
+                self._error(n, str(exc.orig))
+
+    def run(self, stream: io.TextIOBase, fmt: str) -> dict:
+        batch: list[tuple[int, dict]] = []
+        try:
+            for n, record in _records(stream, fmt):
+                self.report["rows"] += 1
+                if isinstance(record, Exception):
+                    self._error(n, str(record))
+                    continue
+                try:
+                    batch.append((n, self._validate(record)))
+                except ValidationError as exc:
+                    self._error(n, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()))
+                    continue
+                except ValueError as exc:
+                    self._error(n, str(exc))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+        except ValueError as exc:
+            # The file stops being readable here; keep what came before it
+            self._flush(batch)
+            raise ValueError(f"{exc} ({self.report['inserted']} rows before it were imported)") from None
+        self._flush(batch)
+        # Constraint failures are found when their batch is flushed, after later rows may
+        # have failed validation
+        self.report["errors"].sort(key=lambda e: e["row"])
+        return self.report
+
+async def import_stream(
+    engine,
+    spec: TableSpec,
+    body: AsyncIterator[bytes],
+    fmt: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_errors: int = MAX_REPORTED_ERRORS,
+) -> dict:
+    chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=QUEUE_CHUNKS)
+    finished = threading.Event()
+    importer = _Importer(engine, spec, batch_size, max_errors)
+
+    def _parse() -> dict:
+        try:
+            stream = io.TextIOWrapper(io.BufferedReader(_QueueReader(chunks)), encoding="utf-8-sig", newline="")
+            return importer.run(stream, fmt)
+        finally:
+            finished.set()
+
+    def _put(item: Optional[bytes]) -> bool:
+        # Blocks while the parser is behind (backpressure on the upload); gives up if it died
+        while not finished.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    task = asyncio.ensure_future(asyncio.to_thread(_parse))
+    try:
+        async for chunk in body:
+            if chunk and not await asyncio.to_thread(_put, chunk):
+                break
+    finally:
+        await asyncio.to_thread(_put, None)
+    return await task
+
+async def export_stream(async_engine, spec: TableSpec, fmt: str) -> AsyncIterator[bytes]:
+    columns = [spec.table.c[name] for name in spec.columns]
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(spec.columns)
+        yield out.getvalue().encode()
+    async with async_engine.connect() as conn:
+        result = await conn.stream(select(*columns).order_by(spec.table.c.id))
+        async for rows in result.partitions(EXPORT_PARTITION):
+            if spec.export_partition is not None:
+                rows = await spec.export_partition(conn, rows)
+            out = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(out)
+                writer.writerows([_csv_value(v) for v in row] for row in rows)
+            else:
+                for row in rows:
+                    out.write(json.dumps(dict(zip(spec.columns, map(_plain, row))), separators=(",", ":")))
+                    out.write("\n")
+            yield out.getvalue().encode()
+
+def _plain(value: Any):
+    # Dates as 'YYYY-MM-DD', same as the JSON API
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def _csv_value(value: Any):
+    # Nested values (a timetable's week) as compact JSON text in one CSV field
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return _plain(value)
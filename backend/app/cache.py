@@ -0,0 +1,94 @@
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# Versioned response cache for the dashboard reads (announcements, subjects, events,
+# timetables). Each resource has a version counter that the write endpoints bump after
+# they commit. A cached entry is the JSON body already serialized for one
+# (resource, key) at one version, and its ETag is derived from the version alone, so a
+# client that sends a current If-None-Match gets a 304 without a database round trip.
+#
+#   MYCAMPUS_RESPONSE_CACHE       1 to turn on; off by default. Versions live in this
+#                                 process's memory, so a bump on one worker is never seen by
+#                                 the others, which would keep serving stale bodies and
+#                                 matching ETags. Only turn it on when the API runs as a
+#                                 single worker (one uvicorn process, no --workers).
+#                                 MYCAMPUS_BROKER=sqlite means several workers, so it stays
+#                                 off there even when asked for.
+#   MYCAMPUS_RESPONSE_CACHE_SIZE  cached bodies kept, least recently used dropped (default 256)
+
+Loader = Callable[[], Awaitable[bytes]]
+
+def _enabled_from_env() -> bool:
+    if os.environ.get("MYCAMPUS_BROKER", "memory").lower() == "sqlite":
+        return False
+    return os.environ.get("MYCAMPUS_RESPONSE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+
+class ResponseCache:
+    def __init__(self, enabled: bool = True, max_entries: int = 256):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        # Distinguishes this process's versions from those of an earlier run
+        self.epoch = uuid.uuid4().hex[:8]
+        self.versions: dict[str, int] = {}
+        self.entries: OrderedDict[tuple[str, Hashable], tuple[int, bytes]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "bumps": 0}
+
+    def bump(self, resource: str):
+        self.versions[resource] = self.versions.get(resource, 0) + 1
+        self.stats["bumps"] += 1
+
+    def etag(self, resource: str, key: Hashable) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=6).hexdigest()
+        return f'"{resource}.{self.epoch}.{self.versions.get(resource, 0)}.{digest}"'
+
+    async def respond(self, request: Request, resource: str, key: Hashable, load: Loader, media_type: str = "application/json") -> Response:
+        if not self.enabled:
+            return Response(await load(), media_type=media_type)
+        version = self.versions.get(resource, 0)
+        etag = self.etag(resource, key)
+        headers = {"etag": etag, "cache-control": "no-cache"}
+        if etag in _parse_if_none_match(request.headers.get("if-none-match")):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        entry = self.entries.get((resource, key))
+        if entry is not None and entry[0] == version:
+            self.stats["hits"] += 1
+            self.entries.move_to_end((resource, key))
+            body = entry[1]
+        else:
+            self.stats["misses"] += 1
+            body = await load()
+            # Stored under the version read before loading: a bump that lands meanwhile
+            # simply makes the next read miss
+            self.entries[(resource, key)] = (version, body)
+            self.entries.move_to_end((resource, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return Response(body, media_type=media_type, headers=headers)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "versions": dict(self.versions),
+        }
+
+def serialize(adapter: TypeAdapter, value: Any) -> bytes:
+    # Same validation as response_model (ORM attributes included), straight to JSON bytes
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+def _parse_if_none_match(value: str | None) -> set[str]:
+    if not value:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+
+cache = ResponseCache(
+    enabled=_enabled_from_env(),
+    max_entries=int(os.environ.get("MYCAMPUS_RESPONSE_CACHE_SIZE", "256")),
+)
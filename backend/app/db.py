@@ -1,10 +1,60 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from pathlib import Path
+from .metrics import metrics
+from .profiler import profiler
 
-# Compute DB path next to this file
-_db_path = Path(__file__).resolve().parent / "database.db"
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{_db_path.as_posix()}"
+# Compute DB path next to this file; MYCAMPUS_DB_PATH points elsewhere (the tests use a scratch file)
+DB_PATH = Path(os.environ.get("MYCAMPUS_DB_PATH") or Path(__file__).resolve().parent / "database.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH.as_posix()}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH.as_posix()}"
+
+# Connection pragmas per engine profile, applied on every new DBAPI connection.
+#   MYCAMPUS_DB_PROFILE=tuned    WAL, synchronous=NORMAL, mmap, 64 MiB page cache, 5 s busy timeout (default)
+#   MYCAMPUS_DB_PROFILE=durable  as tuned but synchronous=FULL (fsync on every commit)
+#   MYCAMPUS_DB_PROFILE=legacy   SQLite defaults (rollback journal, no busy timeout)
+# Individual values can be overridden with MYCAMPUS_DB_<PRAGMA>, e.g. MYCAMPUS_DB_MMAP_SIZE=0.
+DB_PROFILES: dict[str, dict[str, str]] = {
+    "legacy": {},
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": "5000",
+        "cache_size": "-65536",
+        "mmap_size": "268435456",
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": "5000",
+        "cache_size": "-65536",
+        "mmap_size": "268435456",
+        "temp_store": "MEMORY",
+    },
+}
+
+def db_pragmas() -> dict[str, str]:
+    profile = os.environ.get("MYCAMPUS_DB_PROFILE", "tuned").lower()
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown MYCAMPUS_DB_PROFILE: {profile!r}")
+    pragmas = dict(DB_PROFILES[profile])
+    for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store"):
+        override = os.environ.get(f"MYCAMPUS_DB_{name.upper()}")
+        if override is not None:
+            pragmas[name] = override
+    return pragmas
+
+def apply_pragmas(sync_engine, pragmas: dict[str, str]):
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
@@ -12,12 +62,38 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the routers: requests stay on the event loop instead of taking a
+# threadpool thread each. expire_on_commit=False so rows can be returned after commit
+# without an implicit (and, under asyncio, illegal) lazy refresh.
+# Pooled rather than aiosqlite's default NullPool so connections (and their page cache
+# and mmap) are reused across requests; size with MYCAMPUS_DB_POOL_SIZE.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=int(os.environ.get("MYCAMPUS_DB_POOL_SIZE", "10")),
+    max_overflow=10,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+_pragmas = db_pragmas()
+apply_pragmas(engine, _pragmas)
+apply_pragmas(async_engine.sync_engine, _pragmas)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+profiler.instrument_engine(engine)
+profiler.instrument_engine(async_engine.sync_engine)
+
 # Dependency for FastAPI routes
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 def get_db() -> Generator:
+    # Sync session: startup seeding and command-line tools
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,35 @@
+import os
+from typing import Iterable, Optional, Sequence
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import select
+
+# Opt-in fast path for the big list endpoints (MYCAMPUS_FAST_JSON=1; off by default).
+# The normal path loads ORM objects into the session's identity map, validates each one
+# against the pydantic response model (from_attributes) and then encodes the result.
+# The fast path selects only the response model's columns with Core, zips each row tuple
+# into a dict and encodes the whole list in one orjson call. The body is byte-for-byte
+# what the normal path produces: fields in model order, compact separators, UTF-8 as is,
+# dates as YYYY-MM-DD. Handlers keep their response_model, so the OpenAPI schema is
+# unchanged; they return the encoded body as a Response, which FastAPI sends untouched.
+# Compare the two paths on the benchmark data with `python -m bench.serialization`.
+
+enabled = os.environ.get("MYCAMPUS_FAST_JSON", "0").lower() in ("1", "true", "yes", "on")
+
+class RowEncoder:
+    """Column select and encoder for one ORM model rendered as one response model."""
+
+    def __init__(self, model, schema: type[BaseModel]):
+        self.names = tuple(schema.model_fields)
+        self.columns = tuple(getattr(model, name) for name in self.names)
+
+    def select(self):
+        return select(*self.columns)
+
+    def dumps(self, rows: Iterable[Sequence]) -> bytes:
+        names = self.names
+        return orjson.dumps([dict(zip(names, row)) for row in rows])
+
+    def response(self, rows: Iterable[Sequence], headers: Optional[dict] = None) -> Response:
+        return Response(self.dumps(rows), media_type="application/json", headers=headers)
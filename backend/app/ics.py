@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Event, EventChange
+
+# iCalendar feed for the events table (GET /api/events.ics).
+# Every event is rendered to its VEVENT text once and kept. Triggers number each write to
+# events in event_changes, so a request reads the latest number (one index seek), re-renders
+# only the events changed since the last build and joins the stored fragments; with no
+# change the joined body is reused as is. This does not depend on the response cache or on
+# which worker took the write.
+
+PRODID = "-//MyCampus//Events//EN"
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line: str) -> str:
+    # RFC 5545: lines longer than 75 octets continue on the next line after a space
+    out, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(current)
+            current, size = " ", 1
+        current += ch
+        size += n
+    out.append(current)
+    return "\r\n".join(out)
+
+def render_event(event, stamp: str) -> str:
+    end = (event.end or event.start) + timedelta(days=1)  # DTEND is exclusive
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{event.id}@mycampus",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART;VALUE=DATE:{event.start:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{end:%Y%m%d}",
+        f"SUMMARY:{_escape(event.title)}",
+        f"CATEGORIES:{_escape(event.type)}",
+    ]
+    if event.description:
+        lines.append(f"DESCRIPTION:{_escape(event.description)}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+_NEXT_REV = "(SELECT coalesce(max(rev), 0) + 1 FROM event_changes)"
+
+_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS events_changes_ai AFTER INSERT ON events BEGIN
+        INSERT OR REPLACE INTO event_changes (event_id, rev) SELECT new.id, {_NEXT_REV};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS events_changes_au AFTER UPDATE ON events BEGIN
+        INSERT OR REPLACE INTO event_changes (event_id, rev) SELECT old.id, {_NEXT_REV};
+        INSERT OR REPLACE INTO event_changes (event_id, rev) SELECT new.id, {_NEXT_REV} WHERE new.id != old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS events_changes_ad AFTER DELETE ON events BEGIN
+        INSERT OR REPLACE INTO event_changes (event_id, rev) SELECT old.id, {_NEXT_REV};
+    END""",
+]
+
+def ensure_change_log(conn: Connection):
+    """Create event_changes and its triggers if missing."""
+    EventChange.__table__.create(conn, checkfirst=True)
+    for sql in _DDL:
+        conn.exec_driver_sql(sql)
+
+class IcsFeed:
+    def __init__(self):
+        self.fragments: dict[int, tuple] = {}  # event id -> (start, id, VEVENT text)
+        # Change number the fragments are current to (None: nothing built yet), and the body
+        self.rev: Optional[int] = None
+        self.cached: Optional[bytes] = None
+        self.stats = {"full_builds": 0, "events_rendered": 0}
+        self._lock = asyncio.Lock()
+
+    def _store(self, rows: Iterable):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        for row in rows:
+            self.fragments[row.id] = (row.start, row.id, render_event(row, stamp))
+            self.stats["events_rendered"] += 1
+
+    async def body(self, db: AsyncSession) -> bytes:
+        async with self._lock:
+            # Read before the events: a write landing in between is picked up again next time
+            rev = await db.scalar(select(func.max(EventChange.rev))) or 0
+            if self.rev is None:
+                self.fragments.clear()
+                self._store((await db.scalars(select(Event))).all())
+                self.stats["full_builds"] += 1
+            elif rev != self.rev:
+                ids = (await db.scalars(select(EventChange.event_id).where(EventChange.rev > self.rev))).all()
+                for event_id in ids:
+                    self.fragments.pop(event_id, None)
+                self._store((await db.scalars(select(Event).where(Event.id.in_(ids)))).all())
+            elif self.cached is not None:
+                return self.cached
+            self.rev = rev
+            parts = ["BEGIN:VCALENDAR\r\n", "VERSION:2.0\r\n", f"PRODID:{PRODID}\r\n", "CALSCALE:GREGORIAN\r\n"]
+            parts.extend(frag for _, _, frag in sorted(self.fragments.values()))
+            parts.append("END:VCALENDAR\r\n")
+            self.cached = "".join(parts).encode("utf-8")
+            return self.cached
+
+feed = IcsFeed()
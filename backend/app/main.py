@@ -1,12 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from .routers import auth, users, announcements, events, leaves, subjects, timetable, chat
-from .db import engine, Base, SessionLocal
-from . import models
-import json
-from datetime import date as date_cls
+from .routers import auth, users, announcements, events, leaves, subjects, timetable, chat, uploads, bulk
+from .writer import writer, ws_writer
+from . import attachments
+import asyncio
+from .db import engine, async_engine, SessionLocal
+from . import migrations
+from .seed import seed
+from .cache import cache
+from .metrics import MetricsMiddleware, metrics, websocket_collector
+from fastapi.responses import PlainTextResponse
+from .profiler import SqlProfileMiddleware, profiler
 
 app = FastAPI(title="MyCampus API")
 
@@ -23,6 +28,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if profiler.enabled:
+    app.add_middleware(SqlProfileMiddleware, profiler=profiler)
+
+if metrics.enabled:
+    # Outermost, so time spent in CORS handling is included
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    metrics.collectors.append(websocket_collector(chat.manager, metrics.room_limit))
+
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(announcements.router, prefix="/api")
@@ -31,69 +44,94 @@ app.include_router(leaves.router, prefix="/api")
 app.include_router(subjects.router, prefix="/api")
 app.include_router(timetable.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+app.include_router(uploads.router, prefix="/api")
+app.include_router(bulk.router, prefix="/api")
 
 # Serve uploads directory
 import os
-uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
+from .attachments import UPLOADS_DIR as uploads_dir
+from .static import AttachmentFiles
 os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+app.mount("/uploads", AttachmentFiles(directory=uploads_dir), name="uploads")
+
+@app.get("/api/cache/stats")
+async def response_cache_stats():
+    # Hit/miss/304 counters and current resource versions for this worker
+    return cache.snapshot()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # Prometheus text format for this worker; MYCAMPUS_METRICS=0 turns it off
+    if not metrics.enabled:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/debug/sql", include_in_schema=False)
+async def sql_profiles(limit: int = 50):
+    # Newest first; MYCAMPUS_SQL_PROFILE=1 turns the profiler on
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="SQL profiler disabled")
+    recent = list(profiler.recent.values())[::-1][:limit]
+    return [p.summary(profiler.repeat) for p in recent]
+
+@app.get("/api/debug/sql/{profile_id}", include_in_schema=False)
+async def sql_profile(profile_id: str):
+    profile = profiler.recent.get(profile_id) if profiler.enabled else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.detail(profiler.repeat)
 
 # Root route that redirects to /docs
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
-# Create tables on startup (simple approach; replace with Alembic in production)
+async def _blob_gc_loop():
+    while True:
+        await asyncio.sleep(attachments.GC_INTERVAL)
+        try:
+            await asyncio.to_thread(attachments.collect_garbage)
+        except Exception:
+            pass
+
+_background: list[asyncio.Task] = []
+
+@app.on_event("startup")
+async def start_background_jobs():
+    if attachments.GC_INTERVAL > 0:
+        _background.append(asyncio.create_task(_blob_gc_loop()))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for task in _background:
+        task.cancel()
+    _background.clear()
+
+@app.on_event("startup")
+async def start_realtime():
+    await chat.manager.start()
+    if writer is not None:
+        await writer.start()
+    if ws_writer is not writer:
+        await ws_writer.start()
+
+@app.on_event("shutdown")
+async def stop_realtime():
+    if ws_writer is not writer:
+        await ws_writer.stop()
+    if writer is not None:
+        await writer.stop()
+    await chat.manager.stop()
+    await async_engine.dispose()
+
+# Schema migrations on startup: a single version check when the database is current.
+# Demo data is opt-in (python -m app.migrations seed, or MYCAMPUS_SEED=1).
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    # Seed minimal data if tables are empty (preserve previous behavior)
-    db = SessionLocal()
-    try:
-        # --- Lightweight migrations for existing SQLite DBs ---
-        with engine.connect() as conn:
-            def _exec(sql: str):
-                try:
-                    conn.exec_driver_sql(sql)
-                except Exception:
-                    pass
-            # chat_rooms: add visibility, meta
-            _exec("ALTER TABLE chat_rooms ADD COLUMN visibility VARCHAR(32) NOT NULL DEFAULT 'all'")
-            _exec("ALTER TABLE chat_rooms ADD COLUMN meta TEXT")
-            # messages: add type, meta, deleted
-            _exec("ALTER TABLE messages ADD COLUMN type VARCHAR(16) NOT NULL DEFAULT 'text'")
-            _exec("ALTER TABLE messages ADD COLUMN meta TEXT")
-            _exec("ALTER TABLE messages ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
-        # Announcements
-        if db.query(models.Announcement).count() == 0:
-            db.add_all([
-                models.Announcement(title='Mid-term Exam Schedule Published', content='Schedule published. Check Events.', date=date_cls(2025, 8, 15), postedBy='Admin Office'),
-                models.Announcement(title='Annual Sports Day Registration', content='Register before Aug 20th.', date=date_cls(2025, 8, 10), postedBy='Student Council'),
-            ])
-        # Events
-        if db.query(models.Event).count() == 0:
-            db.add_all([
-                models.Event(title='Opening Day', type='Academic Event', start='2025-07-14'),
-                models.Event(title='Independence Day', type='Holiday', start='2025-08-15'),
-            ])
-        # Subjects
-        if db.query(models.Subject).count() == 0:
-            db.add_all([
-                models.Subject(id=1, name='Business Statistics', faculty='Dr. S. Nanthitha', ongoingChapters='Unit 2: Probability\nUnit 3: Hypothesis Testing', type='Theory'),
-                models.Subject(id=2, name='Foundation of Data Science', faculty='Ms. Padmapriya', ongoingChapters='Unit 1: Introduction to Data Science', type='Theory'),
-                models.Subject(id=3, name='Full Stack Development', faculty='Dr. A. Priya', ongoingChapters='Unit 3: React Hooks\nUnit 4: State Management', type='Theory'),
-                models.Subject(id=7, name='Foundation of Data Science Lab', faculty='Mr. P. TamilArasu', ongoingChapters='Experiment 3: Data Visualization with Matplotlib', type='Lab'),
-            ])
-        # Timetable
-        if db.query(models.Timetable).count() == 0:
-            sample = {
-                'Monday': [ {'subjectId': '1', 'faculty': 'Dr. S. Nanthitha'}, {'subjectId': '2', 'faculty': 'Ms. Padmapriya'}, 'Break', {'subjectId': '3', 'faculty': 'Dr. A. Priya'} ],
-                'Tuesday': [ {'subjectId': '3', 'faculty': 'Dr. A. Priya'}, {'subjectId': '1', 'faculty': 'Dr. S. Nanthitha'}, 'Break', {'subjectId': '2', 'faculty': 'Ms. Padmapriya'} ],
-            }
-            db.add(models.Timetable(section='CSBS', data=json.dumps(sample)))
-        # Chat seed
-        if db.query(models.ChatRoom).count() == 0:
-            db.add(models.ChatRoom(name='General', type='group'))
-        db.commit()
-    finally:
-        db.close()
+    migrations.upgrade(engine)
+    if os.environ.get("MYCAMPUS_SEED", "0").lower() in ("1", "true", "yes", "on"):
+        db = SessionLocal()
+        try:
+            seed(db)
+        finally:
+            db.close()
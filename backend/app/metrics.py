@@ -0,0 +1,223 @@
+import contextvars
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+from sqlalchemy import event
+
+# Prometheus metrics at GET /metrics (text exposition format, no client library).
+# A pure ASGI middleware times every HTTP request and files it under its route template
+# (/api/messages/{room_id}, not the concrete path; unmatched paths share one label).
+# Cursor execute hooks on both engines count queries and DB time, globally and for the
+# request that issued them (a ContextVar set by the middleware; SQLAlchemy's async
+# greenlets carry it through). Websocket gauges and counters are read from
+# ConnectionManager when scraped, so the fan-out path only pays for the broadcast timer.
+#
+# Recording is plain int/float updates on the event loop thread: no locks. Queries run
+# from worker threads (bulk import, migrations) go to the same counters, where a rare
+# lost increment is acceptable for monitoring.
+#
+#   MYCAMPUS_METRICS              1 (default) / 0: no middleware, no hooks, /metrics is 404
+#   MYCAMPUS_METRICS_ROOM_LIMIT   rooms listed in the per-room socket gauge, largest first (default 50)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+UNMATCHED = "unmatched"
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # counts[i]: observations <= buckets[i] and > buckets[i - 1]; last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(pairs: Iterable[tuple[str, object]]) -> str:
+    parts = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Request:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+_current: contextvars.ContextVar[Optional[_Request]] = contextvars.ContextVar("mycampus_metrics_request", default=None)
+
+class Metrics:
+    def __init__(self, enabled: bool, room_limit: int):
+        self.enabled = enabled
+        self.room_limit = room_limit
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.request_queries: dict[tuple[str, str], Histogram] = {}
+        self.request_db_seconds: dict[tuple[str, str], Histogram] = {}
+        self.queries = 0
+        self.query_seconds = Histogram(QUERY_BUCKETS)
+        self.broadcast_seconds = Histogram(LATENCY_BUCKETS)
+        self.in_flight = 0
+        # Scrape-time sources: callables returning exposition lines
+        self.collectors: list[Callable[[], Iterable[str]]] = []
+        self._templates: Optional[dict] = None
+
+    # --- recording ---
+
+    def instrument_engine(self, sync_engine):
+        if not self.enabled:
+            return
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get("metrics_query_start")
+            if not starts:
+                return
+            elapsed = time.perf_counter() - starts.pop()
+            self.queries += 1
+            self.query_seconds.observe(elapsed)
+            req = _current.get()
+            if req is not None:
+                req.queries += 1
+                req.db_seconds += elapsed
+
+    def record(self, method: str, route: str, status: int, seconds: float, req: _Request):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        route_key = (method, route)
+        latency = self.latency.get(route_key)
+        if latency is None:
+            latency = self.latency[route_key] = Histogram(LATENCY_BUCKETS)
+            self.request_queries[route_key] = Histogram(COUNT_BUCKETS)
+            self.request_db_seconds[route_key] = Histogram(LATENCY_BUCKETS)
+        latency.observe(seconds)
+        self.request_queries[route_key].observe(req.queries)
+        self.request_db_seconds[route_key].observe(req.db_seconds)
+
+    def template(self, scope) -> str:
+        # Routing leaves the matched endpoint in the scope; map it back to its path template
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED
+        if self._templates is None:
+            self._templates = {}
+            for route in getattr(scope.get("app"), "routes", ()):
+                target = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                if target is not None:
+                    self._templates.setdefault(target, route.path)
+        return self._templates.get(endpoint, UNMATCHED)
+
+    # --- exposition ---
+
+    @staticmethod
+    def _histogram(name: str, help_: str, series: Iterable[tuple[tuple, Histogram]], label_names: tuple = ()) -> list[str]:
+        lines = [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+        for label_values, h in series:
+            base = list(zip(label_names, label_values))
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(base + [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(base + [('le', '+Inf')])} {h.count}")
+            lines.append(f"{name}_sum{_labels(base)} {h.sum}")
+            lines.append(f"{name}_count{_labels(base)} {h.count}")
+        return lines
+
+    @staticmethod
+    def simple(kind: str, name: str, help_: str, series: Iterable[tuple[dict, float]]) -> list[str]:
+        lines = [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+        for labels, value in series:
+            lines.append(f"{name}{_labels(labels.items())} {value}")
+        return lines
+
+    def render(self) -> str:
+        lines: list[str] = []
+        lines += self.simple("counter", "mycampus_http_requests_total", "HTTP requests by route template and status.",
+                             (({"method": m, "route": r, "status": s}, n) for (m, r, s), n in sorted(self.requests.items())))
+        lines += self.simple("gauge", "mycampus_http_requests_in_flight", "HTTP requests being handled.", [({}, self.in_flight)])
+        lines += self._histogram("mycampus_http_request_duration_seconds", "HTTP request latency by route template.",
+                                 sorted(self.latency.items()), ("method", "route"))
+        lines += self._histogram("mycampus_http_request_db_queries", "SQL statements executed per HTTP request.",
+                                 sorted(self.request_queries.items()), ("method", "route"))
+        lines += self._histogram("mycampus_http_request_db_seconds", "Time spent in SQL per HTTP request.",
+                                 sorted(self.request_db_seconds.items()), ("method", "route"))
+        lines += self.simple("counter", "mycampus_db_queries_total", "SQL statements executed (all engines).", [({}, self.queries)])
+        lines += self._histogram("mycampus_db_query_duration_seconds", "SQL statement latency.", [((), self.query_seconds)])
+        lines += self._histogram("mycampus_ws_broadcast_duration_seconds",
+                                 "Time to encode and queue one event for a room's local sockets.", [((), self.broadcast_seconds)])
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    # Pure ASGI (no BaseHTTPMiddleware task/stream wrapping); websockets pass straight through
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        req = _Request()
+        token = _current.set(req)
+        metrics.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            metrics.in_flight -= 1
+            _current.reset(token)
+            metrics.record(scope["method"], metrics.template(scope), status, elapsed, req)
+
+def websocket_collector(manager, room_limit: int) -> Callable[[], list[str]]:
+    # Gauges and counters read from a ConnectionManager at scrape time
+    def collect() -> list[str]:
+        stats = manager.stats
+        rooms = sorted(((room_id, len(conns)) for room_id, conns in manager.rooms.items()), key=lambda r: -r[1])
+        lines = Metrics.simple("gauge", "mycampus_ws_connections", "Open websocket connections in this worker.",
+                               [({}, len(manager.connections))])
+        lines += Metrics.simple("gauge", "mycampus_ws_rooms", "Rooms with at least one local subscriber.", [({}, len(rooms))])
+        lines += Metrics.simple("gauge", "mycampus_ws_room_connections",
+                                f"Local sockets subscribed per room (largest {room_limit}).",
+                                (({"room": room_id}, n) for room_id, n in rooms[:room_limit]))
+        lines += Metrics.simple("gauge", "mycampus_ws_queued_frames", "Frames waiting in connection send queues.",
+                                [({}, sum(c.queue.qsize() for c in manager.connections.values()))])
+        for name, key, help_ in (
+            ("mycampus_ws_broadcasts_total", "broadcasts", "Events delivered to local sockets."),
+            ("mycampus_ws_frames_sent_total", "frames_sent", "Frames written to sockets."),
+            ("mycampus_ws_frames_dropped_total", "frames_dropped", "Frames discarded for slow consumers."),
+            ("mycampus_ws_slow_disconnects_total", "slow_disconnects", "Connections closed for being too slow."),
+            ("mycampus_ws_send_errors_total", "send_errors", "Sends that failed on a broken connection."),
+        ):
+            lines += Metrics.simple("counter", name, help_, [({}, stats[key])])
+        return lines
+    return collect
+
+metrics = Metrics(
+    enabled=os.environ.get("MYCAMPUS_METRICS", "1").lower() in ("1", "true", "yes", "on"),
+    room_limit=int(os.environ.get("MYCAMPUS_METRICS_ROOM_LIMIT", "50")),
+)
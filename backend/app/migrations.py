@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from .db import Base, apply_pragmas, db_pragmas
+from . import models  # noqa: F401  (registers the tables on Base)
+from . import ics
+from . import search as search_index
+from . import timetables
+
+# Versioned schema migrations for the SQLite database.
+# schema_version records every applied step. At startup `upgrade` reads max(version)
+# with one query and returns straight away when it matches the last step, so a current
+# database costs no DDL and no table scans. Otherwise each pending step runs in its
+# own BEGIN IMMEDIATE transaction together with the row that marks it applied; workers
+# booting at the same time queue on the lock and skip what another already did.
+#
+# Steps must be idempotent: databases created by the old create_all/ALTER startup code
+# are upgraded from version 0. Schema changes after this point are new steps appended
+# to STEPS (create_all no longer runs on a current database).
+#
+# Backfills run in batches, one transaction per batch, with their position kept in
+# schema_backfill, so an interrupted upgrade resumes where it stopped instead of
+# starting again.
+#
+#   cd backend && python -m app.migrations upgrade   apply pending steps
+#   cd backend && python -m app.migrations status    applied / pending steps
+#   cd backend && python -m app.migrations seed      demo data into empty tables
+#   MYCAMPUS_MIGRATE_BATCH                           rows per backfill batch (default 5000)
+
+BATCH_SIZE = int(os.environ.get("MYCAMPUS_MIGRATE_BATCH", "5000"))
+
+class Step:
+    def __init__(self, version: int, name: str, apply: Callable[[Connection], None]):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+class Backfill(Step):
+    # `batch(conn, position, size)` processes one batch after `position` and returns the
+    # new position, or None when there is nothing left
+    def __init__(self, version: int, name: str, batch: Callable[[Connection, int, int], Optional[int]]):
+        super().__init__(version, name, None)
+        self.batch = batch
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if column not in _columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def _schedule(conn: Connection, name: str, target: int):
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO schema_backfill (name, position, target) VALUES (?, 0, ?)", (name, target)
+    )
+
+# --- Steps ---
+
+def _base_schema(conn: Connection):
+    Base.metadata.create_all(bind=conn)
+
+def _legacy_columns(conn: Connection):
+    _add_column(conn, "chat_rooms", "visibility", "VARCHAR(32) NOT NULL DEFAULT 'all'")
+    _add_column(conn, "chat_rooms", "meta", "TEXT")
+    _add_column(conn, "messages", "type", "VARCHAR(16) NOT NULL DEFAULT 'text'")
+    _add_column(conn, "messages", "meta", "TEXT")
+    _add_column(conn, "messages", "deleted", "INTEGER NOT NULL DEFAULT 0")
+
+def _chat_indexes(conn: Connection):
+    # create_all skips indexes on tables that already existed
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_room_deleted_id ON messages (room_id, deleted, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_message_state_user_message ON user_message_state (user_id, message_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_room_user_state_room_user ON room_user_state (room_id, user_id)")
+
+def _messages_fts(conn: Connection):
+    # Triggers index new messages from here on; older ones (up to the current max id)
+    # are left to the backfill
+    if search_index.ensure_fts(conn):
+        target = conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM messages").scalar_one()
+        _schedule(conn, "messages_fts_backfill", target)
+
+def _messages_fts_batch(conn: Connection, position: int, size: int) -> Optional[int]:
+    row = conn.exec_driver_sql("SELECT target FROM schema_backfill WHERE name = 'messages_fts_backfill'").first()
+    if row is None:
+        return None
+    ids = [r[0] for r in conn.exec_driver_sql(
+        "SELECT id FROM messages WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (position, row[0], size)
+    )]
+    if not ids:
+        conn.exec_driver_sql(f"INSERT INTO {search_index.FTS_TABLE}({search_index.FTS_TABLE}) VALUES ('optimize')")
+        return None
+    conn.exec_driver_sql(
+        f"INSERT INTO {search_index.FTS_TABLE}(rowid, content, sender_name) "
+        "SELECT id, content, sender_name FROM messages WHERE deleted = 0 AND id >= ? AND id <= ?",
+        (ids[0], ids[-1]),
+    )
+    return ids[-1]
+
+def _room_counters(conn: Connection):
+    conn.exec_driver_sql(
+        "INSERT INTO room_counters (room_id, message_count, last_message_id) "
+        "SELECT room_id, count(*), max(id) FROM messages WHERE deleted = 0 GROUP BY room_id "
+        "HAVING NOT EXISTS (SELECT 1 FROM room_counters)"
+    )
+
+_ISO_DATE_GLOB = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+def _not_a_date(column: str) -> str:
+    # With a modifier SQLite's date() rolls impossible days over ('2025-02-30' becomes
+    # '2025-03-02') and returns NULL for garbage; the ORM's date parser raises on both
+    return f"({column} IS NULL OR {column} NOT GLOB {_ISO_DATE_GLOB} OR date({column}, '+0 days') IS NOT {column})"
+
+def _quarantine_event_dates(conn: Connection):
+    # An event needs a start date: rows whose start is not one (the old API took any
+    # string, e.g. 'TBD') move to events_rejected for someone to fix by hand, instead of
+    # breaking every read of the events list. A bad end just becomes NULL (one-day event).
+    conn.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS events_rejected (id INTEGER, title TEXT, type TEXT, start TEXT, "end" TEXT, '
+        "description TEXT, reason TEXT NOT NULL, rejected_at TEXT NOT NULL)"
+    )
+    bad_start = _not_a_date("start")
+    conn.exec_driver_sql(
+        f'INSERT INTO events_rejected SELECT id, title, type, start, "end", description, '
+        f"'start is not a YYYY-MM-DD date', ? FROM events WHERE {bad_start}",
+        (datetime.utcnow().isoformat(timespec="seconds") + "Z",),
+    )
+    conn.exec_driver_sql(f"DELETE FROM events WHERE {bad_start}")
+    bad_end = _not_a_date('"end"')
+    conn.exec_driver_sql(f'UPDATE events SET "end" = NULL WHERE "end" IS NOT NULL AND {bad_end}')
+
+def _event_dates(conn: Connection):
+    # start/end became DATE columns (same 'YYYY-MM-DD' text in SQLite); trim legacy
+    # timestamps, then set aside values that are still not dates
+    conn.exec_driver_sql("UPDATE events SET start = substr(start, 1, 10) WHERE length(start) > 10")
+    conn.exec_driver_sql('UPDATE events SET "end" = substr("end", 1, 10) WHERE length("end") > 10')
+    _quarantine_event_dates(conn)
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_events_start_end ON events (start, "end")')
+
+def _leave_indexes_counters(conn: Connection):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_leaves_student_id ON leaves (studentId, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_leaves_status_id ON leaves (status, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_leaves_department_status_id ON leaves (department, status, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_leaves_mentor_status_id ON leaves (mentorName, status, id)")
+    conn.exec_driver_sql(
+        "INSERT INTO leave_counters (dimension, value, status, count) SELECT * FROM ("
+        "SELECT 'all', '', status, count(*) FROM leaves GROUP BY status "
+        "UNION ALL SELECT 'department', department, status, count(*) FROM leaves GROUP BY department, status "
+        "UNION ALL SELECT 'mentor', mentorName, status, count(*) FROM leaves GROUP BY mentorName, status "
+        "UNION ALL SELECT 'leaveType', leaveType, status, count(*) FROM leaves GROUP BY leaveType, status"
+        ") WHERE NOT EXISTS (SELECT 1 FROM leave_counters)"
+    )
+
+def _timetable_cells_batch(conn: Connection, position: int, size: int) -> Optional[int]:
+    # Timetables are whole weeks; a tenth of the row batch keeps transactions similar in size
+    ids = [r[0] for r in conn.exec_driver_sql(
+        "SELECT id FROM timetables WHERE id > ? ORDER BY id LIMIT ?", (position, max(1, size // 10))
+    )]
+    if not ids:
+        return None
+    timetables.migrate_json_rows(conn, ids=ids)
+    return ids[-1]
+
+def _message_client_ids(conn: Connection):
+    _add_column(conn, "messages", "client_id", "VARCHAR(64)")
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_messages_sender_client ON messages (sender_id, client_id) "
+        "WHERE client_id IS NOT NULL"
+    )
+
+def _room_event_seq(conn: Connection):
+    # Existing messages keep seq 0: nothing to replay from before the upgrade
+    _add_column(conn, "room_counters", "event_seq", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "messages", "seq", "INTEGER NOT NULL DEFAULT 0")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_room_seq ON messages (room_id, seq)")
+
+def _timetable_empty_days(conn: Connection):
+    # Weeks exploded by step 9 lost their empty days; the JSON copy still has them
+    timetables.add_empty_day_markers(conn)
+
+def _event_spans_changes(conn: Connection):
+    # Longest event (max over this index) bounds how far before a range an overlapping
+    # event can start; the change log lets every worker rebuild the ICS feed incrementally
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_events_span ON events (julianday(coalesce("end", start)) - julianday(start))'
+    )
+    ics.ensure_change_log(conn)
+
+STEPS: list[Step] = [
+    Step(1, "base_schema", _base_schema),
+    Step(2, "legacy_columns", _legacy_columns),
+    Step(3, "chat_indexes", _chat_indexes),
+    Step(4, "messages_fts", _messages_fts),
+    Backfill(5, "messages_fts_backfill", _messages_fts_batch),
+    Step(6, "room_counters", _room_counters),
+    Step(7, "event_dates", _event_dates),
+    Step(8, "leave_indexes_counters", _leave_indexes_counters),
+    Backfill(9, "timetable_cells", _timetable_cells_batch),
+    Step(10, "message_client_ids", _message_client_ids),
+    Step(11, "room_event_seq", _room_event_seq),
+    Step(12, "timetable_empty_days", _timetable_empty_days),
+    # Databases that ran step 7 before it checked start
+    Step(13, "event_dates_quarantine", _quarantine_event_dates),
+    Step(14, "event_spans_changes", _event_spans_changes),
+]
+LATEST = STEPS[-1].version
+
+# --- Runner ---
+
+def current_version(engine: Engine) -> int:
+    try:
+        with engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar_one()
+    except OperationalError:
+        # No schema_version table: a new database, or one from before versioned migrations
+        return 0
+
+def _migration_engine(url) -> Engine:
+    # Explicit transactions so DDL is transactional too, and IMMEDIATE so concurrent
+    # workers serialise on the write lock instead of failing an upgrade halfway
+    eng = create_engine(url, connect_args={"timeout": 60})
+    apply_pragmas(eng, {**db_pragmas(), "busy_timeout": "60000"})
+
+    @event.listens_for(eng, "connect")
+    def _autocommit_driver(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(eng, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return eng
+
+def _applied(conn: Connection, version: int) -> bool:
+    return conn.exec_driver_sql("SELECT 1 FROM schema_version WHERE version = ?", (version,)).first() is not None
+
+def _mark(conn: Connection, step: Step):
+    conn.exec_driver_sql(
+        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+        (step.version, step.name, datetime.utcnow().isoformat(timespec="seconds") + "Z"),
+    )
+
+def _run_backfill(eng: Engine, step: Backfill, batch_size: int) -> bool:
+    # One transaction per batch; returns False if another worker finished the step
+    while True:
+        with eng.begin() as conn:
+            if _applied(conn, step.version):
+                return False
+            row = conn.exec_driver_sql("SELECT position FROM schema_backfill WHERE name = ?", (step.name,)).first()
+            position = row[0] if row else 0
+            new_position = step.batch(conn, position, batch_size)
+            if new_position is None:
+                _mark(conn, step)
+                return True
+            conn.exec_driver_sql(
+                "INSERT INTO schema_backfill (name, position, target) VALUES (?, ?, NULL) "
+                "ON CONFLICT(name) DO UPDATE SET position = excluded.position",
+                (step.name, new_position),
+            )
+
+def upgrade(engine: Engine, batch_size: int = BATCH_SIZE) -> list[str]:
+    """Apply pending steps. Returns the names of the steps this call applied."""
+    if current_version(engine) >= LATEST:
+        return []
+    applied = []
+    eng = _migration_engine(engine.url)
+    try:
+        with eng.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+            )
+            conn.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS schema_backfill ("
+                "name TEXT PRIMARY KEY, position INTEGER NOT NULL, target INTEGER)"
+            )
+        for step in STEPS:
+            if isinstance(step, Backfill):
+                if _run_backfill(eng, step, batch_size):
+                    applied.append(step.name)
+                continue
+            with eng.begin() as conn:
+                if _applied(conn, step.version):
+                    continue
+                step.apply(conn)
+                _mark(conn, step)
+            applied.append(step.name)
+    finally:
+        eng.dispose()
+    return applied
+
+def status(engine: Engine) -> list[tuple[int, str, Optional[str]]]:
+    done: dict[int, str] = {}
+    if current_version(engine):
+        with engine.connect() as conn:
+            done = dict(conn.exec_driver_sql("SELECT version, applied_at FROM schema_version").all())
+    return [(s.version, s.name, done.get(s.version)) for s in STEPS]
+
+if __name__ == "__main__":
+    from .db import engine, SessionLocal
+    command = sys.argv[1:]
+    if command == ["upgrade"]:
+        t0 = time.perf_counter()
+        names = upgrade(engine)
+        print(f"applied {len(names)} step(s) in {time.perf_counter() - t0:.2f}s: {', '.join(names) or 'up to date'}")
+    elif command == ["status"]:
+        for version, name, applied_at in status(engine):
+            print(f"{version:>3} {name:<26} {applied_at or 'pending'}")
+    elif command == ["seed"]:
+        from .seed import seed
+        upgrade(engine)
+        db = SessionLocal()
+        try:
+            filled = seed(db)
+        finally:
+            db.close()
+        print(f"seeded: {', '.join(filled) or 'nothing (tables not empty)'}")
+    else:
+        print("usage: python -m app.migrations upgrade|status|seed")
+        sys.exit(2)
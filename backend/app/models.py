@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey
+from sqlalchemy import Integer, String, Text, Date, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from .db import Base
 
@@ -12,15 +12,38 @@ class Announcement(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Interval overlap: range on start, `end` checked from the index. The range's lower
+        # bound comes from the longest event, read off ix_events_span (an expression
+        # index created by the migrations)
+        Index("ix_events_start_end", "start", "end"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     type: Mapped[str] = mapped_column(String(64), nullable=False)
-    start: Mapped[str] = mapped_column(String(32), nullable=False)
-    end: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    start: Mapped[Date] = mapped_column(Date, nullable=False)
+    end: Mapped[Date | None] = mapped_column(Date, nullable=True)  # inclusive; NULL = single day
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+class EventChange(Base):
+    # Last change per event id (insert, update or delete), numbered across the table; kept
+    # by triggers (app/ics.py) so every worker sees every write, bulk imports included
+    __tablename__ = "event_changes"
+    __table_args__ = (
+        Index("ix_event_changes_rev", "rev"),
+    )
+    event_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    rev: Mapped[int] = mapped_column(Integer, nullable=False)
+
 class Leave(Base):
     __tablename__ = "leaves"
+    __table_args__ = (
+        # One per list_leaves filter shape, each ending in id for the newest-first keyset
+        Index("ix_leaves_student_id", "studentId", "id"),
+        Index("ix_leaves_status_id", "status", "id"),
+        Index("ix_leaves_department_status_id", "department", "status", "id"),
+        Index("ix_leaves_mentor_status_id", "mentorName", "status", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
     studentName: Mapped[str] = mapped_column(String(255), nullable=False)
     studentId: Mapped[str] = mapped_column(String(64), nullable=False)
@@ -46,7 +69,27 @@ class Timetable(Base):
     __tablename__ = "timetables"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     section: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
-    data: Mapped[str] = mapped_column(Text, nullable=False)  # JSON string
+    data: Mapped[str] = mapped_column(Text, nullable=False)  # JSON string (pre-migration copy; cells are authoritative)
+
+class TimetableCell(Base):
+    # One period of one section's week. An entry is a class (subject_id/faculty), a plain
+    # label such as 'Break', or empty (all three NULL) to keep a gap in the day's list.
+    # period -1 (timetables.EMPTY_DAY) marks a day that exists but has no entries.
+    __tablename__ = "timetable_cells"
+    __table_args__ = (
+        Index("ux_timetable_cells_section_day_period", "section", "day", "period", unique=True),
+        Index("ix_timetable_cells_faculty", "faculty", "day", "period"),
+        Index("ix_timetable_cells_subject", "subject_id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    timetable_id: Mapped[int] = mapped_column(ForeignKey("timetables.id"), nullable=False)
+    section: Mapped[str] = mapped_column(String(64), nullable=False)
+    day: Mapped[str] = mapped_column(String(16), nullable=False)
+    day_order: Mapped[int] = mapped_column(Integer, nullable=False)  # position of the day in the original week
+    period: Mapped[int] = mapped_column(Integer, nullable=False)
+    subject_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    faculty: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    label: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
 # --- Chat ---
 class ChatRoom(Base):
@@ -68,6 +111,16 @@ class Message(Base):
     meta: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON string
     timestamp: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO string
     deleted: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # 0/1
+    client_id: Mapped[str | None] = mapped_column(String(64), nullable=True)  # sender-generated, for retry dedupe
+    seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # room event seq of the last send/edit/delete
+
+    __table_args__ = (
+        # Keyset paging: WHERE room_id = ? AND deleted = 0 AND id < ? ORDER BY id DESC
+        Index("ix_messages_room_deleted_id", "room_id", "deleted", "id"),
+        Index("ux_messages_sender_client", "sender_id", "client_id", unique=True, sqlite_where=text("client_id IS NOT NULL")),
+        # Reconnect catch-up past the in-memory buffer: WHERE room_id = ? AND seq > ? ORDER BY seq
+        Index("ix_messages_room_seq", "room_id", "seq"),
+    )
 
 class RoomMember(Base):
     __tablename__ = "room_members"
@@ -91,9 +144,66 @@ class UserMessageState(Base):
     user_id: Mapped[str] = mapped_column(String(128), nullable=False)
     hidden_at: Mapped[str] = mapped_column(String(32), nullable=False)
 
+    __table_args__ = (
+        Index("ix_user_message_state_user_message", "user_id", "message_id"),
+    )
+
 class RoomUserState(Base):
     __tablename__ = "room_user_state"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     room_id: Mapped[int] = mapped_column(Integer, ForeignKey("chat_rooms.id"), nullable=False)
     user_id: Mapped[str] = mapped_column(String(128), nullable=False)
     cleared_at: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    __table_args__ = (
+        Index("ix_room_user_state_room_user", "room_id", "user_id"),
+    )
+
+class RoomCounter(Base):
+    # Live (non-deleted) message count per room, maintained on send/delete
+    __tablename__ = "room_counters"
+    room_id: Mapped[int] = mapped_column(Integer, ForeignKey("chat_rooms.id"), primary_key=True, autoincrement=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_message_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Sequence number of the room's last broadcast event (send, edit, delete)
+    event_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+class LeaveCounter(Base):
+    # Leave counts per status, overall (dimension 'all', value '') and per department /
+    # mentor / leave type; maintained by create_leave and update_leave_status
+    __tablename__ = "leave_counters"
+    dimension: Mapped[str] = mapped_column(String(16), primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class RoomReadState(Base):
+    # Per (room, user) read watermark; read_count = live messages with id <= last_read_id,
+    # so unread = RoomCounter.message_count - read_count without counting rows
+    __tablename__ = "room_read_state"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    room_id: Mapped[int] = mapped_column(Integer, ForeignKey("chat_rooms.id"), nullable=False)
+    user_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    last_read_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    read_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    __table_args__ = (
+        Index("ux_room_read_state_user_room", "user_id", "room_id", unique=True),
+        Index("ix_room_read_state_room_last_read", "room_id", "last_read_id"),
+    )
+
+class AttachmentBlob(Base):
+    # One row per content-addressed upload; ref_count = live messages whose meta points at it
+    __tablename__ = "attachment_blobs"
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    path: Mapped[str] = mapped_column(String(255), nullable=False)  # relative to uploads/
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    mime: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[str] = mapped_column(String(32), nullable=False)
+    last_seen_at: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    __table_args__ = (
+        Index("ix_attachment_blobs_ref_count", "ref_count", "last_seen_at"),
+    )
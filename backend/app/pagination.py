@@ -0,0 +1,19 @@
+import base64
+import json
+from fastapi import HTTPException
+
+# Opaque keyset cursors: base64url JSON of whatever the endpoint needs to resume from
+# (ids, ranks). Returned in X-Prev-Cursor / X-Next-Cursor so list responses keep their shape.
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return data
@@ -0,0 +1,204 @@
+import contextvars
+import os
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Optional
+from sqlalchemy import event
+
+# Development SQL profiler (off by default; MYCAMPUS_SQL_PROFILE=1).
+# Records every statement a request runs, with parameters and timings, on the same
+# cursor hooks as app/metrics.py. Statements are grouped by shape (whitespace collapsed,
+# IN-lists folded) and a shape repeated MYCAMPUS_SQL_PROFILE_REPEAT times or more in one
+# request is reported as a likely N+1. Statements slower than
+# MYCAMPUS_SQL_PROFILE_SLOW_MS get their EXPLAIN QUERY PLAN captured on the same
+# connection, with full table scans flagged.
+# Each response carries an X-SQL-Profile summary header and an X-SQL-Profile-Id; the
+# last MYCAMPUS_SQL_PROFILE_KEEP requests are kept for GET /api/debug/sql[/{id}].
+#
+# Tests can pin an endpoint's query count without turning the profiler on:
+#   with query_budget(3):
+#       client.get("/api/messages/1")
+
+_SPACE_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\?(\s*,\s*\?)+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+MAX_PARAM_CHARS = 200
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST_RE.sub("?, ...", _SPACE_RE.sub(" ", statement).strip())
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.handler: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started = time.time()
+        self.duration_ms = 0.0
+        self.statements: list[dict] = []
+        self.plans: dict[str, list[str]] = {}
+
+    @property
+    def db_ms(self) -> float:
+        return sum(s["ms"] for s in self.statements)
+
+    def repeated(self, threshold: int) -> list[dict]:
+        counts = Counter(s["shape"] for s in self.statements)
+        return [{"shape": shape, "count": n} for shape, n in counts.most_common() if n >= threshold]
+
+    def summary(self, threshold: int) -> dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "handler": self.handler,
+            "status": self.status, "duration_ms": round(self.duration_ms, 3),
+            "queries": len(self.statements), "db_ms": round(self.db_ms, 3),
+            "n_plus_one": len(self.repeated(threshold)),
+            "slow": sum(1 for s in self.statements if s.get("slow")),
+        }
+
+    def detail(self, threshold: int) -> dict:
+        return {**self.summary(threshold), "statements": self.statements, "repeated": self.repeated(threshold),
+                "plans": self.plans}
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("mycampus_sql_profile", default=None)
+
+def _explain(conn, statement: str, parameters, executemany: bool) -> list[str]:
+    params = parameters[0] if executemany and parameters else parameters
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, params or ())
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+class SqlProfiler:
+    def __init__(self, enabled: bool, slow_ms: float, repeat: int, keep: int):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.repeat = repeat
+        self.keep = keep
+        self.recent: "OrderedDict[str, RequestProfile]" = OrderedDict()
+
+    def instrument_engine(self, sync_engine):
+        if not self.enabled:
+            return
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None:
+                conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            profile = _current.get()
+            starts = conn.info.get("profile_query_start")
+            if profile is None or not starts:
+                return
+            ms = (time.perf_counter() - starts.pop()) * 1000
+            shape = statement_shape(statement)
+            entry = {
+                "sql": statement, "shape": shape, "ms": round(ms, 3),
+                "params": repr(parameters)[:MAX_PARAM_CHARS], "executemany": executemany,
+            }
+            if ms >= self.slow_ms:
+                entry["slow"] = True
+                if shape not in profile.plans and shape.lstrip("( ").upper().startswith(_EXPLAINABLE):
+                    try:
+                        profile.plans[shape] = _explain(conn, statement, parameters, executemany)
+                    except Exception as exc:
+                        profile.plans[shape] = [f"EXPLAIN failed: {exc}"]
+                plan = profile.plans.get(shape, ())
+                entry["full_scan"] = any(
+                    line.startswith("SCAN ") and "INDEX" not in line for line in plan
+                )
+            profile.statements.append(entry)
+
+    def _store(self, profile: RequestProfile):
+        self.recent[profile.id] = profile
+        while len(self.recent) > self.keep:
+            self.recent.popitem(last=False)
+
+    def header(self, profile: RequestProfile) -> str:
+        return (f"queries={len(profile.statements)}; db_ms={profile.db_ms:.2f}; "
+                f"n_plus_one={len(profile.repeated(self.repeat))}; "
+                f"slow={sum(1 for s in profile.statements if s.get('slow'))}")
+
+class SqlProfileMiddleware:
+    def __init__(self, app, profiler: SqlProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/debug/sql"):
+            return await self.app(scope, receive, send)
+        profiler = self.profiler
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current.set(profile)
+        t0 = time.perf_counter()
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                # What ran before the response started; the debug endpoint has the rest
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-profile", profiler.header(profile).encode()))
+                headers.append((b"x-sql-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _current.reset(token)
+            profile.duration_ms = (time.perf_counter() - t0) * 1000
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                profile.handler = getattr(endpoint, "__name__", None)
+            profiler._store(profile)
+
+@contextmanager
+def query_budget(max_queries: int, engines: Optional[Iterable] = None):
+    """Fail with AssertionError if the block runs more than `max_queries` SQL statements.
+
+    Counts statements on the app's engines, including running group-commit writers (or
+    `engines`, sync Engine objects), from any thread, so requests made through TestClient
+    inside the block are included. Yields the list of statements seen so far.
+    """
+    if engines is None:
+        from .db import async_engine, engine
+        from .writer import writer, ws_writer
+        engines = [engine, async_engine.sync_engine]
+        for w in {id(w): w for w in (writer, ws_writer) if w is not None}.values():
+            if w._engine is not None:
+                engines.append(w._engine.sync_engine)
+    engines = list(engines)
+    seen: list[str] = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    for e in engines:
+        event.listen(e, "after_cursor_execute", _count)
+    try:
+        yield seen
+    finally:
+        for e in engines:
+            event.remove(e, "after_cursor_execute", _count)
+    if len(seen) > max_queries:
+        listing = "\n".join(f"  {i}. {statement_shape(s)}" for i, s in enumerate(seen, 1))
+        raise AssertionError(f"{len(seen)} SQL statements, budget is {max_queries}:\n{listing}")
+
+def assert_query_budget(client, method: str, url: str, max_queries: int, **kwargs):
+    """Make one request with a test client and check its query budget; returns the response."""
+    with query_budget(max_queries):
+        return client.request(method, url, **kwargs)
+
+profiler = SqlProfiler(
+    enabled=os.environ.get("MYCAMPUS_SQL_PROFILE", "0").lower() in ("1", "true", "yes", "on"),
+    slow_ms=float(os.environ.get("MYCAMPUS_SQL_PROFILE_SLOW_MS", "5")),
+    repeat=int(os.environ.get("MYCAMPUS_SQL_PROFILE_REPEAT", "3")),
+    keep=int(os.environ.get("MYCAMPUS_SQL_PROFILE_KEEP", "100")),
+)
@@ -0,0 +1,696 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+from fastapi import WebSocket
+from .broker import Broker, InProcessBroker
+from .metrics import metrics
+
+# Websocket fan-out for chat rooms.
+# Every connection gets a bounded outbound queue drained by its own writer task, so a
+# slow client only ever delays itself. Events are JSON-encoded once per broadcast and
+# the same text frame is queued for every recipient.
+#
+# A connection can follow any number of rooms (the multiplexed /ws endpoint subscribes
+# and unsubscribes by frame; /ws/{room_id} is one fixed subscription). Subscriptions
+# are indexed both ways: room -> connections for broadcast, connection -> rooms so a
+# disconnect only touches the rooms it was in. Every frame carries its room_id.
+#
+#   MYCAMPUS_WS_QUEUE_SIZE   frames buffered per connection before it counts as too slow (default 256)
+#   MYCAMPUS_WS_MAX_ROOMS    rooms one connection may subscribe to (default 500)
+#   MYCAMPUS_WS_SLOW_POLICY  what to do with a connection whose queue is full:
+#       disconnect   close it with 1013 so the client reconnects and reloads (default)
+#       drop_oldest  discard the oldest queued frame to make room
+#       resync       replace the whole backlog with one {"type": "resync"} frame
+#
+# Typing indicators are not fanned out as they arrive. Each worker keeps who is typing
+# per room (from every typing:start/typing:stop the broker delivers) and, on a fixed
+# tick, sends one {"type": "typing", "users": [...]} frame per room whose set changed.
+# Repeated typing:start from someone already typing only extends their expiry.
+#
+#   MYCAMPUS_TYPING_TICK_MS  aggregation tick (default 250; 0 relays every frame as before)
+#   MYCAMPUS_TYPING_TTL_MS   drop a typist not heard from for this long (default 3000)
+#
+# Presence: a connection identified as a user (?user_id=&user_name= or an "identify"
+# frame) counts that user online in every room it follows. Per-room and per-user online
+# sets are reference counts updated in O(1) on subscribe/unsubscribe. A socket that
+# goes away keeps its user online for a grace period so a reconnect is silent. Joins
+# and leaves are gathered per tick into one {"type": "presence", "joined": [...],
+# "left": [...]} frame per room, published through the broker; every worker applies
+# those deltas to its copy of the online sets and forwards only real changes (a user
+# with sockets on two workers joins once). A worker started later learns presence from
+# subsequent changes only. Clients that send {"type": "ping"} get a pong and are then
+# expected to keep doing so; silent ones are closed after the heartbeat timeout.
+# Presence frames name the worker they come from, and a worker with online users
+# publishes a presence:heartbeat every third of the presence TTL. Users announced by a
+# worker not heard from for the TTL (it crashed without sending its leaves) are dropped
+# and their leaves forwarded by every other worker. A worker whose own tick stalled past
+# the TTL announces its users again.
+#
+#
+# Catch-up: chat events carry a per-room "seq" (kept in room_counters, so every worker
+# agrees). Each worker remembers the last frames per room in a ring buffer; a client
+# that reconnects with the last seq it saw gets the missed frames from there, or from
+# the database when the buffer does not reach back far enough.
+#
+#   MYCAMPUS_WS_REPLAY_SIZE   frames kept per room (default 128; 0 turns the buffer off)
+#   MYCAMPUS_WS_REPLAY_ROOMS  rooms with a buffer, least recently active dropped first (default 1000)
+#
+#   MYCAMPUS_PRESENCE_TICK_MS       presence batching tick (default 1000)
+#   MYCAMPUS_PRESENCE_GRACE_MS      reconnect grace before a leave goes out (default 10000)
+#   MYCAMPUS_PRESENCE_TTL_MS        drop users of a worker silent this long (default 30000; 0 never)
+#   MYCAMPUS_WS_HEARTBEAT_TIMEOUT_MS  close heartbeating clients silent this long (default 60000)
+
+SLOW_POLICIES = ("disconnect", "drop_oldest", "resync")
+RESYNC_FRAME = json.dumps({"type": "resync"})
+TYPING_EVENTS = ("typing:start", "typing:stop")
+PONG_FRAME = json.dumps({"type": "pong"})
+HEARTBEAT_ROOM = 0
+
+class Connection:
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=manager.queue_size)
+        self.rooms: set[int] = set()
+        # {"id", "name"} once identified; counts toward presence
+        self.user: Optional[dict] = None
+        # Set once the client sends its first ping; only then is silence a timeout
+        self.heartbeat = False
+        self.last_seen = asyncio.get_running_loop().time()
+        self.closed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    @property
+    def lagging(self) -> bool:
+        return self.queue.qsize() * 2 >= self.queue.maxsize
+
+    def memory(self) -> int:
+        # Estimate in bytes of what this connection holds on the server side: the
+        # connection and socket objects, subscription set, queue and queued frames
+        queued = list(self.queue._queue)
+        size = (
+            sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+            + sys.getsizeof(self.websocket) + sys.getsizeof(getattr(self.websocket, "__dict__", {}))
+            + sys.getsizeof(self.rooms) + sys.getsizeof(self.queue) + sys.getsizeof(self.queue._queue)
+            + sum(sys.getsizeof(frame) for frame in queued)
+        )
+        if self._writer is not None:
+            size += sys.getsizeof(self._writer)
+        return size
+
+    def enqueue(self, frame: str) -> bool:
+        # Never blocks the broadcaster; returns False when the connection was dropped
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+        stats = self.manager.stats
+        policy = self.manager.slow_policy
+        if policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(frame)
+            stats["frames_dropped"] += 1
+            return True
+        if policy == "resync":
+            stats["frames_dropped"] += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME)
+            stats["resyncs"] += 1
+            return True
+        stats["frames_dropped"] += self.queue.qsize() + 1
+        stats["slow_disconnects"] += 1
+        self.manager.drop(self, code=1013)
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send_text(frame)
+                self.manager.stats["frames_sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Broken connection
+            self.manager.stats["send_errors"] += 1
+            self.manager.drop(self)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+class TypingCoalescer:
+    def __init__(self, manager: "ConnectionManager", tick: float, ttl: float):
+        self.manager = manager
+        self.tick = tick
+        self.ttl = ttl
+        # room -> user key -> (user, expires at); rooms leave the map when nobody types
+        self.rooms: dict[int, dict[str, tuple[dict, float]]] = {}
+        self.dirty: set[int] = set()
+        self.stats = {
+            "typing_updates": 0,
+            "typing_duplicates": 0,
+            "typing_expired": 0,
+            "typing_frames_sent": 0,
+        }
+        # Frames the updates would have cost if relayed one by one
+        self._relayed_equivalent = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.tick > 0
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.rooms.clear()
+        self.dirty.clear()
+
+    def update(self, room_id: int, message: dict):
+        user = message.get("user")
+        if not isinstance(user, dict):
+            return
+        key = str(user.get("id") or user.get("name") or "")
+        if not key:
+            return
+        self.stats["typing_updates"] += 1
+        self._relayed_equivalent += len(self.manager.rooms.get(room_id, ()))
+        typing = self.rooms.get(room_id)
+        if message.get("type") == "typing:start":
+            if typing is None:
+                typing = self.rooms[room_id] = {}
+            previous = typing.get(key)
+            typing[key] = (user, asyncio.get_running_loop().time() + self.ttl)
+            if previous is not None and previous[0] == user:
+                self.stats["typing_duplicates"] += 1
+                return
+        else:
+            if typing is None or typing.pop(key, None) is None:
+                self.stats["typing_duplicates"] += 1
+                return
+            if not typing:
+                del self.rooms[room_id]
+        self.dirty.add(room_id)
+
+    def flush(self):
+        now = asyncio.get_running_loop().time()
+        for room_id, typing in list(self.rooms.items()):
+            expired = [key for key, (_, expires) in typing.items() if expires <= now]
+            if not expired:
+                continue
+            for key in expired:
+                del typing[key]
+            self.stats["typing_expired"] += len(expired)
+            self.dirty.add(room_id)
+            if not typing:
+                del self.rooms[room_id]
+        dirty, self.dirty = self.dirty, set()
+        for room_id in dirty:
+            conns = self.manager.rooms.get(room_id)
+            if not conns:
+                continue
+            users = [user for user, _ in self.rooms.get(room_id, {}).values()]
+            frame = json.dumps({"type": "typing", "room_id": room_id, "users": users})
+            for conn in list(conns):
+                conn.enqueue(frame)
+            self.stats["typing_frames_sent"] += len(conns)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "typing_frames_saved": max(0, self._relayed_equivalent - self.stats["typing_frames_sent"]),
+            "typing_rooms": len(self.rooms),
+            "typing_users": sum(len(t) for t in self.rooms.values()),
+            "typing_tick_ms": int(self.tick * 1000),
+        }
+
+class ReplayBuffer:
+    def __init__(self, size: int, max_rooms: int):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.rooms: "OrderedDict[int, deque[tuple[int, str]]]" = OrderedDict()
+        self.stats = {"replays_from_buffer": 0, "replays_from_database": 0, "replayed_frames": 0, "resyncs_requested": 0}
+
+    def record(self, room_id: int, seq: int, frame: str):
+        if self.size <= 0:
+            return
+        events = self.rooms.get(room_id)
+        if events is None:
+            events = self.rooms[room_id] = deque(maxlen=self.size)
+            if len(self.rooms) > self.max_rooms:
+                self.rooms.popitem(last=False)
+        else:
+            self.rooms.move_to_end(room_id)
+        events.append((seq, frame))
+
+    def since(self, room_id: int, seq: int) -> Optional[list[str]]:
+        # Frames after `seq`, or None when the buffer cannot prove it has all of them
+        events = self.rooms.get(room_id)
+        if not events:
+            return None
+        # Commits can be broadcast slightly out of order; the buffer is small, sort it
+        ordered = sorted(events)
+        if ordered[0][0] > seq + 1 or ordered[-1][0] < seq:
+            return None
+        frames = []
+        expected = seq + 1
+        for event_seq, frame in ordered:
+            if event_seq <= seq:
+                continue
+            if event_seq != expected:
+                return None
+            frames.append(frame)
+            expected += 1
+        return frames
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "replay_rooms": len(self.rooms),
+            "replay_frames": sum(len(events) for events in self.rooms.values()),
+        }
+
+class Presence:
+    def __init__(self, manager: "ConnectionManager", tick: float, grace: float, heartbeat_timeout: float, ttl: float):
+        self.manager = manager
+        self.tick = tick
+        self.grace = grace
+        self.heartbeat_timeout = heartbeat_timeout
+        self.ttl = ttl
+        self.worker = uuid.uuid4().hex
+        # This worker's sockets: (room, user id) -> [user, connections]; and leaves waiting out the grace
+        self.local: dict[tuple[int, str], list] = {}
+        self.leaving: dict[tuple[int, str], float] = {}
+        self.joined: dict[int, dict[str, dict]] = {}
+        self.left: dict[int, set[str]] = {}
+        # Online sets across workers, built from presence frames: room -> user id -> [user, workers]
+        self.online: dict[int, dict[str, list]] = {}
+        self.user_rooms: dict[str, set[int]] = {}
+        # Other workers: when each was last heard from, and the (room, user id) it announced
+        self.workers: dict[str, float] = {}
+        self.worker_keys: dict[str, set[tuple[int, str]]] = {}
+        self.stats = {
+            "presence_joins": 0,
+            "presence_leaves": 0,
+            "presence_reconnects": 0,
+            "presence_frames": 0,
+            "presence_heartbeats": 0,
+            "presence_expired_workers": 0,
+            "heartbeat_timeouts": 0,
+        }
+        self._last_beat: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Tell the other workers this one's users are gone
+        for key in list(self.local) + list(self.leaving):
+            self._leave(key)
+        self.local.clear()
+        self.leaving.clear()
+        try:
+            await self.flush()
+        except Exception:
+            pass
+
+    def add(self, conn: Connection, room_id: int):
+        key = (room_id, conn.user["id"])
+        entry = self.local.get(key)
+        if entry is not None:
+            entry[1] += 1
+            return
+        self.local[key] = [conn.user, 1]
+        if self.leaving.pop(key, None) is not None:
+            # Back within the grace period: nobody saw them go
+            self.stats["presence_reconnects"] += 1
+            return
+        left = self.left.get(room_id)
+        if left is not None and key[1] in left:
+            left.discard(key[1])
+        else:
+            self.joined.setdefault(room_id, {})[key[1]] = conn.user
+
+    def remove(self, conn: Connection, room_id: int, grace: bool):
+        key = (room_id, conn.user["id"])
+        entry = self.local.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del self.local[key]
+        if grace and self.grace > 0:
+            self.leaving[key] = asyncio.get_running_loop().time() + self.grace
+        else:
+            self._leave(key)
+
+    def _leave(self, key: tuple[int, str]):
+        room_id, user_id = key
+        joined = self.joined.get(room_id)
+        if joined is not None and joined.pop(user_id, None) is not None:
+            return  # joined and left within one tick
+        self.left.setdefault(room_id, set()).add(user_id)
+
+    async def flush(self):
+        now = asyncio.get_running_loop().time()
+        for key in [k for k, deadline in self.leaving.items() if deadline <= now]:
+            del self.leaving[key]
+            self._leave(key)
+        if self.ttl > 0 and self.local and (self._last_beat is None or now - self._last_beat >= self.ttl / 3):
+            if self._last_beat is not None and now - self._last_beat > self.ttl:
+                # Silent past the TTL: the other workers have dropped our users
+                for (room_id, user_id), (user, _) in self.local.items():
+                    self.joined.setdefault(room_id, {})[user_id] = user
+            await self.manager.broadcast(HEARTBEAT_ROOM, {"type": "presence:heartbeat", "worker": self.worker})
+            self.stats["presence_heartbeats"] += 1
+            self._last_beat = now
+        rooms = set(self.joined) | set(self.left)
+        joined, self.joined = self.joined, {}
+        left, self.left = self.left, {}
+        for room_id in rooms:
+            users = list(joined.get(room_id, {}).values())
+            gone = sorted(left.get(room_id, ()))
+            if users or gone:
+                await self.manager.broadcast(room_id, {"type": "presence", "worker": self.worker, "joined": users, "left": gone})
+                self.stats["presence_frames"] += 1
+        if self.ttl > 0:
+            for worker in [w for w, heard in self.workers.items() if now - heard > self.ttl]:
+                await self._expire(worker)
+        if self.heartbeat_timeout > 0:
+            for conn in list(self.manager.connections.values()):
+                if conn.heartbeat and now - conn.last_seen > self.heartbeat_timeout:
+                    self.stats["heartbeat_timeouts"] += 1
+                    self.manager.drop(conn, code=1001)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception:
+                # A broker hiccup must not stop presence for good; next tick retries new changes
+                pass
+
+    def heard(self, worker) -> None:
+        # Any frame from another worker renews its presence TTL
+        if isinstance(worker, str) and worker != self.worker:
+            self.workers[worker] = asyncio.get_running_loop().time()
+
+    async def _expire(self, worker: str):
+        # The worker stopped heartbeating: its users leave wherever no other worker has them
+        del self.workers[worker]
+        self.stats["presence_expired_workers"] += 1
+        left: dict[int, list[str]] = {}
+        for room_id, user_id in self.worker_keys.pop(worker, ()):
+            entry = self.online.get(room_id, {}).get(user_id)
+            if entry is None:
+                continue
+            entry[1].discard(worker)
+            if not entry[1]:
+                self._offline(room_id, user_id)
+                left.setdefault(room_id, []).append(user_id)
+        for room_id, user_ids in left.items():
+            self.stats["presence_leaves"] += len(user_ids)
+            await self.manager.fanout(room_id, {"type": "presence", "room_id": room_id, "joined": [], "left": sorted(user_ids)})
+
+    def _offline(self, room_id: int, user_id: str):
+        online = self.online[room_id]
+        del online[user_id]
+        if not online:
+            del self.online[room_id]
+        rooms = self.user_rooms.get(user_id)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self.user_rooms[user_id]
+
+    def apply(self, room_id: int, message: dict) -> Optional[dict]:
+        # Fold one presence frame into the online sets; returns the frame to forward
+        # (only users whose online state actually changed) or None
+        worker = message.get("worker", "")
+        self.heard(worker)
+        keys = self.worker_keys.setdefault(worker, set()) if worker != self.worker else None
+        online = self.online.setdefault(room_id, {})
+        joined = []
+        for user in message.get("joined", ()):
+            entry = online.get(user["id"])
+            if entry is None:
+                online[user["id"]] = [user, {worker}]
+                self.user_rooms.setdefault(user["id"], set()).add(room_id)
+                joined.append(user)
+            else:
+                entry[1].add(worker)
+            if keys is not None:
+                keys.add((room_id, user["id"]))
+        left = []
+        for user_id in message.get("left", ()):
+            if keys is not None:
+                keys.discard((room_id, user_id))
+            entry = online.get(user_id)
+            if entry is None:
+                continue
+            entry[1].discard(worker)
+            if not entry[1]:
+                self._offline(room_id, user_id)
+                left.append(user_id)
+        if keys is not None and not keys:
+            del self.worker_keys[worker]
+        if not online:
+            self.online.pop(room_id, None)
+        self.stats["presence_joins"] += len(joined)
+        self.stats["presence_leaves"] += len(left)
+        if not joined and not left:
+            return None
+        return {"type": "presence", "room_id": room_id, "joined": joined, "left": left}
+
+    def room_count(self, room_id: int) -> int:
+        return len(self.online.get(room_id, ()))
+
+    def room_users(self, room_id: int) -> list[dict]:
+        return [user for user, _ in self.online.get(room_id, {}).values()]
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.user_rooms
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "presence_rooms": len(self.online),
+            "presence_users": len(self.user_rooms),
+            "presence_grace_pending": len(self.leaving),
+            "presence_workers": len(self.workers),
+            "presence_ttl_ms": int(self.ttl * 1000),
+        }
+
+class ConnectionManager:
+    def __init__(self, broker: Optional[Broker] = None, queue_size: Optional[int] = None, slow_policy: Optional[str] = None):
+        self.rooms: dict[int, set[Connection]] = {}
+        self.connections: dict[WebSocket, Connection] = {}
+        self.broker: Broker = broker or InProcessBroker()
+        self.queue_size = queue_size or int(os.environ.get("MYCAMPUS_WS_QUEUE_SIZE", "256"))
+        self.max_rooms = int(os.environ.get("MYCAMPUS_WS_MAX_ROOMS", "500"))
+        self.slow_policy = slow_policy or os.environ.get("MYCAMPUS_WS_SLOW_POLICY", "disconnect")
+        if self.slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {self.slow_policy!r}")
+        self.typing = TypingCoalescer(
+            self,
+            tick=float(os.environ.get("MYCAMPUS_TYPING_TICK_MS", "250")) / 1000.0,
+            ttl=float(os.environ.get("MYCAMPUS_TYPING_TTL_MS", "3000")) / 1000.0,
+        )
+        self.replay = ReplayBuffer(
+            size=int(os.environ.get("MYCAMPUS_WS_REPLAY_SIZE", "128")),
+            max_rooms=int(os.environ.get("MYCAMPUS_WS_REPLAY_ROOMS", "1000")),
+        )
+        self.presence = Presence(
+            self,
+            tick=float(os.environ.get("MYCAMPUS_PRESENCE_TICK_MS", "1000")) / 1000.0,
+            grace=float(os.environ.get("MYCAMPUS_PRESENCE_GRACE_MS", "10000")) / 1000.0,
+            heartbeat_timeout=float(os.environ.get("MYCAMPUS_WS_HEARTBEAT_TIMEOUT_MS", "60000")) / 1000.0,
+            ttl=float(os.environ.get("MYCAMPUS_PRESENCE_TTL_MS", "30000")) / 1000.0,
+        )
+        self.stats = {
+            "broadcasts": 0,
+            "frames_sent": 0,
+            "frames_dropped": 0,
+            "slow_disconnects": 0,
+            "resyncs": 0,
+            "send_errors": 0,
+        }
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+        self.typing.start()
+        self.presence.start()
+
+    async def stop(self):
+        await self.presence.stop()
+        await self.broker.stop()
+        await self.typing.stop()
+        for conn in list(self.connections.values()):
+            await conn.close(code=1001)
+        self.rooms.clear()
+        self.connections.clear()
+
+    async def connect(self, websocket: WebSocket, room_ids: Iterable[int] = (), user: Optional[dict] = None) -> Connection:
+        await websocket.accept()
+        conn = Connection(websocket, self)
+        conn.start()
+        self.connections[websocket] = conn
+        if user is not None:
+            self.identify(conn, user)
+        self.subscribe(conn, room_ids)
+        return conn
+
+    def identify(self, conn: Connection, user: dict):
+        """Attach a user ({"id", "name"}) to a connection; re-identifying moves its presence."""
+        rooms = list(conn.rooms)
+        if conn.user is not None:
+            for room_id in rooms:
+                self.presence.remove(conn, room_id, grace=False)
+        conn.user = user
+        for room_id in rooms:
+            self.presence.add(conn, room_id)
+
+    def touch(self, conn: Connection, ping: bool = False):
+        # Any frame from the client counts as a heartbeat
+        conn.last_seen = asyncio.get_running_loop().time()
+        if ping:
+            conn.heartbeat = True
+            conn.enqueue(PONG_FRAME)
+
+    def subscribe(self, conn: Connection, room_ids: Iterable[int]) -> list[int]:
+        """Add rooms to a connection; returns the ones refused because of MYCAMPUS_WS_MAX_ROOMS."""
+        refused = []
+        for room_id in room_ids:
+            if room_id in conn.rooms:
+                continue
+            if len(conn.rooms) >= self.max_rooms:
+                refused.append(room_id)
+                continue
+            conn.rooms.add(room_id)
+            self.rooms.setdefault(room_id, set()).add(conn)
+            if conn.user is not None:
+                self.presence.add(conn, room_id)
+        return refused
+
+    def unsubscribe(self, conn: Connection, room_ids: Iterable[int], grace: bool = False):
+        for room_id in room_ids:
+            if room_id not in conn.rooms:
+                continue
+            conn.rooms.discard(room_id)
+            if conn.user is not None:
+                self.presence.remove(conn, room_id, grace)
+            conns = self.rooms.get(room_id)
+            if conns is not None:
+                conns.discard(conn)
+                if not conns:
+                    del self.rooms[room_id]
+
+    def disconnect(self, websocket: WebSocket):
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return
+        conn.closed = True
+        if conn._writer is not None and conn._writer is not asyncio.current_task():
+            conn._writer.cancel()
+        # Presence leaves wait out the grace period in case the client reconnects
+        self.unsubscribe(conn, list(conn.rooms), grace=True)
+
+    def drop(self, conn: Connection, code: int = 1011):
+        # Server-side removal (slow or broken client); the socket is closed in the background
+        self.disconnect(conn.websocket)
+        asyncio.ensure_future(conn.close(code=code))
+
+    async def broadcast(self, room_id: int, message: dict):
+        # Goes through the broker so sockets held by other workers see it too
+        await self.broker.publish(room_id, message)
+
+    async def deliver(self, room_id: int, message: dict):
+        # Every event the broker hands this worker; typing and presence are folded into
+        # their state first, the rest goes straight to the room's sockets
+        if message.get("type") == "presence:heartbeat":
+            self.presence.heard(message.get("worker"))
+            return
+        if self.typing.enabled and message.get("type") in TYPING_EVENTS:
+            self.typing.update(room_id, message)
+            return
+        if message.get("type") == "presence":
+            message = self.presence.apply(room_id, message)
+            if message is None:
+                return
+        await self.fanout(room_id, message)
+
+    async def fanout(self, room_id: int, message: dict):
+        # Send to the sockets this process holds for the room: encode once, enqueue everywhere
+        seq = message.get("seq")
+        conns = self.rooms.get(room_id)
+        if not conns and seq is None:
+            return
+        t0 = time.perf_counter()
+        # room_id in every frame so a multiplexed client can route it
+        frame = json.dumps(message if "room_id" in message else {**message, "room_id": room_id})
+        if seq is not None:
+            self.replay.record(room_id, seq, frame)
+        if not conns:
+            return
+        self.stats["broadcasts"] += 1
+        for conn in list(conns):
+            conn.enqueue(frame)
+        if metrics.enabled:
+            metrics.broadcast_seconds.observe(time.perf_counter() - t0)
+
+    def snapshot(self) -> dict:
+        conns = list(self.connections.values())
+        memory = [c.memory() for c in conns]
+        return {
+            **self.stats,
+            "connections": len(conns),
+            "rooms": len(self.rooms),
+            "subscriptions": sum(len(c.rooms) for c in conns),
+            "max_subscriptions_per_connection": max((len(c.rooms) for c in conns), default=0),
+            "memory_bytes": sum(memory),
+            "memory_bytes_per_connection": (sum(memory) // len(memory)) if memory else 0,
+            "max_memory_bytes_per_connection": max(memory, default=0),
+            "lagging_connections": sum(1 for c in conns if c.lagging),
+            "queued_frames": sum(c.queue.qsize() for c in conns),
+            "queue_size": self.queue_size,
+            "slow_policy": self.slow_policy,
+            "identified_connections": sum(1 for c in conns if c.user is not None),
+            **self.typing.snapshot(),
+            **self.presence.snapshot(),
+            **self.replay.snapshot(),
+        }
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Request
+from pydantic import BaseModel, TypeAdapter, field_validator
 from typing import List
-from sqlalchemy.orm import Session
-from ..db import get_db
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import Announcement as AnnouncementModel
+from ..cache import cache, serialize
+from .. import fastjson
 
 router = APIRouter()
 
@@ -17,15 +21,29 @@ class Announcement(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_validator('date', mode='before')
+    @classmethod
+    def _iso_date(cls, v):
+        # The column is a Date; the API has always sent 'YYYY-MM-DD'
+        return v.isoformat() if isinstance(v, date) else v
+
+_announcements_json = TypeAdapter(List[Announcement])
+_announcements_fast = fastjson.RowEncoder(AnnouncementModel, Announcement)
+
 @router.get('/announcements', response_model=List[Announcement])
-def list_announcements(db: Session = Depends(get_db)):
-    rows = db.query(AnnouncementModel).order_by(AnnouncementModel.date.desc()).all()
-    return rows
+async def list_announcements(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        if fastjson.enabled:
+            q = _announcements_fast.select().order_by(AnnouncementModel.date.desc())
+            return _announcements_fast.dumps((await db.execute(q)).all())
+        rows = (await db.scalars(select(AnnouncementModel).order_by(AnnouncementModel.date.desc()))).all()
+        return serialize(_announcements_json, rows)
+    return await cache.respond(request, 'announcements', None, load)
 
 class MarkReadRequest(BaseModel):
     pass
 
 @router.post('/announcements/{announcement_id}/read')
-def mark_as_read(announcement_id: int, _: MarkReadRequest | None = None):
+async def mark_as_read(announcement_id: int, _: MarkReadRequest | None = None):
     # Placeholder: would create per-user read receipt
     return {"status": "ok"}
@@ -0,0 +1,123 @@
+import json
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Literal, Optional
+from ..bulk import DEFAULT_BATCH_SIZE, TableSpec, export_stream, import_stream
+from ..cache import cache
+from ..db import engine, async_engine
+from ..models import Event as EventModel, Leave as LeaveModel, Subject as SubjectModel
+from ..models import Timetable as TimetableModel, TimetableCell
+from ..timetables import migrate_json_rows, week_from_cells
+from .events import Event, _check_range
+from .leaves import LeaveRequest
+from .subjects import Subject
+from .timetable import Timetable
+
+router = APIRouter()
+
+def _count_imported_leaves(conn, rows: list[dict]):
+    # Same counters create_leave maintains, aggregated per batch
+    counts: Counter = Counter()
+    for r in rows:
+        counts[('all', '', r['status'])] += 1
+        counts[('department', r['department'], r['status'])] += 1
+        counts[('mentor', r['mentorName'], r['status'])] += 1
+        counts[('leaveType', r['leaveType'], r['status'])] += 1
+    conn.exec_driver_sql(
+        "INSERT INTO leave_counters (dimension, value, status, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(dimension, value, status) DO UPDATE SET count = count + excluded.count",
+        [(*key, n) for key, n in counts.items()],
+    )
+
+def _check_event(event: Event):
+    # Same rule as create_event / update_event
+    try:
+        _check_range(event)
+    except HTTPException as exc:
+        raise ValueError(exc.detail)
+
+# Timetables travel as the API's {id, section, data: {day: [entry, ...]}}; cells are
+# written from the imported week and exported weeks are rebuilt from the cells
+def _decode_timetable(record: dict) -> dict:
+    if isinstance(record.get('data'), str):
+        try:
+            return {**record, 'data': json.loads(record['data'])}
+        except ValueError as exc:
+            raise ValueError(f"data: invalid JSON: {exc}")
+    return record
+
+def _encode_timetable(values: dict) -> dict:
+    return {**values, 'data': json.dumps(values['data'])}
+
+def _explode_imported_timetables(conn, rows: list[dict]):
+    ids = conn.execute(
+        select(TimetableModel.id).where(TimetableModel.section.in_([r['section'] for r in rows]))
+    ).scalars().all()
+    migrate_json_rows(conn, ids=ids)
+
+async def _timetable_weeks(conn, rows: list) -> list:
+    cells = (await conn.execute(
+        select(TimetableCell)
+        .where(TimetableCell.section.in_([r.section for r in rows]))
+        .order_by(TimetableCell.section, TimetableCell.day_order, TimetableCell.period)
+    )).all()
+    by_section: dict = {}
+    for cell in cells:
+        by_section.setdefault(cell.section, []).append(cell)
+    return [(r.id, r.section, week_from_cells(by_section.get(r.section, []))) for r in rows]
+
+TABLES = {
+    'events': TableSpec('events', EventModel.__table__, Event, optional_id=True, check=_check_event),
+    'leaves': TableSpec('leaves', LeaveModel.__table__, LeaveRequest, after_insert=_count_imported_leaves),
+    'subjects': TableSpec('subjects', SubjectModel.__table__, Subject),
+    'timetables': TableSpec(
+        'timetables', TimetableModel.__table__, Timetable, optional_id=True,
+        decode=_decode_timetable, encode=_encode_timetable,
+        after_insert=_explode_imported_timetables, export_partition=_timetable_weeks,
+    ),
+}
+
+MEDIA_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def _spec(table: str) -> TableSpec:
+    spec = TABLES.get(table)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    return spec
+
+def _format(request: Request, format: Optional[str]) -> str:
+    if format:
+        return format
+    content_type = request.headers.get('content-type', '')
+    return 'ndjson' if 'ndjson' in content_type or 'jsonl' in content_type else 'csv'
+
+@router.post('/import/{table}')
+async def import_table(
+    table: str,
+    request: Request,
+    format: Optional[Literal['csv', 'ndjson']] = None,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000),
+):
+    # Body is the raw file (CSV with a header row, or one JSON object per line); the
+    # format comes from ?format= or the Content-Type. Returns counts plus the first
+    # errors as {"row": n, "error": "..."}.
+    spec = _spec(table)
+    try:
+        report = await import_stream(engine, spec, request.stream(), _format(request, format), batch_size)
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Could not read the file: {exc}")
+    finally:
+        if table in ('events', 'subjects', 'timetables'):
+            cache.bump(table)
+    return report
+
+@router.get('/export/{table}')
+async def export_table(table: str, format: Literal['csv', 'ndjson'] = 'csv'):
+    spec = _spec(table)
+    return StreamingResponse(
+        export_stream(async_engine, spec, format),
+        media_type=MEDIA_TYPES[format],
+        headers={'content-disposition': f'attachment; filename="{table}.{format}"'},
+    )
@@ -1,36 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select, delete, func, insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 from datetime import datetime
-from ..db import get_db
+import json
+from ..db import AsyncSessionLocal, get_async_db
+from ..writer import run_write, ws_writer
+from ..pagination import encode_cursor, decode_cursor
+from ..attachments import blob_refs
+from .. import search as search_index
+from ..broker import broker_from_env
+from ..realtime import ConnectionManager
+from .. import fastjson
 from ..models import ChatRoom as ChatRoomModel, Message as MessageModel
 from fastapi import WebSocket, WebSocketDisconnect
 
-class ConnectionManager:
-    def __init__(self):
-        self.rooms: dict[int, set[WebSocket]] = {}
-
-    async def connect(self, room_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.rooms.setdefault(room_id, set()).add(websocket)
-
-    def disconnect(self, room_id: int, websocket: WebSocket):
-        conns = self.rooms.get(room_id)
-        if conns and websocket in conns:
-            conns.remove(websocket)
-            if not conns:
-                self.rooms.pop(room_id, None)
-
-    async def broadcast(self, room_id: int, message: dict):
-        for ws in list(self.rooms.get(room_id, set())):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                # Drop broken connections
-                self.disconnect(room_id, ws)
-
-manager = ConnectionManager()
+manager = ConnectionManager(broker_from_env())
 
 router = APIRouter()
 
@@ -48,27 +37,72 @@ class Message(BaseModel):
     sender_name: str
     content: str
     timestamp: str
+    client_id: Optional[str] = None
     class Config:
         from_attributes = True
 
+_messages_fast = fastjson.RowEncoder(MessageModel, Message)
+
 @router.get('/chatrooms', response_model=List[ChatRoom])
-def list_chatrooms(db: Session = Depends(get_db)):
-    return db.query(ChatRoomModel).order_by(ChatRoomModel.id.asc()).all()
+async def list_chatrooms(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(ChatRoomModel).order_by(ChatRoomModel.id.asc()))).all()
 
 @router.get('/messages/{room_id}', response_model=List[Message])
-def list_messages(room_id: int, offset: int = 0, limit: int = 100, user_id: Optional[str] = None, db: Session = Depends(get_db)):
+async def list_messages(
+    room_id: int,
+    response: Response,
+    offset: int = 0,
+    limit: int = 100,
+    user_id: Optional[str] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Keyset paging via before_id / after_id / opaque cursor; cursors for the older and
+    # newer neighbouring pages come back in X-Prev-Cursor / X-Next-Cursor.
+    # offset is kept for old clients but gets slower the deeper it goes.
     from ..models import UserMessageState as UMS, RoomUserState as RUS
-    q = db.query(MessageModel).filter(MessageModel.room_id == room_id, MessageModel.deleted == 0)
-    # Exclude cleared messages
+    if cursor:
+        data = decode_cursor(cursor)
+        try:
+            pivot = int(data['id'])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+        if data.get('d') == 'before':
+            before_id = pivot
+        elif data.get('d') == 'after':
+            after_id = pivot
+        else:
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+    fast = fastjson.enabled
+    q = (_messages_fast.select() if fast else select(MessageModel)).where(MessageModel.room_id == room_id, MessageModel.deleted == 0)
     if user_id:
-        rus = db.query(RUS).filter(RUS.room_id == room_id, RUS.user_id == user_id).first()
-        if rus:
-            q = q.filter(MessageModel.timestamp > rus.cleared_at)
-        # Exclude hidden messages for this user
-        hidden_ids = db.query(UMS.message_id).filter(UMS.user_id == user_id).subquery()
-        q = q.filter(~MessageModel.id.in_(hidden_ids))
-    q = q.order_by(MessageModel.id.asc())
-    return q.offset(offset).limit(limit).all()
+        # Exclude cleared messages
+        cleared_at = await db.scalar(select(RUS.cleared_at).where(RUS.room_id == room_id, RUS.user_id == user_id).limit(1))
+        if cleared_at:
+            q = q.where(MessageModel.timestamp > cleared_at)
+        # Exclude hidden messages for this user; correlated so it only probes rows of this room
+        hidden = select(UMS.id).where(UMS.user_id == user_id, UMS.message_id == MessageModel.id).exists()
+        q = q.where(~hidden)
+    fetch = db.execute if fast else db.scalars
+    if before_id is None and after_id is None:
+        rows = (await fetch(q.order_by(MessageModel.id.asc()).offset(offset).limit(limit))).all()
+    elif after_id is not None and before_id is None:
+        rows = (await fetch(q.where(MessageModel.id > after_id).order_by(MessageModel.id.asc()).limit(limit))).all()
+    else:
+        # Newest page below the pivot, returned oldest first
+        q = q.where(MessageModel.id < before_id)
+        if after_id is not None:
+            q = q.where(MessageModel.id > after_id)
+        rows = list((await fetch(q.order_by(MessageModel.id.desc()).limit(limit))).all())
+        rows.reverse()
+    if rows:
+        response.headers['X-Prev-Cursor'] = encode_cursor({'d': 'before', 'id': rows[0].id})
+        response.headers['X-Next-Cursor'] = encode_cursor({'d': 'after', 'id': rows[-1].id})
+    if fast:
+        return _messages_fast.response(rows, dict(response.headers))
+    return rows
 
 class SendMessage(BaseModel):
     sender_id: str
@@ -76,116 +110,354 @@ class SendMessage(BaseModel):
     content: str
     type: Optional[str] = "text"
     meta: Optional[dict] = None
+    # Optional sender-generated id: a retried send with the same (sender_id, client_id)
+    # returns the stored message instead of posting it twice
+    client_id: Optional[str] = Field(default=None, max_length=64)
+
+def _store_message(room_id: int, payload: SendMessage):
+    async def _write(s: AsyncSession):
+        # basic room existence check
+        room = await s.get(ChatRoomModel, room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail='Room not found')
+        if payload.client_id:
+            existing = await _find_by_client_id(s, payload.sender_id, payload.client_id)
+            if existing is not None:
+                return existing, False
+        row = MessageModel(
+            seq=await _next_seq(s, room_id),
+            room_id=room_id,
+            sender_id=payload.sender_id,
+            sender_name=payload.sender_name,
+            type=payload.type or 'text',
+            content=payload.content,
+            meta=(None if payload.meta is None else json.dumps(payload.meta)),
+            timestamp=datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            client_id=payload.client_id,
+        )
+        s.add(row)
+        await s.flush()
+        await _count_new_message(s, row)
+        return row, True
+    return _write
+
+async def _find_by_client_id(s: AsyncSession, sender_id: str, client_id: str):
+    return await s.scalar(select(MessageModel).where(
+        MessageModel.sender_id == sender_id, MessageModel.client_id == client_id,
+    ).limit(1))
+
+async def _send(room_id: int, payload: SendMessage, db: Optional[AsyncSession] = None, on_stored=None):
+    # Persist (request session / group commit, or the websocket writer when db is None),
+    # then fan out once the write is durable; on_stored(row, created) runs in between.
+    # A duplicate (sender_id, client_id) is returned as-is and not broadcast again.
+    try:
+        if db is None:
+            row, created = await ws_writer.submit(_store_message(room_id, payload))
+        else:
+            row, created = await run_write(db, _store_message(room_id, payload))
+    except IntegrityError:
+        # The same client_id was committed concurrently through another path
+        if db is not None:
+            await db.rollback()
+        async with AsyncSessionLocal() as s:
+            row = await _find_by_client_id(s, payload.sender_id, payload.client_id or '')
+        if row is None:
+            raise
+        created = False
+    if on_stored is not None:
+        on_stored(row, created)
+    if created:
+        await manager.broadcast(room_id, {'type': 'message:new', 'seq': row.seq, 'data': _message_data(row)})
+    return row, created
+
+def _message_data(row: MessageModel) -> dict:
+    data = {
+        'id': row.id,
+        'room_id': row.room_id,
+        'sender_id': row.sender_id,
+        'sender_name': row.sender_name,
+        'content': row.content,
+        'type': row.type,
+        'meta': row.meta,
+        'timestamp': row.timestamp,
+    }
+    if row.client_id:
+        data['client_id'] = row.client_id
+    return data
 
 @router.post('/messages/{room_id}', response_model=Message)
-def send_message(room_id: int, payload: SendMessage, db: Session = Depends(get_db)):
-    # basic room existence check
-    room = db.get(ChatRoomModel, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail='Room not found')
-    import json
-    row = MessageModel(
-        room_id=room_id,
-        sender_id=payload.sender_id,
-        sender_name=payload.sender_name,
-        type=payload.type or 'text',
-        content=payload.content,
-        meta=(None if payload.meta is None else json.dumps(payload.meta)),
-        timestamp=datetime.utcnow().isoformat(timespec='seconds') + 'Z'
-    )
-    db.add(row)
-    db.commit()
-    db.refresh(row)
-    # Broadcast new message event
-    import anyio
-    async def _notify():
-        await manager.broadcast(room_id, {
-            'type': 'message:new',
-            'data': {
-                'id': row.id,
-                'room_id': room_id,
-                'sender_id': row.sender_id,
-                'sender_name': row.sender_name,
-                'content': row.content,
-                'type': row.type,
-                'meta': row.meta,
-                'timestamp': row.timestamp,
-            }
-        })
-    try:
-        anyio.from_thread.run(_notify)
-    except Exception:
-        pass
+async def send_message(room_id: int, payload: SendMessage, db: AsyncSession = Depends(get_async_db)):
+    row, _ = await _send(room_id, payload, db)
     return row
 
 class HideMessage(BaseModel):
     user_id: str
 
 @router.post('/messages/{message_id}/hide')
-def hide_message(message_id: int, payload: HideMessage, db: Session = Depends(get_db)):
+async def hide_message(message_id: int, payload: HideMessage, db: AsyncSession = Depends(get_async_db)):
     from ..models import UserMessageState as UMS
     now = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
-    exists = db.query(UMS).filter(UMS.message_id == message_id, UMS.user_id == payload.user_id).first()
-    if not exists:
-        db.add(UMS(message_id=message_id, user_id=payload.user_id, hidden_at=now))
-        db.commit()
+    async def _write(s: AsyncSession):
+        exists = await s.scalar(select(UMS.id).where(UMS.message_id == message_id, UMS.user_id == payload.user_id).limit(1))
+        if not exists:
+            s.add(UMS(message_id=message_id, user_id=payload.user_id, hidden_at=now))
+    await run_write(db, _write)
     return {"status": "ok"}
 
 class ClearRoom(BaseModel):
     user_id: str
 
 @router.post('/chatrooms/{room_id}/clear')
-def clear_room(room_id: int, payload: ClearRoom, db: Session = Depends(get_db)):
+async def clear_room(room_id: int, payload: ClearRoom, db: AsyncSession = Depends(get_async_db)):
     from ..models import RoomUserState as RUS
     now = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
-    row = db.query(RUS).filter(RUS.room_id == room_id, RUS.user_id == payload.user_id).first()
+    row = await db.scalar(select(RUS).where(RUS.room_id == room_id, RUS.user_id == payload.user_id).limit(1))
     if row:
         row.cleared_at = now
     else:
         db.add(RUS(room_id=room_id, user_id=payload.user_id, cleared_at=now))
-    db.commit()
+    await db.commit()
     return {"status": "ok"}
 
+_sends: set[asyncio.Task] = set()
+
+def _ws_send(conn, room_id, msg: dict):
+    # message:send -> message:ack (server id and timestamp) to the sender after the commit,
+    # then message:new to the room. Runs as its own task so the socket keeps reading while
+    # the write waits for its batch.
+    client_id = msg.get('client_id')
+    def _reply(frame: dict):
+        conn.enqueue(json.dumps({**frame, 'client_id': client_id, 'room_id': room_id}))
+    def _ack(row: MessageModel, created: bool):
+        _reply({'type': 'message:ack', 'id': row.id, 'seq': row.seq, 'timestamp': row.timestamp, 'duplicate': not created})
+    async def _run():
+        try:
+            if not isinstance(client_id, str) or not client_id:
+                raise ValueError('client_id is required')
+            payload = SendMessage.model_validate({
+                'sender_id': msg.get('sender_id'),
+                'sender_name': msg.get('sender_name'),
+                'content': msg.get('content'),
+                'type': msg.get('msg_type') or 'text',
+                'meta': msg.get('meta'),
+                'client_id': client_id,
+            })
+            await _send(room_id, payload, on_stored=_ack)
+        except HTTPException as exc:
+            _reply({'type': 'message:error', 'error': exc.detail})
+        except (ValidationError, ValueError) as exc:
+            _reply({'type': 'message:error', 'error': str(exc)})
+        except Exception:
+            # Not stored; the client may retry with the same client_id
+            _reply({'type': 'message:error', 'error': 'Message could not be stored'})
+    task = asyncio.create_task(_run())
+    _sends.add(task)
+    task.add_done_callback(_sends.discard)
+
+async def _typing(room_id: int, msg: dict):
+    await manager.broadcast(room_id, {
+        'type': msg['type'],
+        'user': msg.get('user', {}),
+        'ts': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    })
+
+def _ws_user(data) -> Optional[dict]:
+    # {"id", "name"} from ?user_id=&user_name= or an identify frame's "user"
+    if data is None:
+        return None
+    user_id = data.get('user_id') if 'user_id' in data else data.get('id')
+    if not isinstance(user_id, str) or not user_id:
+        return None
+    name = data.get('user_name') if 'user_id' in data else data.get('name')
+    return {'id': user_id, 'name': name if isinstance(name, str) else user_id}
+
+def _ws_control(conn, msg: dict, mtype) -> bool:
+    # Frames both websocket endpoints understand: heartbeats and identification
+    manager.touch(conn, ping=(mtype == 'ping'))
+    if mtype == 'ping':
+        return True
+    if mtype == 'identify':
+        user = _ws_user(msg.get('user') if isinstance(msg.get('user'), dict) else None)
+        if user is not None:
+            manager.identify(conn, user)
+            conn.enqueue(json.dumps({'type': 'identified', 'user': user}))
+        return True
+    return False
+
+async def _replay_from_db(room_id: int, since: int, limit: int) -> Optional[list[dict]]:
+    # Current state of every message changed after `since`, one seq each (later edits
+    # supersede earlier ones); None when there is more than `limit` to send
+    async with AsyncSessionLocal() as s:
+        rows = (await s.scalars(select(MessageModel).where(
+            MessageModel.room_id == room_id, MessageModel.seq > since,
+        ).order_by(MessageModel.seq).limit(limit + 1))).all()
+    if len(rows) > limit:
+        return None
+    events = []
+    for row in rows:
+        if row.deleted:
+            events.append({'type': 'message:deleted', 'seq': row.seq, 'id': row.id})
+            continue
+        events.append({'type': 'message:new', 'seq': row.seq, 'data': _message_data(row)})
+        if _edited(row):
+            # Clients that already have the message ignore message:new by id
+            events.append({'type': 'message:edited', 'seq': row.seq,
+                           'data': {'id': row.id, 'content': row.content, 'meta': row.meta}})
+    return events
+
+def _edited(row: MessageModel) -> bool:
+    try:
+        return bool(row.meta) and bool(json.loads(row.meta).get('edited'))
+    except (ValueError, AttributeError):
+        return False
+
+async def _resume(conn, room_id: int, since: int):
+    # Missed events after `since`, then {"type": "resumed"}; {"type": "resync"} when the
+    # gap is too large and the client should reload. Frames from the buffer are queued
+    # before any live frame; a database replay may interleave with live frames, so
+    # clients skip events whose seq they have already applied.
+    frames = manager.replay.since(room_id, since)
+    source = 'buffer'
+    if frames is None:
+        events = await _replay_from_db(room_id, since, limit=max(1, manager.queue_size // 2))
+        if events is None:
+            manager.replay.stats['resyncs_requested'] += 1
+            conn.enqueue(json.dumps({'type': 'resync', 'room_id': room_id}))
+            return
+        frames = [json.dumps({**event, 'room_id': room_id}) for event in events]
+        source = 'database'
+    manager.replay.stats['replays_from_' + source] += 1
+    manager.replay.stats['replayed_frames'] += len(frames)
+    for frame in frames:
+        conn.enqueue(frame)
+    conn.enqueue(json.dumps({'type': 'resumed', 'room_id': room_id, 'since': since,
+                             'replayed': len(frames), 'source': source}))
+
+def _since(value) -> Optional[int]:
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
 @router.websocket('/ws/{room_id}')
 async def ws_room(websocket: WebSocket, room_id: int):
-    await manager.connect(room_id, websocket)
+    # One room per socket (older clients); /ws multiplexes. ?since=<seq> replays what was missed.
+    conn = await manager.connect(websocket, [room_id], user=_ws_user(websocket.query_params))
     try:
+        since = _since(websocket.query_params.get('since'))
+        if since is not None:
+            await _resume(conn, room_id, since)
         while True:
             msg = await websocket.receive_json()
+            if not isinstance(msg, dict):
+                continue
             mtype = msg.get('type')
+            if _ws_control(conn, msg, mtype):
+                continue
             if mtype in ('typing:start', 'typing:stop'):
-                user = msg.get('user', {})
-                await manager.broadcast(room_id, {
-                    'type': mtype,
-                    'user': user,
-                    'ts': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
-                })
+                await _typing(room_id, msg)
+            elif mtype == 'message:send':
+                _ws_send(conn, room_id, msg)
             # ignore other client events for now
-    except WebSocketDisconnect:
-        manager.disconnect(room_id, websocket)
-
-# File uploads (attachments)
-from fastapi import UploadFile, File
-import os
-
-@router.post('/uploads')
-def upload_file(file: UploadFile = File(...)):
-    base_dir = os.path.dirname(os.path.dirname(__file__))  # backend/app
-    uploads_dir = os.path.join(base_dir, 'uploads')
-    os.makedirs(uploads_dir, exist_ok=True)
-    filename = f"{int(datetime.utcnow().timestamp())}_{file.filename}"
-    dest = os.path.join(uploads_dir, filename)
-    with open(dest, 'wb') as f:
-        f.write(file.file.read())
-    # Construct static URL (served by Starlette static files later or raw file path if proxied)
-    url = f"/uploads/{filename}"
-    return {
-        'filename': file.filename,
-        'stored_as': filename,
-        'url': url,
-        'mime': file.content_type,
-        'size': os.path.getsize(dest),
-    }
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the server already closed a slow or broken connection
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+def _room_ids(msg: dict) -> list[int]:
+    rooms = msg.get('rooms')
+    if rooms is None and 'room_id' in msg:
+        rooms = [msg['room_id']]
+    if not isinstance(rooms, list):
+        return []
+    return [r for r in rooms if isinstance(r, int) and not isinstance(r, bool)]
+
+@router.websocket('/ws')
+async def ws_multiplexed(websocket: WebSocket):
+    # One socket per client for any number of rooms:
+    #   {"type": "subscribe", "rooms": [1, 2]}    -> {"type": "subscribed", "rooms": [...all current...]}
+    #   {"type": "unsubscribe", "rooms": [2]}     -> {"type": "unsubscribed", "rooms": [...all current...]}
+    #   {"type": "typing:start", "room_id": 1, "user": {...}}   (only for subscribed rooms)
+    #   {"type": "message:send", "room_id": 1, "client_id": "...", "sender_id": "...",
+    #    "sender_name": "...", "content": "...", "msg_type"?: "text", "meta"?: {...}}
+    #     -> {"type": "message:ack", "client_id", "room_id", "id", "timestamp", "duplicate"}
+    #        or {"type": "message:error", "client_id", "room_id", "error"}
+    #   {"type": "identify", "user": {"id": "...", "name": "..."}}  -> {"type": "identified", ...}
+    #   {"type": "ping"}                                            -> {"type": "pong"}
+    #   {"type": "resume", "room_id": 1, "since": 41}  (subscribed rooms) -> missed events,
+    #     then {"type": "resumed", ...}, or {"type": "resync"} when the gap is too large
+    # message:new/edited/deleted carry a per-room "seq" to resume from.
+    # Server events carry "room_id"; typing arrives as {"type": "typing", "users": [...]}
+    # (everyone currently typing, sent when it changes) and presence as
+    # {"type": "presence", "joined": [{"id", "name"}], "left": ["id"]}.
+    # ?rooms=1,2 subscribes and ?user_id=&user_name= identifies at connect time.
+    initial = [int(r) for r in websocket.query_params.get('rooms', '').split(',') if r.strip().isdigit()]
+    conn = await manager.connect(websocket, initial, user=_ws_user(websocket.query_params))
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            if not isinstance(msg, dict):
+                continue
+            mtype = msg.get('type')
+            if _ws_control(conn, msg, mtype):
+                continue
+            if mtype == 'subscribe':
+                refused = manager.subscribe(conn, _room_ids(msg))
+                reply = {'type': 'subscribed', 'rooms': sorted(conn.rooms)}
+                if refused:
+                    reply['refused'] = refused
+                    reply['max_rooms'] = manager.max_rooms
+                conn.enqueue(json.dumps(reply))
+            elif mtype == 'unsubscribe':
+                manager.unsubscribe(conn, _room_ids(msg))
+                conn.enqueue(json.dumps({'type': 'unsubscribed', 'rooms': sorted(conn.rooms)}))
+            elif mtype in ('typing:start', 'typing:stop'):
+                room_id = msg.get('room_id')
+                if room_id in conn.rooms:
+                    await _typing(room_id, msg)
+            elif mtype == 'resume':
+                room_id = msg.get('room_id')
+                since = _since(msg.get('since'))
+                if room_id in conn.rooms and since is not None:
+                    await _resume(conn, room_id, since)
+            elif mtype == 'message:send':
+                room_id = msg.get('room_id')
+                if room_id in conn.rooms:
+                    _ws_send(conn, room_id, msg)
+                else:
+                    conn.enqueue(json.dumps({'type': 'message:error', 'client_id': msg.get('client_id'),
+                                             'room_id': room_id, 'error': 'Not subscribed to room'}))
+            # ignore other client events for now
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+def _id_list(raw: str) -> list[str]:
+    return [part.strip() for part in raw.split(',') if part.strip()]
+
+@router.get('/presence')
+async def presence_counts(rooms: str):
+    # Online member counts for many rooms at once: ?rooms=1,2,3 -> {"rooms": {"1": 4, ...}}
+    room_ids = [int(r) for r in _id_list(rooms) if r.isdigit()]
+    return {"rooms": {room_id: manager.presence.room_count(room_id) for room_id in room_ids}}
+
+@router.get('/presence/users')
+async def presence_users(ids: str):
+    # Green dots: ?ids=a,b -> {"users": {"a": true, "b": false}}
+    return {"users": {user_id: manager.presence.is_online(user_id) for user_id in _id_list(ids)}}
+
+@router.get('/presence/{room_id}')
+async def presence_room(room_id: int):
+    users = manager.presence.room_users(room_id)
+    return {"room_id": room_id, "count": len(users), "online": users}
+
+@router.get('/realtime/stats')
+async def realtime_stats():
+    # Fan-out counters for this worker: sent/dropped frames, slow disconnects, lagging connections
+    return manager.snapshot()
 
 # ---- Additional endpoints: rooms, membership, dm, receipts, delete, search ----
 
@@ -196,11 +468,11 @@ class CreateRoom(BaseModel):
     meta: Optional[dict] = None
 
 @router.post('/chatrooms', response_model=ChatRoom)
-def create_chatroom(payload: CreateRoom, db: Session = Depends(get_db)):
+async def create_chatroom(payload: CreateRoom, db: AsyncSession = Depends(get_async_db)):
     row = ChatRoomModel(name=payload.name, type=payload.type, visibility=payload.visibility, meta=(None if payload.meta is None else __import__('json').dumps(payload.meta)))
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
     return row
 
 class UpdateMembers(BaseModel):
@@ -208,18 +480,20 @@ class UpdateMembers(BaseModel):
     remove: Optional[list[str]] = None
 
 @router.post('/chatrooms/{room_id}/members')
-def update_members(room_id: int, payload: UpdateMembers, db: Session = Depends(get_db)):
+async def update_members(room_id: int, payload: UpdateMembers, db: AsyncSession = Depends(get_async_db)):
     from ..models import RoomMember as RoomMemberModel
-    # add members
+    # add members: one lookup for the whole list, one batched insert
     if payload.add:
-        for uid in payload.add:
-            exists = db.query(RoomMemberModel).filter(RoomMemberModel.room_id == room_id, RoomMemberModel.user_id == uid).first()
-            if not exists:
-                db.add(RoomMemberModel(room_id=room_id, user_id=uid))
+        existing = set((await db.scalars(select(RoomMemberModel.user_id).where(
+            RoomMemberModel.room_id == room_id, RoomMemberModel.user_id.in_(payload.add),
+        ))).all())
+        new = [uid for uid in dict.fromkeys(payload.add) if uid not in existing]
+        if new:
+            await db.execute(insert(RoomMemberModel), [{'room_id': room_id, 'user_id': uid, 'role': 'member'} for uid in new])
     # remove members
     if payload.remove:
-        db.query(RoomMemberModel).filter(RoomMemberModel.room_id == room_id, RoomMemberModel.user_id.in_(payload.remove)).delete(synchronize_session=False)
-    db.commit()
+        await db.execute(delete(RoomMemberModel).where(RoomMemberModel.room_id == room_id, RoomMemberModel.user_id.in_(payload.remove)))
+    await db.commit()
     return {"status": "ok"}
 
 class CreateDM(BaseModel):
@@ -227,75 +501,245 @@ class CreateDM(BaseModel):
     user_b: str
 
 @router.post('/dm', response_model=ChatRoom)
-def create_or_get_dm(payload: CreateDM, db: Session = Depends(get_db)):
+async def create_or_get_dm(payload: CreateDM, db: AsyncSession = Depends(get_async_db)):
     from ..models import RoomMember as RoomMemberModel
     import json
     # find private room containing both users
-    sub_a = db.query(RoomMemberModel.room_id).filter(RoomMemberModel.user_id == payload.user_a).subquery()
-    sub_b = db.query(RoomMemberModel.room_id).filter(RoomMemberModel.user_id == payload.user_b).subquery()
-    existing = db.query(ChatRoomModel).filter(ChatRoomModel.type == 'private', ChatRoomModel.id.in_(sub_a)).filter(ChatRoomModel.id.in_(sub_b)).first()
+    sub_a = select(RoomMemberModel.room_id).where(RoomMemberModel.user_id == payload.user_a)
+    sub_b = select(RoomMemberModel.room_id).where(RoomMemberModel.user_id == payload.user_b)
+    existing = await db.scalar(select(ChatRoomModel).where(ChatRoomModel.type == 'private', ChatRoomModel.id.in_(sub_a), ChatRoomModel.id.in_(sub_b)).limit(1))
     if existing:
         return existing
     # create
     row = ChatRoomModel(name=f"DM:{payload.user_a}:{payload.user_b}", type='private', visibility='all', meta=json.dumps({"dm": True, "users": [payload.user_a, payload.user_b]}))
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
     db.add_all([
         RoomMemberModel(room_id=row.id, user_id=payload.user_a),
         RoomMemberModel(room_id=row.id, user_id=payload.user_b),
     ])
-    db.commit()
+    await db.commit()
     return row
 
 class MarkRead(BaseModel):
     user_id: str
 
 @router.post('/messages/{message_id}/read')
-def mark_read(message_id: int, payload: MarkRead, db: Session = Depends(get_db)):
+async def mark_read(message_id: int, payload: MarkRead, db: AsyncSession = Depends(get_async_db)):
     from ..models import ReadReceipt as ReadReceiptModel
     now = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
-    rr = db.query(ReadReceiptModel).filter(ReadReceiptModel.message_id == message_id, ReadReceiptModel.user_id == payload.user_id).first()
-    if rr:
-        rr.read_at = now
-    else:
-        rr = ReadReceiptModel(message_id=message_id, user_id=payload.user_id, delivered_at=now, read_at=now)
-        db.add(rr)
-    db.commit()
+    async def _write(s: AsyncSession):
+        rr = await s.scalar(select(ReadReceiptModel).where(ReadReceiptModel.message_id == message_id, ReadReceiptModel.user_id == payload.user_id).limit(1))
+        if rr:
+            rr.read_at = now
+        else:
+            s.add(ReadReceiptModel(message_id=message_id, user_id=payload.user_id, delivered_at=now, read_at=now))
+    await run_write(db, _write)
     return {"status": "ok"}
 
+# ---- Read watermarks and unread counts ----
+
+async def _next_seq(s: AsyncSession, room_id: int) -> int:
+    # Next event sequence number for the room, taken in the writing transaction
+    from ..models import RoomCounter
+    stmt = sqlite_insert(RoomCounter).values(room_id=room_id, message_count=0, last_message_id=0, event_seq=1)
+    return await s.scalar(stmt.on_conflict_do_update(
+        index_elements=[RoomCounter.room_id], set_={'event_seq': RoomCounter.event_seq + 1},
+    ).returning(RoomCounter.event_seq))
+
+async def _count_new_message(s: AsyncSession, row: MessageModel):
+    from ..models import RoomCounter
+    stmt = sqlite_insert(RoomCounter).values(room_id=row.room_id, message_count=1, last_message_id=row.id)
+    await s.execute(stmt.on_conflict_do_update(
+        index_elements=[RoomCounter.room_id],
+        set_={'message_count': RoomCounter.message_count + 1, 'last_message_id': stmt.excluded.last_message_id},
+    ))
+    # The sender has read their own message
+    await _advance_watermark(s, row.room_id, row.sender_id, row.id, row.timestamp)
+    await _count_blob_refs(s, row, +1)
+
+async def _count_deleted_message(s: AsyncSession, row: MessageModel):
+    from ..models import RoomCounter, RoomReadState
+    await s.execute(update(RoomCounter).where(RoomCounter.room_id == row.room_id).values(message_count=RoomCounter.message_count - 1))
+    # Readers past this message had it in their read_count
+    await s.execute(update(RoomReadState).where(RoomReadState.room_id == row.room_id, RoomReadState.last_read_id >= row.id)
+                    .values(read_count=RoomReadState.read_count - 1))
+    await _count_blob_refs(s, row, -1)
+
+async def _count_blob_refs(s: AsyncSession, row: MessageModel, delta: int):
+    # Attachment reference counts for the content-addressed store's GC
+    from ..models import AttachmentBlob
+    refs = blob_refs(row.meta)
+    if refs:
+        await s.execute(update(AttachmentBlob).where(AttachmentBlob.sha256.in_(refs))
+                        .values(ref_count=AttachmentBlob.ref_count + delta))
+
+async def _advance_watermark(s: AsyncSession, room_id: int, user_id: str, up_to_id: Optional[int], now: str) -> tuple[int, int]:
+    # Moves the watermark forward only, never past the room's latest message (None: up to
+    # it); read_count grows by the live messages newly covered, which is a short range
+    # scan on ix_messages_room_deleted_id. Returns (previous, current).
+    from ..models import RoomCounter, RoomReadState
+    # Create the row first: concurrent first reads both land here instead of one of them
+    # failing the unique index, and the reads below happen under the write lock
+    await s.execute(sqlite_insert(RoomReadState).values(
+        room_id=room_id, user_id=user_id, last_read_id=0, read_count=0, updated_at=now,
+    ).on_conflict_do_nothing(index_elements=[RoomReadState.user_id, RoomReadState.room_id]))
+    last_id = await s.scalar(select(RoomCounter.last_message_id).where(RoomCounter.room_id == room_id)) or 0
+    up_to_id = last_id if up_to_id is None else min(up_to_id, last_id)
+    previous = await s.scalar(select(RoomReadState.last_read_id).where(
+        RoomReadState.user_id == user_id, RoomReadState.room_id == room_id))
+    if up_to_id <= previous:
+        return previous, previous
+    newly_read = await s.scalar(select(func.count()).select_from(MessageModel).where(
+        MessageModel.room_id == room_id, MessageModel.deleted == 0,
+        MessageModel.id > previous, MessageModel.id <= up_to_id,
+    ))
+    await s.execute(update(RoomReadState).where(RoomReadState.user_id == user_id, RoomReadState.room_id == room_id).values(
+        last_read_id=up_to_id, read_count=RoomReadState.read_count + newly_read, updated_at=now,
+    ))
+    return previous, up_to_id
+
+class MarkRoomRead(BaseModel):
+    user_id: str
+    up_to_id: Optional[int] = None  # default: latest message in the room
+    receipts: Optional[bool] = None  # per-message receipts; default only for private (DM) rooms
+
+@router.post('/chatrooms/{room_id}/read')
+async def mark_room_read(room_id: int, payload: MarkRoomRead, db: AsyncSession = Depends(get_async_db)):
+    # Marks everything up to up_to_id (clamped to the latest message) as read in one call
+    from ..models import ReadReceipt as ReadReceiptModel
+    now = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    async def _write(s: AsyncSession):
+        room = await s.get(ChatRoomModel, room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail='Room not found')
+        previous, current = await _advance_watermark(s, room_id, payload.user_id, payload.up_to_id, now)
+        receipts = payload.receipts if payload.receipts is not None else room.type == 'private'
+        if receipts and current > previous:
+            ids = (await s.scalars(select(MessageModel.id).where(
+                MessageModel.room_id == room_id, MessageModel.deleted == 0,
+                MessageModel.id > previous, MessageModel.id <= current,
+                MessageModel.sender_id != payload.user_id,
+            ))).all()
+            s.add_all([ReadReceiptModel(message_id=mid, user_id=payload.user_id, delivered_at=now, read_at=now) for mid in ids])
+        return current
+    last_read_id = await run_write(db, _write)
+    return {"status": "ok", "last_read_id": last_read_id}
+
+@router.get('/unread')
+async def unread_counts(user_id: str, role: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    # Unread counts for every room the user can see, from counters (no COUNT(*) over messages)
+    from ..models import RoomCounter, RoomReadState
+    room_ids = await _visible_room_ids(db, user_id, role)
+    if not room_ids:
+        return {"rooms": {}, "total": 0}
+    rows = (await db.execute(
+        select(RoomCounter.room_id, RoomCounter.message_count, RoomCounter.last_message_id,
+               RoomReadState.read_count, RoomReadState.last_read_id)
+        .outerjoin(RoomReadState, and_(RoomReadState.room_id == RoomCounter.room_id, RoomReadState.user_id == user_id))
+        .where(RoomCounter.room_id.in_(room_ids))
+    )).all()
+    rooms = {}
+    for rid, count, last_id, read_count, last_read_id in rows:
+        rooms[rid] = {
+            "unread": max(0, count - (read_count or 0)),
+            "last_message_id": last_id,
+            "last_read_id": last_read_id or 0,
+        }
+    return {"rooms": rooms, "total": sum(r["unread"] for r in rooms.values())}
+
+@router.get('/messages/{message_id}/seen')
+async def seen_by(message_id: int, db: AsyncSession = Depends(get_async_db)):
+    # "Seen by" from watermarks: everyone whose watermark in the room has passed the message
+    from ..models import RoomReadState
+    row = await db.get(MessageModel, message_id)
+    if not row:
+        raise HTTPException(status_code=404, detail='Message not found')
+    users = (await db.scalars(select(RoomReadState.user_id).where(
+        RoomReadState.room_id == row.room_id, RoomReadState.last_read_id >= message_id,
+        RoomReadState.user_id != row.sender_id,
+    ))).all()
+    return {"message_id": message_id, "seen_by": users}
+
 @router.delete('/messages/{message_id}')
-def delete_message(message_id: int, db: Session = Depends(get_db)):
-    row = db.get(MessageModel, message_id)
+async def delete_message(message_id: int, db: AsyncSession = Depends(get_async_db)):
+    row = await db.get(MessageModel, message_id)
     if not row:
         raise HTTPException(status_code=404, detail='Message not found')
-    row.deleted = 1
-    db.commit()
+    if not row.deleted:
+        row.deleted = 1
+        row.seq = await _next_seq(db, row.room_id)
+        await _count_deleted_message(db, row)
+    await db.commit()
     # Broadcast deletion
-    import anyio
-    async def _notify():
-        await manager.broadcast(row.room_id, { 'type': 'message:deleted', 'id': row.id })
-    try:
-        anyio.from_thread.run(_notify)
-    except Exception:
-        pass
+    await manager.broadcast(row.room_id, { 'type': 'message:deleted', 'seq': row.seq, 'id': row.id })
     return {"status": "ok"}
 
-@router.get('/messages/{room_id}/search', response_model=List[Message])
-def search_messages(room_id: int, q: str, limit: int = 50, db: Session = Depends(get_db)):
-    query = db.query(MessageModel).filter(MessageModel.room_id == room_id, MessageModel.deleted == 0)
-    if q:
-        like = f"%{q}%"
-        query = query.filter(MessageModel.content.like(like))
-    return query.order_by(MessageModel.id.desc()).limit(limit).all()
+class SearchHit(Message):
+    snippet: Optional[str] = None
+    rank: Optional[float] = None
+
+async def _search_page(db: AsyncSession, response: Response, q: str, room_ids: Optional[list[int]], limit: int, cursor: Optional[str]):
+    match = search_index.build_match(q)
+    data = decode_cursor(cursor) if cursor else None
+    if match is None:
+        # Nothing searchable (empty or punctuation only): latest messages, as before,
+        # paged by id
+        query = select(MessageModel).where(MessageModel.deleted == 0)
+        if room_ids is not None:
+            query = query.where(MessageModel.room_id.in_(room_ids))
+        if data is not None:
+            try:
+                query = query.where(MessageModel.id < int(data['id']))
+            except (KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail='Invalid cursor')
+        rows = (await db.scalars(query.order_by(MessageModel.id.desc()).limit(limit))).all()
+        if len(rows) == limit:
+            response.headers['X-Next-Cursor'] = encode_cursor({'id': rows[-1].id})
+        return rows
+    after = anchors = None
+    if data is not None:
+        try:
+            after = (float(data['r']), int(data['id']))
+            anchors = [int(i) for i in data.get('k', [])]
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+    rows = await db.run_sync(lambda s: search_index.search(s.connection(), match, room_ids=room_ids, after=after, anchors=anchors, limit=limit))
+    if len(rows) == limit:
+        tail = [r['id'] for r in rows[-search_index.MAX_ANCHORS:]]
+        response.headers['X-Next-Cursor'] = encode_cursor({'r': rows[-1]['rank'], 'id': rows[-1]['id'], 'k': tail})
+    return rows
+
+@router.get('/messages/{room_id}/search', response_model=List[SearchHit])
+async def search_messages(room_id: int, q: str, response: Response, limit: int = 50, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    # FTS5 prefix match ranked by BM25; snippet wraps hits in <mark>. Next page cursor in X-Next-Cursor.
+    return await _search_page(db, response, q, [room_id], limit, cursor)
+
+async def _visible_room_ids(db: AsyncSession, user_id: str, role: Optional[str]) -> list[int]:
+    # Public rooms open to the user's role plus rooms they are a member of
+    from ..models import RoomMember as RoomMemberModel
+    member_of = select(RoomMemberModel.room_id).where(RoomMemberModel.user_id == user_id)
+    visible = [ChatRoomModel.visibility == 'all']
+    if role:
+        visible.append(ChatRoomModel.visibility == role.lower())
+    return list((await db.scalars(select(ChatRoomModel.id).where(
+        or_(and_(ChatRoomModel.type != 'private', or_(*visible)), ChatRoomModel.id.in_(member_of))
+    ))).all())
+
+@router.get('/search/messages', response_model=List[SearchHit])
+async def search_all_messages(q: str, user_id: str, response: Response, role: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    # Search every room the user can see: public rooms open to their role plus rooms they are a member of
+    room_ids = await _visible_room_ids(db, user_id, role)
+    return await _search_page(db, response, q, room_ids, limit, cursor)
 
 class EditMessage(BaseModel):
     content: str
 
 @router.patch('/messages/{message_id}', response_model=Message)
-def edit_message(message_id: int, payload: EditMessage, db: Session = Depends(get_db)):
+async def edit_message(message_id: int, payload: EditMessage, db: AsyncSession = Depends(get_async_db)):
     import json
-    row = db.get(MessageModel, message_id)
+    row = await db.get(MessageModel, message_id)
     if not row:
         raise HTTPException(status_code=404, detail='Message not found')
     row.content = payload.content
@@ -309,21 +753,17 @@ def edit_message(message_id: int, payload: EditMessage, db: Session = Depends(ge
     meta['edited'] = True
     meta['edited_at'] = datetime.utcnow().isoformat(timespec='seconds') + 'Z'
     row.meta = json.dumps(meta)
-    db.commit()
-    db.refresh(row)
+    row.seq = await _next_seq(db, row.room_id)
+    await db.commit()
+    await db.refresh(row)
     # Broadcast edited
-    import anyio
-    async def _notify():
-        await manager.broadcast(row.room_id, {
-            'type': 'message:edited',
-            'data': {
-                'id': row.id,
-                'content': row.content,
-                'meta': row.meta,
-            }
-        })
-    try:
-        anyio.from_thread.run(_notify)
-    except Exception:
-        pass
+    await manager.broadcast(row.room_id, {
+        'type': 'message:edited',
+        'seq': row.seq,
+        'data': {
+            'id': row.id,
+            'content': row.content,
+            'meta': row.meta,
+        }
+    })
     return row
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from ..db import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel, TypeAdapter
+from typing import Dict, List, Optional
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import Event as EventModel
+from ..cache import cache, serialize
+from .. import fastjson
+from ..ics import feed as ics_feed
 
 router = APIRouter()
 
@@ -12,47 +16,122 @@ class Event(BaseModel):
     id: int
     title: str
     type: str
-    start: str
-    end: Optional[str] = None
+    start: date
+    end: Optional[date] = None  # inclusive
     description: Optional[str] = None
 
     class Config:
         from_attributes = True
 
-@router.get('/events', response_model=List[Event])
-def list_events(from_: Optional[str] = None, to: Optional[str] = None, db: Session = Depends(get_db)):
-    q = db.query(EventModel)
-    # Note: start/end are stored as strings 'YYYY-MM-DD'; simple filters
-    if from_:
-        q = q.filter(EventModel.start >= from_)
+# Days from start to end; the same expression as ix_events_span, so max() is one index seek
+_SPAN = func.julianday(func.coalesce(EventModel.end, EventModel.start)) - func.julianday(EventModel.start)
+
+def _overlapping(q, from_: Optional[date], to: Optional[date]):
+    # Events whose [start, end] intersects [from_, to]; a NULL end means a one-day event.
+    # Both bounds are a range on ix_events_start_end, `end` is read from the same index: no
+    # event starts more than the longest event's span before from_ and still overlaps.
     if to:
-        q = q.filter((EventModel.end == None) | (EventModel.end <= to))
-    return q.order_by(EventModel.start.asc()).all()
+        q = q.where(EventModel.start <= to)
+    if from_:
+        longest = select(func.coalesce(func.max(_SPAN), 0)).scalar_subquery()
+        q = q.where(
+            EventModel.start >= func.date(from_.isoformat(), func.printf('-%d days', longest)),
+            func.coalesce(EventModel.end, EventModel.start) >= from_,
+        )
+    return q
+
+def _check_range(payload: Event):
+    if payload.end is not None and payload.end < payload.start:
+        raise HTTPException(status_code=422, detail='end is before start')
+
+_events_json = TypeAdapter(List[Event])
+_events_fast = fastjson.RowEncoder(EventModel, Event)
+
+@router.get('/events', response_model=List[Event])
+async def list_events(request: Request, from_: Optional[date] = None, to: Optional[date] = None, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        order = (EventModel.start.asc(), EventModel.id.asc())
+        if fastjson.enabled:
+            q = _overlapping(_events_fast.select(), from_, to).order_by(*order)
+            return _events_fast.dumps((await db.execute(q)).all())
+        q = _overlapping(select(EventModel), from_, to)
+        return serialize(_events_json, (await db.scalars(q.order_by(*order))).all())
+    return await cache.respond(request, 'events', (from_, to), load)
+
+class EventCalendar(BaseModel):
+    start: date
+    end: date
+    days: Dict[str, int]  # 'YYYY-MM-DD' -> events on that day, every day of the range
+
+@router.get('/events/calendar', response_model=EventCalendar)
+async def event_calendar(
+    request: Request,
+    month: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}$', description='YYYY-MM'),
+    week: Optional[date] = Query(None, description='Any day of the week (weeks start on Monday)'),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if (month is None) == (week is None):
+        raise HTTPException(status_code=400, detail='Pass exactly one of month or week')
+    if month:
+        year, mon = map(int, month.split('-'))
+        if not 1 <= mon <= 12:
+            raise HTTPException(status_code=400, detail='Invalid month')
+        start = date(year, mon, 1)
+        end = date(year + mon // 12, mon % 12 + 1, 1) - timedelta(days=1)
+    else:
+        start = week - timedelta(days=week.weekday())
+        end = start + timedelta(days=6)
+
+    async def load():
+        # Index-only read of (start, end), then a difference array over the grid
+        spans = (await db.execute(_overlapping(select(EventModel.start, EventModel.end), start, end))).all()
+        n = (end - start).days + 1
+        diff = [0] * (n + 1)
+        for s, e in spans:
+            diff[max((s - start).days, 0)] += 1
+            diff[min(((e or s) - start).days, n - 1) + 1] -= 1
+        days, running = {}, 0
+        for i in range(n):
+            running += diff[i]
+            days[(start + timedelta(days=i)).isoformat()] = running
+        return EventCalendar(start=start, end=end, days=days).model_dump_json().encode()
+    return await cache.respond(request, 'events', ('calendar', start, end), load)
+
+@router.get('/events.ics', response_class=Response, responses={200: {'content': {'text/calendar': {}}}})
+async def events_ics(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        return await ics_feed.body(db)
+    return await cache.respond(request, 'events', 'ics', load, media_type='text/calendar; charset=utf-8')
 
 @router.post('/events', response_model=Event)
-def create_event(payload: Event, db: Session = Depends(get_db)):
+async def create_event(payload: Event, db: AsyncSession = Depends(get_async_db)):
+    _check_range(payload)
     row = EventModel(**payload.dict())
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
+    cache.bump('events')
     return row
 
 @router.put('/events/{event_id}', response_model=Event)
-def update_event(event_id: int, payload: Event, db: Session = Depends(get_db)):
-    row = db.get(EventModel, event_id)
+async def update_event(event_id: int, payload: Event, db: AsyncSession = Depends(get_async_db)):
+    _check_range(payload)
+    row = await db.get(EventModel, event_id)
     if not row:
         raise HTTPException(status_code=404, detail='Event not found')
     for k, v in payload.dict().items():
         setattr(row, k, v)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
+    cache.bump('events')
     return row
 
 @router.delete('/events/{event_id}')
-def delete_event(event_id: int, db: Session = Depends(get_db)):
-    row = db.get(EventModel, event_id)
+async def delete_event(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    row = await db.get(EventModel, event_id)
     if not row:
         raise HTTPException(status_code=404, detail='Event not found')
-    db.delete(row)
-    db.commit()
+    await db.delete(row)
+    await db.commit()
+    cache.bump('events')
     return {"status": "ok"}
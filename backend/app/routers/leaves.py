@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from pydantic import BaseModel
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import Leave as LeaveModel
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from ..writer import run_write
+from ..pagination import encode_cursor, decode_cursor
+from ..models import Leave as LeaveModel, LeaveCounter
+from .. import fastjson
 
 router = APIRouter()
 
+BOARD_PAGE_SIZE = 50
+
 class LeaveRequest(BaseModel):
     id: int
     studentName: str
@@ -24,43 +31,124 @@ class LeaveRequest(BaseModel):
     class Config:
         from_attributes = True
 
+_leaves_fast = fastjson.RowEncoder(LeaveModel, LeaveRequest)
+
 @router.get('/leaves', response_model=List[LeaveRequest])
-def list_leaves(
+async def list_leaves(
+    response: Response,
     mine: Optional[bool] = Query(default=False),
     studentId: Optional[str] = None,
     status: Optional[str] = None,
     department: Optional[str] = None,
     mentorName: Optional[str] = None,
     board: Optional[bool] = False,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    q = db.query(LeaveModel)
+    # Newest first. With `limit` (or `board`, which pages by 50 and defaults to the
+    # Pending queue) the next page's cursor comes back in X-Next-Cursor; without either
+    # the whole filtered list is returned as before.
+    if board:
+        status = status or 'Pending'
+        limit = limit or BOARD_PAGE_SIZE
+    q = _leaves_fast.select() if fastjson.enabled else select(LeaveModel)
     if mine and studentId:
-        q = q.filter(LeaveModel.studentId == studentId)
+        q = q.where(LeaveModel.studentId == studentId)
     if status:
-        q = q.filter(LeaveModel.status == status)
+        q = q.where(LeaveModel.status == status)
     if department:
-        q = q.filter(LeaveModel.department == department)
+        q = q.where(LeaveModel.department == department)
     if mentorName:
-        q = q.filter(LeaveModel.mentorName == mentorName)
-    return q.order_by(LeaveModel.id.desc()).all()
+        q = q.where(LeaveModel.mentorName == mentorName)
+    if cursor:
+        try:
+            before_id = int(decode_cursor(cursor)['id'])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+        q = q.where(LeaveModel.id < before_id)
+    q = q.order_by(LeaveModel.id.desc())
+    if limit:
+        q = q.limit(limit)
+    rows = (await db.execute(q) if fastjson.enabled else await db.scalars(q)).all()
+    if limit and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor({'id': rows[-1].id})
+    if fastjson.enabled:
+        return _leaves_fast.response(rows, dict(response.headers))
+    return rows
+
+# --- Status counters ---
+_DIMENSIONS = (('all', None), ('department', 'department'), ('mentor', 'mentorName'), ('leaveType', 'leaveType'))
+
+async def _count_leave(s: AsyncSession, row: LeaveModel, status: str, delta: int):
+    for dimension, attr in _DIMENSIONS:
+        stmt = sqlite_insert(LeaveCounter).values(
+            dimension=dimension, value=getattr(row, attr) if attr else '', status=status, count=delta,
+        )
+        await s.execute(stmt.on_conflict_do_update(
+            index_elements=[LeaveCounter.dimension, LeaveCounter.value, LeaveCounter.status],
+            set_={'count': LeaveCounter.count + delta},
+        ))
+
+class LeaveStats(BaseModel):
+    total: int
+    byStatus: Dict[str, int]
+    byDepartment: Dict[str, Dict[str, int]]  # department -> status -> count
+    byMentor: Dict[str, Dict[str, int]]
+    byLeaveType: Dict[str, Dict[str, int]]
+
+@router.get('/leaves/stats', response_model=LeaveStats)
+async def leave_stats(
+    department: Optional[str] = None,
+    mentorName: Optional[str] = None,
+    leaveType: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Read from leave_counters, never from leaves. A filter narrows that dimension to
+    # one value and makes byStatus/total describe that slice.
+    narrow = {'department': department, 'mentor': mentorName, 'leaveType': leaveType}
+    q = select(LeaveCounter).where(LeaveCounter.count != 0)
+    for dimension, value in narrow.items():
+        if value is not None:
+            q = q.where((LeaveCounter.dimension != dimension) | (LeaveCounter.value == value))
+    rows = (await db.scalars(q)).all()
+    maps: Dict[str, Dict[str, Dict[str, int]]] = {'department': {}, 'mentor': {}, 'leaveType': {}}
+    by_status: Dict[str, int] = {}
+    for r in rows:
+        if r.dimension == 'all':
+            by_status[r.status] = r.count
+        else:
+            maps[r.dimension].setdefault(r.value, {})[r.status] = r.count
+    slice_ = next((maps[d].get(v, {}) for d, v in narrow.items() if v is not None), None)
+    if slice_ is not None:
+        by_status = dict(slice_)
+    return LeaveStats(
+        total=sum(by_status.values()), byStatus=by_status,
+        byDepartment=maps['department'], byMentor=maps['mentor'], byLeaveType=maps['leaveType'],
+    )
 
 @router.post('/leaves', response_model=LeaveRequest)
-def create_leave(payload: LeaveRequest, db: Session = Depends(get_db)):
-    row = LeaveModel(**payload.dict())
-    db.add(row)
-    db.commit()
-    return row
+async def create_leave(payload: LeaveRequest, db: AsyncSession = Depends(get_async_db)):
+    async def _write(s: AsyncSession):
+        row = LeaveModel(**payload.dict())
+        s.add(row)
+        await s.flush()
+        await _count_leave(s, row, row.status, +1)
+        return row
+    return await run_write(db, _write)
 
 class UpdateStatus(BaseModel):
     status: str
 
 @router.patch('/leaves/{leave_id}/status', response_model=LeaveRequest)
-def update_leave_status(leave_id: int, payload: UpdateStatus, db: Session = Depends(get_db)):
-    row = db.get(LeaveModel, leave_id)
-    if not row:
-        raise HTTPException(status_code=404, detail='Leave not found')
-    row.status = payload.status
-    db.commit()
-    db.refresh(row)
-    return row
+async def update_leave_status(leave_id: int, payload: UpdateStatus, db: AsyncSession = Depends(get_async_db)):
+    async def _write(s: AsyncSession):
+        row = await s.get(LeaveModel, leave_id)
+        if not row:
+            raise HTTPException(status_code=404, detail='Leave not found')
+        if row.status != payload.status:
+            await _count_leave(s, row, row.status, -1)
+            await _count_leave(s, row, payload.status, +1)
+            row.status = payload.status
+        return row
+    return await run_write(db, _write)
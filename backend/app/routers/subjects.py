@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel, TypeAdapter
 from typing import List
-from sqlalchemy.orm import Session
-from ..db import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
 from ..models import Subject as SubjectModel
+from ..cache import cache, serialize
 
 router = APIRouter()
 
@@ -17,19 +19,24 @@ class Subject(BaseModel):
     class Config:
         from_attributes = True
 
+_subjects_json = TypeAdapter(List[Subject])
+
 @router.get('/subjects', response_model=List[Subject])
-def list_subjects(db: Session = Depends(get_db)):
-    return db.query(SubjectModel).all()
+async def list_subjects(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        return serialize(_subjects_json, (await db.scalars(select(SubjectModel))).all())
+    return await cache.respond(request, 'subjects', None, load)
 
 class UpdateOngoing(BaseModel):
     ongoingChapters: str
 
 @router.put('/subjects/{subject_id}/ongoing', response_model=Subject)
-def update_ongoing(subject_id: int, payload: UpdateOngoing, db: Session = Depends(get_db)):
-    row = db.get(SubjectModel, subject_id)
+async def update_ongoing(subject_id: int, payload: UpdateOngoing, db: AsyncSession = Depends(get_async_db)):
+    row = await db.get(SubjectModel, subject_id)
     if not row:
         raise HTTPException(status_code=404, detail='Subject not found')
     row.ongoingChapters = payload.ongoingChapters
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    cache.bump('subjects')
+    await db.refresh(row)
     return row
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import Dict, List, Union
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import Timetable as TimetableModel
-import json
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Union
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from ..models import Timetable as TimetableModel, TimetableCell
+from ..timetables import entry_columns, week_from_cells
+from ..cache import cache
 
 router = APIRouter()
 
@@ -18,31 +21,127 @@ class Timetable(BaseModel):
     class Config:
         from_attributes = True
 
+async def _weeks(db: AsyncSession, rows: List[TimetableModel]) -> List[Timetable]:
+    # One indexed range scan per request, however many sections
+    if not rows:
+        return []
+    cells = (await db.scalars(
+        select(TimetableCell)
+        .where(TimetableCell.section.in_([r.section for r in rows]))
+        .order_by(TimetableCell.section, TimetableCell.day_order, TimetableCell.period)
+    )).all()
+    by_section: Dict[str, list] = {}
+    for cell in cells:
+        by_section.setdefault(cell.section, []).append(cell)
+    return [Timetable(id=r.id, section=r.section, data=week_from_cells(by_section.get(r.section, []))) for r in rows]
+
 @router.get('/timetables', response_model=Timetable)
-def get_timetable(section: str = 'CSBS', db: Session = Depends(get_db)):
-    row = db.query(TimetableModel).filter(TimetableModel.section == section).first()
-    if not row:
-        raise HTTPException(status_code=404, detail='Timetable not found')
-    data = json.loads(row.data)
-    return Timetable(id=row.id, section=row.section, data=data)
+async def get_timetable(request: Request, section: str = 'CSBS', db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        row = await db.scalar(select(TimetableModel).where(TimetableModel.section == section).limit(1))
+        if not row:
+            raise HTTPException(status_code=404, detail='Timetable not found')
+        return (await _weeks(db, [row]))[0].model_dump_json().encode()
+    return await cache.respond(request, 'timetables', section, load)
 
-class PatchCell(BaseModel):
+@router.get('/timetables/bulk', response_model=List[Timetable])
+async def get_timetables(sections: List[str] = Query(..., description='Repeat or comma-separate: ?sections=A,B'), db: AsyncSession = Depends(get_async_db)):
+    wanted = [s for part in sections for s in part.split(',') if s]
+    rows = (await db.scalars(select(TimetableModel).where(TimetableModel.section.in_(wanted)))).all()
+    order = {s: i for i, s in enumerate(wanted)}
+    return await _weeks(db, sorted(rows, key=lambda r: order[r.section]))
+
+class FacultySlot(BaseModel):
+    period: int
+    section: str
+    subjectId: Optional[str] = None
+
+class FacultyWeek(BaseModel):
+    faculty: str
+    data: Dict[str, List[FacultySlot]]  # day -> slots, by period
+
+@router.get('/timetables/faculty', response_model=FacultyWeek)
+async def get_faculty_week(name: str, day: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    q = select(TimetableCell).where(TimetableCell.faculty == name)
+    if day:
+        q = q.where(TimetableCell.day == day)
+    cells = (await db.scalars(q.order_by(TimetableCell.day_order, TimetableCell.period, TimetableCell.section))).all()
+    data: Dict[str, List[FacultySlot]] = {}
+    for cell in cells:
+        data.setdefault(cell.day, []).append(FacultySlot(period=cell.period, section=cell.section, subjectId=cell.subject_id))
+    return FacultyWeek(faculty=name, data=data)
+
+class Clash(BaseModel):
+    faculty: str
     day: str
     periodIndex: int
+    sections: List[str]
+
+@router.get('/timetables/clashes', response_model=List[Clash])
+async def get_clashes(
+    faculty: Optional[str] = None,
+    day: Optional[str] = None,
+    periodIndex: Optional[int] = None,
+    section: Optional[str] = Query(None, description='With faculty/day/periodIndex: would assigning this section clash?'),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Faculty booked in more than one section for the same (day, period). Grouping on
+    # (faculty, day, period) reads ix_timetable_cells_faculty in order, no table scan.
+    sections = func.group_concat(TimetableCell.section, '\x1f')
+    q = (select(TimetableCell.faculty, TimetableCell.day, TimetableCell.period, sections)
+         .where(TimetableCell.faculty.is_not(None)))
+    if faculty is not None:
+        q = q.where(TimetableCell.faculty == faculty)
+    if day is not None:
+        q = q.where(TimetableCell.day == day)
+    if periodIndex is not None:
+        q = q.where(TimetableCell.period == periodIndex)
+    if section is not None:
+        # Proposed edit: any existing booking in another section is a clash
+        if faculty is None or day is None or periodIndex is None:
+            raise HTTPException(status_code=400, detail='section requires faculty, day and periodIndex')
+        q = q.where(TimetableCell.section != section)
+    else:
+        q = q.having(func.count() > 1)
+    q = q.group_by(TimetableCell.faculty, TimetableCell.day, TimetableCell.period)
+    rows = (await db.execute(q)).all()
+    out = []
+    for fac, d, period, secs in rows:
+        secs = sorted(secs.split('\x1f'))
+        if section is not None:
+            secs = sorted(secs + [section])
+        out.append(Clash(faculty=fac, day=d, periodIndex=period, sections=secs))
+    return out
+
+class PatchCell(BaseModel):
+    day: str
+    periodIndex: int = Field(ge=0)
     subjectId: str
     faculty: str
 
 @router.patch('/timetables/{timetable_id}/cell', response_model=Timetable)
-def patch_cell(timetable_id: int, payload: PatchCell, db: Session = Depends(get_db)):
-    row = db.get(TimetableModel, timetable_id)
+async def patch_cell(timetable_id: int, payload: PatchCell, db: AsyncSession = Depends(get_async_db)):
+    row = await db.get(TimetableModel, timetable_id)
     if not row:
         raise HTTPException(status_code=404, detail='Timetable not found')
-    data = json.loads(row.data)
-    day_list = list(data.get(payload.day, []))
-    while len(day_list) <= payload.periodIndex:
-        day_list.append(None)
-    day_list[payload.periodIndex] = { 'subjectId': payload.subjectId, 'faculty': payload.faculty }
-    data[payload.day] = day_list
-    row.data = json.dumps(data)
-    db.commit()
-    return Timetable(id=row.id, section=row.section, data=data)
+    day_order = await db.scalar(
+        select(TimetableCell.day_order)
+        .where(TimetableCell.section == row.section, TimetableCell.day == payload.day).limit(1)
+    )
+    if day_order is None:
+        # New day goes after the existing ones
+        day_order = await db.scalar(
+            select(func.coalesce(func.max(TimetableCell.day_order) + 1, 0)).where(TimetableCell.section == row.section)
+        )
+    columns = entry_columns({'subjectId': payload.subjectId, 'faculty': payload.faculty})
+    stmt = sqlite_insert(TimetableCell).values(
+        timetable_id=row.id, section=row.section, day=payload.day, day_order=day_order,
+        period=payload.periodIndex, **columns,
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[TimetableCell.section, TimetableCell.day, TimetableCell.period],
+        set_=columns,
+    ))
+    await db.commit()
+    cache.bump('timetables')
+    return (await _weeks(db, [row]))[0]
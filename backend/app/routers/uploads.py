@@ -0,0 +1,120 @@
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from typing import Optional
+from .. import attachments
+
+# Room for the multipart framing around a file of the maximum size
+MULTIPART_SLACK = 64 * 1024
+
+class _LimitedRequest(Request):
+    # Counts body bytes as they arrive, so a chunked upload (no Content-Length) is cut off
+    # at the limit instead of being spooled to disk in full before the handler runs
+    async def stream(self):
+        limit = attachments.MAX_UPLOAD_BYTES + MULTIPART_SLACK
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > limit:
+                raise HTTPException(status_code=413, detail='File too large')
+            yield chunk
+
+class _LimitedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            return await handler(_LimitedRequest(request.scope, request.receive))
+        return limited_handler
+
+router = APIRouter(route_class=_LimitedRoute)
+
+# Single-shot upload. Stays a sync handler (blocking file IO on the threadpool) but copies
+# the spooled upload in fixed-size chunks instead of reading it into memory. Content that
+# is already stored is not written again; the existing blob's URL is returned.
+@router.post('/uploads')
+def upload_file(request: Request, file: UploadFile = File(...)):
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > attachments.MAX_UPLOAD_BYTES + MULTIPART_SLACK:
+        raise HTTPException(status_code=413, detail='File too large')
+    try:
+        stored_as, size, sha256, _ = attachments.save_stream(file.file, file.filename, file.content_type, attachments.MAX_UPLOAD_BYTES)
+    except attachments.UploadTooLarge:
+        raise HTTPException(status_code=413, detail='File too large')
+    return attachments.describe(file.filename, stored_as, file.content_type, size, sha256)
+
+# ---- Resumable uploads ----
+# POST /uploads/sessions                      -> {upload_id, offset, size, chunk_size}
+#                                                an optional sha256 is checked at finalize
+# PUT  /uploads/sessions/{id}?offset=N        raw bytes, at most chunk_size -> {offset}
+# GET  /uploads/sessions/{id}                 current offset, to resume after a dropped connection
+# POST /uploads/sessions/{id}/finalize        -> same body as POST /uploads
+
+class CreateUploadSession(BaseModel):
+    filename: str
+    size: int
+    mime: Optional[str] = None
+    sha256: Optional[str] = None
+
+class UploadSession(BaseModel):
+    upload_id: str
+    offset: int
+    size: int
+    chunk_size: int
+
+class FinalizeUpload(BaseModel):
+    sha256: Optional[str] = None
+
+def _not_found():
+    return HTTPException(status_code=404, detail='Upload session not found')
+
+@router.post('/uploads/sessions', response_model=UploadSession)
+async def create_upload_session(payload: CreateUploadSession):
+    try:
+        return await run_in_threadpool(attachments.create_session, payload.filename, payload.size, payload.mime, payload.sha256)
+    except attachments.UploadTooLarge:
+        raise HTTPException(status_code=413, detail='File too large')
+
+@router.get('/uploads/sessions/{upload_id}', response_model=UploadSession)
+async def get_upload_session(upload_id: str):
+    try:
+        return await run_in_threadpool(attachments.session_info, upload_id)
+    except attachments.UploadNotFound:
+        raise _not_found()
+
+@router.put('/uploads/sessions/{upload_id}')
+async def put_upload_chunk(upload_id: str, offset: int, request: Request):
+    buf = bytearray()
+    async for part in request.stream():
+        buf += part
+        if len(buf) > attachments.CHUNK_BYTES:
+            raise HTTPException(status_code=413, detail='Chunk too large')
+    try:
+        new_offset = await run_in_threadpool(attachments.write_chunk, upload_id, offset, bytes(buf))
+    except attachments.UploadNotFound:
+        raise _not_found()
+    except attachments.OffsetMismatch as exc:
+        raise HTTPException(status_code=409, detail={'message': 'Offset mismatch', 'offset': exc.expected})
+    except attachments.UploadTooLarge:
+        raise HTTPException(status_code=413, detail='Chunk exceeds declared size')
+    return {'upload_id': upload_id, 'offset': new_offset}
+
+@router.post('/uploads/sessions/{upload_id}/finalize')
+async def finalize_upload(upload_id: str, payload: Optional[FinalizeUpload] = None):
+    try:
+        return await run_in_threadpool(attachments.finalize_session, upload_id, payload.sha256 if payload else None)
+    except attachments.UploadNotFound:
+        raise _not_found()
+    except attachments.OffsetMismatch as exc:
+        raise HTTPException(status_code=409, detail={'message': 'Upload incomplete', 'offset': exc.expected})
+    except ValueError:
+        raise HTTPException(status_code=422, detail='sha256 mismatch')
+
+@router.delete('/uploads/sessions/{upload_id}')
+async def abort_upload(upload_id: str):
+    try:
+        await run_in_threadpool(attachments.abort_session, upload_id)
+    except attachments.UploadNotFound:
+        raise _not_found()
+    return {"status": "ok"}
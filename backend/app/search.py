@@ -0,0 +1,130 @@
+import re
+import sys
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# FTS5 index mirroring messages.content / messages.sender_name.
+# External-content table: the text lives in `messages`, the index only stores terms.
+# Triggers keep it in sync on insert (send), content edits and soft delete, so every
+# write path (REST, websocket, bulk) is covered without touching the routers.
+FTS_TABLE = "messages_fts"
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content, sender_name,
+        content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages
+    WHEN new.deleted = 0 BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content, sender_name) VALUES (new.id, new.content, new.sender_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages
+    WHEN old.deleted = 0 BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, sender_name) VALUES ('delete', old.id, old.content, old.sender_name);
+    END""",
+    # One trigger for both halves: SQLite gives no ordering guarantee across triggers
+    # and re-inserting a rowid before its old terms are removed corrupts the index.
+    f"""CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content, sender_name, deleted ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, sender_name)
+            SELECT 'delete', old.id, old.content, old.sender_name WHERE old.deleted = 0;
+        INSERT INTO {FTS_TABLE}(rowid, content, sender_name)
+            SELECT new.id, new.content, new.sender_name WHERE new.deleted = 0;
+    END""",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def ensure_fts(conn: Connection) -> bool:
+    """Create the FTS table and triggers if missing. Returns True when the table was new."""
+    existed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+    for sql in _DDL:
+        conn.exec_driver_sql(sql)
+    return not existed
+
+def rebuild_fts(conn: Connection) -> int:
+    """Drop every indexed term and re-index all non-deleted messages. Returns rows indexed."""
+    ensure_fts(conn)
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+    conn.exec_driver_sql(
+        f"INSERT INTO {FTS_TABLE}(rowid, content, sender_name) "
+        "SELECT id, content, sender_name FROM messages WHERE deleted = 0"
+    )
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return conn.exec_driver_sql("SELECT count(*) FROM messages WHERE deleted = 0").scalar_one()
+
+def build_match(q: str) -> str | None:
+    """Turn free user input into a safe FTS5 query: every word quoted and prefix-matched."""
+    tokens = _TOKEN_RE.findall(q or "")
+    if not tokens:
+        return None
+    return " ".join('"' + t + '"*' for t in tokens)
+
+# Lower bm25 is better; content matches weigh more than sender-name matches.
+_RANK = f"bm25({FTS_TABLE}, 10.0, 2.0)"
+# Hits of the previous page a cursor carries to resume after
+MAX_ANCHORS = 8
+
+def search(
+    conn: Connection,
+    match: str,
+    *,
+    room_ids: list[int] | None = None,
+    after: tuple[float, int] | None = None,
+    anchors: list[int] | None = None,
+    limit: int = 50,
+):
+    """Ranked hits as mappings with message columns plus `snippet` and `rank`.
+
+    `room_ids=None` searches every room. `after` is the (rank, id) of the last hit
+    on the previous page and `anchors` the ids of that page's last few hits.
+    BM25 depends on the whole corpus, so a rank from an earlier request is stale once
+    anything is sent, edited or deleted: the page starts after the last of the anchor
+    hits that still matches, ranked by this same statement. The stored (rank, id) only
+    stands in when none of them match any more.
+    """
+    where = [f"{FTS_TABLE} MATCH :match", "m.deleted = 0"]
+    params: dict = {"match": match, "limit": limit}
+    cte = ""
+    if room_ids is not None:
+        if not room_ids:
+            return []
+        keys = []
+        for i, rid in enumerate(room_ids):
+            params[f"r{i}"] = rid
+            keys.append(f":r{i}")
+        where.append(f"m.room_id IN ({', '.join(keys)})")
+    if after is not None:
+        params["after_rank"], params["after_id"] = after
+        keys = []
+        for i, aid in enumerate((anchors or [after[1]])[:MAX_ANCHORS]):
+            params[f"a{i}"] = aid
+            keys.append(f":a{i}")
+        # Last in page order: highest rank, then lowest id
+        cte = (f"WITH anchor AS (SELECT {_RANK} AS rank, rowid AS id FROM {FTS_TABLE} "
+               f"WHERE {FTS_TABLE} MATCH :match AND rowid IN ({', '.join(keys)}) "
+               "ORDER BY rank DESC, id ASC LIMIT 1) ")
+        rank = "COALESCE((SELECT rank FROM anchor), :after_rank)"
+        where.append(f"({_RANK} > {rank} OR ({_RANK} = {rank} AND m.id < COALESCE((SELECT id FROM anchor), :after_id)))")
+    sql = (
+        f"{cte}SELECT m.id, m.room_id, m.sender_id, m.sender_name, m.content, m.timestamp, "
+        f"snippet({FTS_TABLE}, 0, '<mark>', '</mark>', '…', 12) AS snippet, {_RANK} AS rank "
+        f"FROM {FTS_TABLE} JOIN messages m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(where)} "
+        "ORDER BY rank ASC, m.id DESC LIMIT :limit"
+    )
+    return [dict(r) for r in conn.execute(text(sql), params).mappings()]
+
+if __name__ == "__main__":
+    # Backfill / repair the index for an existing database:
+    #   cd backend && python -m app.search rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m app.search rebuild")
+        sys.exit(2)
+    from .db import engine
+    with engine.begin() as conn:
+        n = rebuild_fts(conn)
+    print(f"indexed {n} messages into {FTS_TABLE}")
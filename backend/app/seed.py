@@ -0,0 +1,52 @@
+import json
+from datetime import date
+from sqlalchemy.orm import Session
+from . import models, timetables
+
+# Demo data for a fresh database. Not run by the app any more; opt in with
+#   cd backend && python -m app.migrations seed
+# or MYCAMPUS_SEED=1 for the dev server. Each table is only filled when empty.
+
+def seed(db: Session) -> list[str]:
+    """Insert the sample rows into empty tables. Returns the tables that were filled."""
+    filled = []
+
+    def empty(model) -> bool:
+        # EXISTS stops at the first row instead of counting the table
+        return db.query(db.query(model).exists()).scalar() is False
+
+    if empty(models.Announcement):
+        db.add_all([
+            models.Announcement(title='Mid-term Exam Schedule Published', content='Schedule published. Check Events.', date=date(2025, 8, 15), postedBy='Admin Office'),
+            models.Announcement(title='Annual Sports Day Registration', content='Register before Aug 20th.', date=date(2025, 8, 10), postedBy='Student Council'),
+        ])
+        filled.append('announcements')
+    if empty(models.Event):
+        db.add_all([
+            models.Event(title='Opening Day', type='Academic Event', start=date(2025, 7, 14)),
+            models.Event(title='Independence Day', type='Holiday', start=date(2025, 8, 15)),
+        ])
+        filled.append('events')
+    if empty(models.Subject):
+        db.add_all([
+            models.Subject(id=1, name='Business Statistics', faculty='Dr. S. Nanthitha', ongoingChapters='Unit 2: Probability\nUnit 3: Hypothesis Testing', type='Theory'),
+            models.Subject(id=2, name='Foundation of Data Science', faculty='Ms. Padmapriya', ongoingChapters='Unit 1: Introduction to Data Science', type='Theory'),
+            models.Subject(id=3, name='Full Stack Development', faculty='Dr. A. Priya', ongoingChapters='Unit 3: React Hooks\nUnit 4: State Management', type='Theory'),
+            models.Subject(id=7, name='Foundation of Data Science Lab', faculty='Mr. P. TamilArasu', ongoingChapters='Experiment 3: Data Visualization with Matplotlib', type='Lab'),
+        ])
+        filled.append('subjects')
+    if empty(models.Timetable):
+        sample = {
+            'Monday': [ {'subjectId': '1', 'faculty': 'Dr. S. Nanthitha'}, {'subjectId': '2', 'faculty': 'Ms. Padmapriya'}, 'Break', {'subjectId': '3', 'faculty': 'Dr. A. Priya'} ],
+            'Tuesday': [ {'subjectId': '3', 'faculty': 'Dr. A. Priya'}, {'subjectId': '1', 'faculty': 'Dr. S. Nanthitha'}, 'Break', {'subjectId': '2', 'faculty': 'Ms. Padmapriya'} ],
+        }
+        row = models.Timetable(section='CSBS', data=json.dumps(sample))
+        db.add(row)
+        db.flush()
+        timetables.migrate_json_rows(db.connection(), ids=[row.id])
+        filled.append('timetables')
+    if empty(models.ChatRoom):
+        db.add(models.ChatRoom(name='General', type='group'))
+        filled.append('chat_rooms')
+    db.commit()
+    return filled
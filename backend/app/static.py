@@ -0,0 +1,98 @@
+import os
+import re
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Static delivery for /uploads.
+# Attachment URLs never change content (content-addressed blobs, timestamped legacy names),
+# so every response is cacheable forever: Cache-Control immutable plus a strong ETag (the
+# SHA-256 for blobs), with If-None-Match / If-Range answered from it. Range and multi-range
+# requests come from Starlette's FileResponse.
+#
+# Zero-copy: when the server offers the ASGI "http.response.pathsend" extension the file
+# path is handed to it instead of streaming chunks through Python. Behind nginx, set
+# MYCAMPUS_UPLOADS_ACCEL_REDIRECT=/internal-uploads/ (an `internal` location aliased to
+# the uploads directory) and the body is left to nginx's sendfile via X-Accel-Redirect.
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+_CAS_NAME_RE = re.compile(r"^cas/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})")
+
+class AttachmentFileResponse(FileResponse):
+    chunk_size = 256 * 1024
+
+    def __init__(self, *args, accel_redirect: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accel_redirect = accel_redirect
+
+    def _should_use_range(self, http_if_range: str, stat_result: os.stat_result) -> bool:
+        # Starlette only knows its own mtime/size ETag; a resuming client sends ours
+        etag = self.headers.get("etag")
+        if etag is not None and http_if_range == etag:
+            return True
+        return super()._should_use_range(http_if_range, stat_result)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.accel_redirect:
+            # Proxy serves the bytes (and ranges); we only supply headers
+            self.headers["x-accel-redirect"] = self.accel_redirect
+            self.headers["content-length"] = "0"
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        request_headers = Headers(scope=scope)
+        if (
+            scope["method"].upper() == "GET"
+            and "http.response.pathsend" in scope.get("extensions", {})
+            and "range" not in request_headers
+        ):
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+        await super().__call__(scope, receive, _multipart_content_type(send))
+
+def _multipart_content_type(send: Send) -> Send:
+    # Starlette 0.41 sends the multipart/byteranges type of a multi-range 206 as its
+    # Content-Range; clients look for it in Content-Type
+    async def wrapped(message) -> None:
+        if message["type"] == "http.response.start" and message["status"] == 206:
+            headers = message["headers"]
+            multipart = next((v for k, v in headers if k == b"content-range" and v.startswith(b"multipart/")), None)
+            if multipart is not None:
+                headers = [(k, v) for k, v in headers if k not in (b"content-range", b"content-type")]
+                message = {**message, "headers": headers + [(b"content-type", multipart)]}
+        await send(message)
+    return wrapped
+
+class AttachmentFiles(StaticFiles):
+    def __init__(self, *args, accel_prefix: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accel_prefix = accel_prefix if accel_prefix is not None else os.environ.get("MYCAMPUS_UPLOADS_ACCEL_REDIRECT")
+
+    def lookup_path(self, path: str):
+        # Partial uploads and temp files are not public
+        if any(part.startswith(".") or part.endswith(".tmp") for part in path.replace(os.sep, "/").split("/")):
+            return "", None
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        rel = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        headers = {"cache-control": CACHE_CONTROL}
+        m = _CAS_NAME_RE.match(rel)
+        if m:
+            headers["etag"] = f'"{m.group(1)}"'
+        accel = None
+        if self.accel_prefix and scope["method"].upper() in ("GET", "HEAD"):
+            accel = self.accel_prefix.rstrip("/") + "/" + rel
+        response = AttachmentFileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, headers=headers, accel_redirect=accel,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers={
+                k: v for k, v in response.headers.items()
+                if k in ("etag", "cache-control", "last-modified", "vary")
+            })
+        return response
@@ -0,0 +1,112 @@
+import json
+import sys
+from typing import Iterable, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection
+from .models import Timetable, TimetableCell
+
+# Normalized timetable storage.
+# A section's week used to be one JSON blob ({day: [entry, ...]}) in timetables.data.
+# Each entry now is a row in timetable_cells keyed by (section, day, period), so a
+# single period can be changed without rewriting the week, and faculty/subject questions
+# ("who teaches on Tuesday", "is this teacher double-booked") are index lookups.
+# The API still speaks the JSON shape; `week_from_cells` rebuilds it. A day with no
+# entries is kept as one EMPTY_DAY marker cell so it still appears (as []) on read.
+
+EMPTY_DAY = -1
+
+def cells_from_week(timetable_id: int, section: str, data: dict) -> list[dict]:
+    rows = []
+    for day_order, (day, entries) in enumerate(data.items()):
+        if not entries:
+            rows.append({
+                "timetable_id": timetable_id, "section": section,
+                "day": day, "day_order": day_order, "period": EMPTY_DAY,
+                **entry_columns(None),
+            })
+        for period, entry in enumerate(entries or []):
+            rows.append({
+                "timetable_id": timetable_id, "section": section,
+                "day": day, "day_order": day_order, "period": period,
+                **entry_columns(entry),
+            })
+    return rows
+
+def entry_columns(entry) -> dict:
+    if isinstance(entry, dict):
+        return {"subject_id": entry.get("subjectId"), "faculty": entry.get("faculty"), "label": None}
+    if isinstance(entry, str):
+        return {"subject_id": None, "faculty": None, "label": entry}
+    return {"subject_id": None, "faculty": None, "label": None}
+
+def cell_entry(cell):
+    if cell.label is not None:
+        return cell.label
+    if cell.subject_id is None and cell.faculty is None:
+        return None
+    entry = {}
+    if cell.subject_id is not None:
+        entry["subjectId"] = cell.subject_id
+    if cell.faculty is not None:
+        entry["faculty"] = cell.faculty
+    return entry
+
+def week_from_cells(cells: Iterable) -> dict:
+    """Cells ordered by (day_order, period) -> {day: [entry, ...]}; missing periods become None."""
+    data: dict[str, list] = {}
+    for cell in cells:
+        day_list = data.setdefault(cell.day, [])
+        if cell.period == EMPTY_DAY:
+            continue
+        while len(day_list) < cell.period:
+            day_list.append(None)
+        day_list.append(cell_entry(cell))
+    return data
+
+def migrate_json_rows(conn: Connection, ids: Optional[list[int]] = None) -> int:
+    """Explode timetables (all, or just `ids`) that have no cells yet into timetable_cells. Returns cells written."""
+    q = (select(Timetable.id, Timetable.section, Timetable.data)
+         .where(~select(TimetableCell.id).where(TimetableCell.timetable_id == Timetable.id).exists()))
+    if ids is not None:
+        q = q.where(Timetable.id.in_(ids))
+    pending = conn.execute(q).all()
+    written = 0
+    for timetable_id, section, raw in pending:
+        try:
+            data = json.loads(raw or "{}")
+        except ValueError:
+            continue
+        rows = cells_from_week(timetable_id, section, data)
+        if rows:
+            conn.execute(insert(TimetableCell), rows)
+            written += len(rows)
+    return written
+
+def add_empty_day_markers(conn: Connection) -> int:
+    """Marker cells for empty days of timetables exploded before markers existed. Returns markers written."""
+    existing = {(section, day) for section, day in conn.execute(select(TimetableCell.section, TimetableCell.day))}
+    rows = []
+    for timetable_id, section, raw in conn.execute(select(Timetable.id, Timetable.section, Timetable.data)):
+        try:
+            data = json.loads(raw or "{}")
+        except ValueError:
+            continue
+        if not any((section, day) in existing for day in data):
+            continue  # not exploded yet; migrate_json_rows writes the markers itself
+        rows += [row for row in cells_from_week(timetable_id, section, data)
+                 if row["period"] == EMPTY_DAY and (section, row["day"]) not in existing]
+    if rows:
+        conn.execute(insert(TimetableCell), rows)
+    return len(rows)
+
+if __name__ == "__main__":
+    # Re-run the JSON -> cells migration for an existing database:
+    #   cd backend && python -m app.timetables migrate
+    if sys.argv[1:] != ["migrate"]:
+        print("usage: python -m app.timetables migrate")
+        sys.exit(2)
+    from .db import engine, Base
+    Base.metadata.create_all(bind=engine, tables=[TimetableCell.__table__])
+    with engine.begin() as conn:
+        n = migrate_json_rows(conn)
+    print(f"wrote {n} timetable cells")
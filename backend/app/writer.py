@@ -0,0 +1,155 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .db import ASYNC_DATABASE_URL, apply_pragmas, db_pragmas
+from .metrics import metrics
+from .profiler import profiler
+
+# Group commit for small writes.
+# With MYCAMPUS_GROUP_COMMIT=1 the chat and leave write endpoints hand their work to a
+# single writer task instead of committing on their own. The writer takes whatever jobs
+# are queued (up to MYCAMPUS_GROUP_COMMIT_MAX_BATCH, waiting at most
+# MYCAMPUS_GROUP_COMMIT_MAX_DELAY_MS for more), runs each one inside its own SAVEPOINT
+# and commits them all in one transaction: one fsync and one lock acquisition per batch
+# instead of per request. A job that raises only rolls back its own savepoint and the
+# error goes back to its caller; the rest of the batch still commits.
+
+WriteJob = Callable[[AsyncSession], Awaitable[Any]]
+
+class GroupCommitWriter:
+    def __init__(self, max_batch: int = 64, max_delay: float = 0.002):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = {"batches": 0, "jobs": 0, "failed_jobs": 0, "failed_commits": 0, "max_batch_seen": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._engine = None
+        self._sessions: Optional[async_sessionmaker] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        # Own single-connection engine. pysqlite's implicit transaction handling breaks
+        # SAVEPOINT, so transactions are begun explicitly (and IMMEDIATE: this is the
+        # only writer, take the write lock up front instead of upgrading mid-batch).
+        self._engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0)
+        sync_engine = self._engine.sync_engine
+        apply_pragmas(sync_engine, db_pragmas())
+        metrics.instrument_engine(sync_engine)
+        profiler.instrument_engine(sync_engine)
+
+        @event.listens_for(sync_engine, "connect")
+        def _autocommit_driver(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(sync_engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        self._sessions = async_sessionmaker(self._engine, autoflush=False, expire_on_commit=False)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Finish what is queued, then stop
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await self._engine.dispose()
+
+    async def submit(self, job: WriteJob) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, fut))
+        return await fut
+
+    async def _collect(self) -> tuple[list, bool]:
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list):
+        done: list[tuple[asyncio.Future, Any]] = []
+        try:
+            async with self._sessions() as session:
+                async with session.begin():
+                    for job, fut in batch:
+                        if fut.cancelled():
+                            continue
+                        try:
+                            async with session.begin_nested():
+                                result = await job(session)
+                            done.append((fut, result))
+                        except Exception as exc:
+                            self.stats["failed_jobs"] += 1
+                            fut.set_exception(exc)
+        except Exception as exc:
+            # The commit itself failed: nobody in the batch got their write
+            self.stats["failed_commits"] += 1
+            for fut, _ in done:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        self.stats["batches"] += 1
+        self.stats["jobs"] += len(batch)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        for fut, result in done:
+            if not fut.done():
+                fut.set_result(result)
+
+def writer_from_env() -> Optional[GroupCommitWriter]:
+    if os.environ.get("MYCAMPUS_GROUP_COMMIT", "0").lower() not in ("1", "true", "yes", "on"):
+        return None
+    return GroupCommitWriter(
+        max_batch=int(os.environ.get("MYCAMPUS_GROUP_COMMIT_MAX_BATCH", "64")),
+        max_delay=float(os.environ.get("MYCAMPUS_GROUP_COMMIT_MAX_DELAY_MS", "2")) / 1000.0,
+    )
+
+writer = writer_from_env()
+
+# Websocket message:send always goes through a group-commit writer: the shared one when
+# MYCAMPUS_GROUP_COMMIT is on, otherwise one of its own (MYCAMPUS_WS_SEND_MAX_BATCH,
+# MYCAMPUS_WS_SEND_MAX_DELAY_MS), so socket sends commit in small batches either way.
+ws_writer = writer or GroupCommitWriter(
+    max_batch=int(os.environ.get("MYCAMPUS_WS_SEND_MAX_BATCH", "32")),
+    max_delay=float(os.environ.get("MYCAMPUS_WS_SEND_MAX_DELAY_MS", "2")) / 1000.0,
+)
+
+async def run_write(db: AsyncSession, job: WriteJob) -> Any:
+    # Run `job` (which adds/updates rows but does not commit) and commit it: through the
+    # group-commit writer when enabled, otherwise on the request's own session.
+    if writer is not None and writer.running:
+        return await writer.submit(job)
+    result = await job(db)
+    await db.commit()
+    return result
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.bulk import export_stream, import_stream
+from app.db import Base, apply_pragmas, db_pragmas
+from app.routers.bulk import TABLES
+
+# Bulk leave import into a scratch database (app/database.db is not touched): rows are
+# generated on the fly as a CSV byte stream, fed through import_stream at several batch
+# sizes, then exported again. Each configuration runs in a fresh process so peak RSS is
+# its own. Run from backend/:
+#   python -m bench.bulk_import --rows 1000000 --batch-sizes 100,1000,10000
+
+HEADER = "id,studentName,studentId,department,mentorName,parentPhone,leaveType,fromDate,toDate,totalDays,reason,status\n"
+DEPARTMENTS = ['CSE', 'ECE', 'MECH', 'CSBS', 'AIML']
+STATUSES = ['Pending', 'Approved', 'Rejected']
+
+async def _csv_body(rows: int, chunk_bytes: int = 64 * 1024):
+    rng = random.Random(1)
+    buf = [HEADER]
+    size = len(HEADER)
+    for i in range(1, rows + 1):
+        line = (f"{i},Student {i},S{i % 50000},{rng.choice(DEPARTMENTS)},Mentor {i % 40},9000000000,"
+                f"{rng.choice(['Sick', 'Casual', 'OD'])},2025-01-{1 + i % 28:02d},2025-01-{1 + i % 28:02d},1,"
+                f"\"reason {i}, see note\",{rng.choice(STATUSES)}\n")
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf).encode()
+
+async def _run(path: str, rows: int, batch_size: int) -> dict:
+    engine = create_engine(f"sqlite:///{path}")
+    apply_pragmas(engine, db_pragmas())
+    Base.metadata.create_all(bind=engine)
+    t0 = time.perf_counter()
+    report = await import_stream(engine, TABLES['leaves'], _csv_body(rows), 'csv', batch_size)
+    import_s = time.perf_counter() - t0
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool)
+    t0 = time.perf_counter()
+    exported = 0
+    async for chunk in export_stream(async_engine, TABLES['leaves'], 'csv'):
+        exported += len(chunk)
+    export_s = time.perf_counter() - t0
+    await async_engine.dispose()
+    engine.dispose()
+    return {
+        'batch_size': batch_size,
+        'inserted': report['inserted'],
+        'failed': report['failed'],
+        'import_s': import_s,
+        'import_rows_per_s': report['inserted'] / import_s,
+        'export_s': export_s,
+        'export_mb': exported / 1e6,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def _child(rows: int, batch_size: int, out):
+    with tempfile.TemporaryDirectory() as tmp:
+        out.put(asyncio.run(_run(os.path.join(tmp, 'bench.db'), rows, batch_size)))
+
+def main(args):
+    ctx = multiprocessing.get_context('spawn')
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        out = ctx.Queue()
+        proc = ctx.Process(target=_child, args=(args.rows, batch_size, out))
+        proc.start()
+        res = out.get()
+        proc.join()
+        print(f"batch {res['batch_size']:>6}: {res['inserted']:>8} rows in {res['import_s']:7.1f} s "
+              f"({res['import_rows_per_s']:8.0f} rows/s)  export {res['export_mb']:6.1f} MB in {res['export_s']:5.1f} s  "
+              f"peak RSS {res['peak_rss_mb']:6.0f} MB  failed {res['failed']}")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--batch-sizes', default='100,1000,10000')
+    main(ap.parse_args())
@@ -0,0 +1,215 @@
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from app import migrations
+from app.db import DB_PATH, SQLALCHEMY_DATABASE_URL, apply_pragmas, db_pragmas
+from app.routers.bulk import _count_imported_leaves
+from app.timetables import migrate_json_rows
+
+# Synthetic data for the benchmark suite, written straight into app/database.db (the
+# file the API serves) with executemany in large transactions. Rooms get a skewed share
+# of the messages (a few busy lecture groups, many quiet ones); message text comes from
+# a fixed vocabulary so search has hits. Counters (room_counters, room_read_state,
+# leave_counters), event seqs, FTS rows and timetable cells are filled as the API
+# would have. Same --seed, same data. Run from backend/:
+#   python -m bench.datagen --reset --rooms 50 --messages 200000 --users 2000
+# Refuses to add to a database that already has chat messages unless --reset.
+
+BATCH = 5000
+
+WORDS = (
+    "exam assignment lab deadline lecture notes syllabus project viva attendance "
+    "timetable library hostel canteen placement internship seminar workshop quiz "
+    "marks result holiday fees bus sports cultural mentor review submission record "
+    "python java database network algebra calculus statistics physics chemistry"
+).split()
+DEPARTMENTS = ["CSE", "ECE", "MECH", "CSBS", "AIML", "IT", "EEE"]
+STATUSES = ["Pending", "Approved", "Rejected"]
+LEAVE_TYPES = ["Sick", "Casual", "OD"]
+EVENT_TYPES = ["Academic Event", "Holiday", "Exam", "Workshop", "Cultural"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+VISIBILITIES = ["all", "all", "all", "student", "teacher"]
+EPOCH = datetime(2025, 6, 1)
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 14)))
+
+def _batched(conn, sql: str, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.exec_driver_sql(sql, batch)
+            batch = []
+    if batch:
+        conn.exec_driver_sql(sql, batch)
+
+def _has_rows(conn, table: str) -> bool:
+    return conn.exec_driver_sql(f"SELECT EXISTS (SELECT 1 FROM {table})").scalar() == 1
+
+def _chat(conn, rng: random.Random, rooms: int, messages: int, users: int) -> dict:
+    first_room = (conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM chat_rooms").scalar() or 0) + 1
+    room_ids = list(range(first_room, first_room + rooms))
+    conn.exec_driver_sql(
+        "INSERT INTO chat_rooms (id, name, type, visibility, meta) VALUES (?, ?, 'group', ?, NULL)",
+        [(rid, f"bench-room-{rid}", rng.choice(VISIBILITIES)) for rid in room_ids],
+    )
+    # Members: up to 200 per room, drawn from the user pool
+    members = []
+    for rid in room_ids:
+        for u in rng.sample(range(users), min(users, rng.randint(10, 200))):
+            members.append((rid, f"u{u}", "member"))
+    _batched(conn, "INSERT INTO room_members (room_id, user_id, role) VALUES (?, ?, ?)", members)
+
+    # Skewed room sizes: weight ~ 1/rank
+    weights = [1.0 / (i + 1) for i in range(rooms)]
+    first_id = (conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM messages").scalar() or 0) + 1
+    per_room: dict[int, list[int]] = {rid: [] for rid in room_ids}
+    seq: Counter = Counter()
+    step = max(1, int(180 * 86400 / max(messages, 1)))
+
+    def rows():
+        for i in range(messages):
+            mid = first_id + i
+            rid = rng.choices(room_ids, weights)[0]
+            u = rng.randrange(users)
+            seq[rid] += 1
+            per_room[rid].append(mid)
+            ts = (EPOCH + timedelta(seconds=i * step)).isoformat(timespec="seconds") + "Z"
+            yield (mid, rid, f"u{u}", f"User {u}", "text", _sentence(rng), None, ts, 0, None, seq[rid])
+
+    _batched(conn, "INSERT INTO messages (id, room_id, sender_id, sender_name, type, content, meta, timestamp, "
+                   "deleted, client_id, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.exec_driver_sql(
+        "INSERT INTO room_counters (room_id, message_count, last_message_id, event_seq) VALUES (?, ?, ?, ?)",
+        [(rid, len(ids), ids[-1] if ids else 0, seq[rid]) for rid, ids in per_room.items()],
+    )
+    # Read watermarks for a few members per room, somewhere in the room's history
+    now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    states = []
+    for rid, ids in per_room.items():
+        if not ids:
+            continue
+        for u in rng.sample(range(users), min(users, 20)):
+            k = rng.randint(1, len(ids))
+            states.append((rid, f"u{u}", ids[k - 1], k, now))
+    _batched(conn, "INSERT INTO room_read_state (room_id, user_id, last_read_id, read_count, updated_at) "
+                   "VALUES (?, ?, ?, ?, ?)", states)
+    return {"rooms": rooms, "messages": messages, "room_members": len(members), "read_states": len(states)}
+
+def _leaves(conn, rng: random.Random, leaves: int, users: int) -> int:
+    first_id = (conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM leaves").scalar() or 0) + 1
+    cols = ["id", "studentName", "studentId", "department", "mentorName", "parentPhone", "leaveType",
+            "fromDate", "toDate", "totalDays", "reason", "status"]
+    sql = f"INSERT INTO leaves ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    batch = []
+    for i in range(leaves):
+        u = rng.randrange(users)
+        start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        days = rng.randint(1, 5)
+        # Older requests are mostly decided; the newest tenth is mostly pending
+        status = "Pending" if i > leaves * 0.9 and rng.random() < 0.7 else rng.choice(STATUSES)
+        batch.append({
+            "id": first_id + i, "studentName": f"User {u}", "studentId": f"S{u}",
+            "department": rng.choice(DEPARTMENTS), "mentorName": f"Mentor {u % 40}",
+            "parentPhone": "9000000000", "leaveType": rng.choice(LEAVE_TYPES),
+            "fromDate": start.isoformat(), "toDate": (start + timedelta(days=days - 1)).isoformat(),
+            "totalDays": days, "reason": _sentence(rng), "status": status,
+        })
+        if len(batch) >= BATCH or i == leaves - 1:
+            conn.exec_driver_sql(sql, [tuple(r[c] for c in cols) for r in batch])
+            _count_imported_leaves(conn, batch)
+            batch = []
+    return leaves
+
+def _events(conn, rng: random.Random, events: int) -> int:
+    rows = []
+    for _ in range(events):
+        start = date(2025, 1, 1) + timedelta(days=rng.randrange(540))
+        end = start + timedelta(days=rng.randint(1, 6)) if rng.random() < 0.2 else None
+        rows.append((_sentence(rng)[:60], rng.choice(EVENT_TYPES), start.isoformat(),
+                     end.isoformat() if end else None, _sentence(rng)))
+    _batched(conn, 'INSERT INTO events (title, type, start, "end", description) VALUES (?, ?, ?, ?, ?)', rows)
+    return events
+
+def _timetables(conn, rng: random.Random, sections: int) -> int:
+    if not _has_rows(conn, "subjects"):
+        conn.exec_driver_sql(
+            'INSERT INTO subjects (id, name, faculty, "ongoingChapters", type) VALUES (?, ?, ?, ?, ?)',
+            [(i, f"Subject {i}", f"Faculty {i % 25}", "Unit 1", "Theory") for i in range(1, 41)],
+        )
+    start = conn.exec_driver_sql("SELECT COUNT(*) FROM timetables").scalar() or 0
+    ids = []
+    for n in range(start, start + sections):
+        week = {}
+        for day in DAYS[:5]:
+            entries = []
+            for period in range(7):
+                if period == 3:
+                    entries.append("Break")
+                else:
+                    s = rng.randint(1, 40)
+                    entries.append({"subjectId": str(s), "faculty": f"Faculty {s % 25}"})
+            week[day] = entries
+        ids.append(conn.execute(
+            text("INSERT INTO timetables (section, data) VALUES (:section, :data) RETURNING id"),
+            {"section": f"BENCH-{n}", "data": json.dumps(week)},
+        ).scalar())
+    return migrate_json_rows(conn, ids)
+
+def generate(rooms: int, messages: int, users: int, leaves: int, events: int, timetables: int,
+             seed: int = 1, reset: bool = False, path: Path = DB_PATH) -> dict:
+    if reset:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+    url = SQLALCHEMY_DATABASE_URL if path == DB_PATH else f"sqlite:///{Path(path).as_posix()}"
+    engine = create_engine(url)
+    apply_pragmas(engine, db_pragmas())
+    migrations.upgrade(engine)
+    rng = random.Random(seed)
+    report = {"database": str(path), "seed": seed}
+    t0 = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            if _has_rows(conn, "messages"):
+                raise SystemExit(f"{path} already has messages; pass --reset to start from an empty database")
+            report.update(_chat(conn, rng, rooms, messages, users))
+        with engine.begin() as conn:
+            report["leaves"] = _leaves(conn, rng, leaves, users)
+            report["events"] = _events(conn, rng, events)
+            report["timetable_cells"] = _timetables(conn, rng, timetables)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    finally:
+        engine.dispose()
+    report["users"] = users
+    report["timetables"] = timetables
+    report["seconds"] = round(time.perf_counter() - t0, 2)
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fill app/database.db with synthetic benchmark data")
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--messages", type=int, default=100_000)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--leaves", type=int, default=20_000)
+    ap.add_argument("--events", type=int, default=1000)
+    ap.add_argument("--timetables", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--reset", action="store_true", help="delete the database file first")
+    args = ap.parse_args(argv)
+    report = generate(args.rooms, args.messages, args.users, args.leaves, args.events, args.timetables,
+                      seed=args.seed, reset=args.reset)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
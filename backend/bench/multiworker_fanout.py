@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+
+# Starts N separate uvicorn workers sharing one SQLite event-log broker, connects a
+# websocket to each, posts one message through worker 0 and checks that every socket
+# receives it. Run from backend/:
+#   python -m bench.multiworker_fanout --workers 4
+
+def _wait_ready(port: int, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/chatrooms", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+def _post(port: int, path: str, body: dict) -> dict:
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", data=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    return json.loads(urllib.request.urlopen(req, timeout=5).read())
+
+async def _check(ports: list[int], room_id: int, timeout: float) -> dict[int, float]:
+    socks = [await websockets.connect(f"ws://127.0.0.1:{p}/api/ws/{room_id}") for p in ports]
+    try:
+        marker = f"fanout-{time.time_ns()}"
+        t0 = time.perf_counter()
+        await asyncio.to_thread(_post, ports[0], f"/api/messages/{room_id}",
+                                {"sender_id": "bench", "sender_name": "bench", "content": marker})
+
+        async def wait_for(port, ws):
+            while True:
+                msg = json.loads(await ws.recv())
+                if msg.get("type") == "message:new" and msg["data"]["content"] == marker:
+                    return port, time.perf_counter() - t0
+
+        done = await asyncio.wait_for(asyncio.gather(*(wait_for(p, ws) for p, ws in zip(ports, socks))), timeout)
+        return dict(done)
+    finally:
+        for ws in socks:
+            await ws.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--base-port", type=int, default=8100)
+    ap.add_argument("--room", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=5.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="mycampus-broker-")
+    env = dict(os.environ, MYCAMPUS_BROKER="sqlite", MYCAMPUS_BROKER_PATH=os.path.join(tmp, "broker.db"))
+    ports = [args.base_port + i for i in range(args.workers)]
+    procs = []
+    try:
+        for port in ports:
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                env=env,
+            ))
+            # one at a time so startup DDL does not race
+            _wait_ready(port)
+        latencies = asyncio.run(_check(ports, args.room, args.timeout))
+        for port in ports:
+            print(f"worker :{port} received in {latencies[port] * 1000:.1f} ms")
+        print(f"ok: {len(latencies)}/{len(ports)} workers")
+    except asyncio.TimeoutError:
+        print("FAILED: not every worker received the message")
+        sys.exit(1)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+import httpx
+import websockets
+
+from bench.datagen import DEPARTMENTS, WORDS
+
+# Scenario drivers for bench.suite. A scenario is one user-level operation (open a room
+# and page back through its history, run a search, ...) that the suite repeats from
+# --concurrency workers against a live server; every HTTP request or websocket
+# round-trip inside it is timed and recorded under an op name.
+
+class Context:
+    def __init__(self, base_url: str, rooms: list[tuple[int, int]], users: int, pages: int,
+                 ws_subscribers: int, ws_rooms: int):
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http", "ws", 1)
+        # (room id, message count); busy rooms are picked more often
+        self.rooms = rooms
+        self.room_ids = [rid for rid, _ in rooms]
+        self.room_weights = [max(count, 1) for _, count in rooms]
+        self.users = users
+        self.pages = pages
+        self.ws_subscribers = ws_subscribers
+        self.ws_rooms = ws_rooms
+
+    def room(self, rng: random.Random) -> int:
+        return rng.choices(self.room_ids, self.room_weights)[0]
+
+    def user(self, rng: random.Random) -> str:
+        return f"u{rng.randrange(max(self.users, 1))}"
+
+class Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.steps = 0
+        self.enabled = True
+
+    def add(self, op: str, seconds: float):
+        if self.enabled:
+            self.samples[op].append(seconds)
+
+    def error(self, op: str):
+        if self.enabled:
+            self.errors[op] += 1
+
+class Scenario(ABC):
+    name = ""
+
+    def __init__(self, ctx: Context, rec: Recorder, concurrency: int):
+        self.ctx = ctx
+        self.rec = rec
+        self.concurrency = concurrency
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def setup(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.ctx.base_url, timeout=30.0,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+
+    async def teardown(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    def extra(self) -> dict:
+        return {}
+
+    async def get(self, op: str, url: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+        t0 = time.perf_counter()
+        try:
+            r = await self.client.get(url, params=params, headers=headers)
+        except httpx.HTTPError:
+            self.rec.error(op)
+            return None
+        self.rec.add(op, time.perf_counter() - t0)
+        if r.status_code >= 400:
+            self.rec.error(op)
+        return r
+
+    @abstractmethod
+    async def step(self, rng: random.Random, state: dict):
+        ...
+
+class History(Scenario):
+    # Open a room at its newest page, then scroll back --pages pages by cursor
+    name = "history"
+
+    async def step(self, rng, state):
+        room_id = self.ctx.room(rng)
+        r = await self.get("latest_page", f"/api/messages/{room_id}", {"before_id": 2 ** 62, "limit": 50})
+        for _ in range(self.ctx.pages - 1):
+            cursor = r.headers.get("x-prev-cursor") if r is not None else None
+            if not cursor:
+                break
+            r = await self.get("older_page", f"/api/messages/{room_id}", {"cursor": cursor, "limit": 50})
+
+class Search(Scenario):
+    # Prefix search in one room, or across every room the user can see
+    name = "search"
+
+    async def step(self, rng, state):
+        word = rng.choice(WORDS)
+        q = word if rng.random() < 0.5 else word[: max(3, len(word) // 2)]
+        if rng.random() < 0.5:
+            await self.get("room_search", f"/api/messages/{self.ctx.room(rng)}/search", {"q": q, "limit": 20})
+        else:
+            await self.get("global_search", "/api/search/messages",
+                           {"q": q, "user_id": self.ctx.user(rng), "role": "student", "limit": 20})
+
+class LeaveBoard(Scenario):
+    # Mentor / HoD view: pending queue (optionally filtered), next page, status counts
+    name = "leave_board"
+
+    async def step(self, rng, state):
+        params = {"board": "true"}
+        pick = rng.random()
+        if pick < 0.4:
+            params["department"] = rng.choice(DEPARTMENTS)
+        elif pick < 0.7:
+            params["mentorName"] = f"Mentor {rng.randrange(40)}"
+        r = await self.get("board_page", "/api/leaves", params)
+        cursor = r.headers.get("x-next-cursor") if r is not None else None
+        if cursor:
+            await self.get("board_next_page", "/api/leaves", {**params, "cursor": cursor})
+        stats = {k: v for k, v in params.items() if k != "board"}
+        await self.get("leave_stats", "/api/leaves/stats", stats)
+
+class Dashboard(Scenario):
+    # A signed-in home screen polling its widgets; each worker is one client that keeps
+    # ETags and sends If-None-Match like a browser would
+    name = "dashboard"
+
+    async def step(self, rng, state):
+        if "user" not in state:
+            state["user"] = self.ctx.user(rng)
+            state["etags"] = {}
+        today = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        polls = [
+            ("announcements", "/api/announcements", None),
+            ("events_month", "/api/events", {"from_": today.replace(day=1).isoformat(),
+                                              "to": (today.replace(day=1) + timedelta(days=31)).isoformat()}),
+            ("calendar_month", "/api/events/calendar", {"month": today.strftime("%Y-%m")}),
+            ("unread", "/api/unread", {"user_id": state["user"], "role": "student"}),
+            ("leave_stats", "/api/leaves/stats", None),
+            ("presence", "/api/presence", {"rooms": ",".join(map(str, self.ctx.room_ids[:20]))}),
+        ]
+        for op, url, params in polls:
+            key = (url, json.dumps(params, sort_keys=True))
+            etag = state["etags"].get(key)
+            r = await self.get(op, url, params, {"If-None-Match": etag} if etag else None)
+            if r is not None and r.headers.get("etag"):
+                state["etags"][key] = r.headers["etag"]
+
+class _Pending:
+    __slots__ = ("t0", "remaining", "done")
+
+    def __init__(self, remaining: int):
+        self.t0 = time.perf_counter()
+        self.remaining = remaining
+        self.done = asyncio.Event()
+
+class WsFanout(Scenario):
+    # --ws-subscribers sockets spread over --ws-rooms rooms on /api/ws; each worker sends
+    # message:send on its own socket and waits for the ack (op "ack") and for every
+    # subscriber of the room to receive the message (op "fanout")
+    name = "ws_fanout"
+
+    async def setup(self):
+        self.rooms = self.ctx.room_ids[: self.ctx.ws_rooms]
+        self.subscribers: list = []
+        self.per_room: Counter = Counter()
+        self.pending: dict[str, _Pending] = {}
+        self.frames = 0
+        self.readers: list[asyncio.Task] = []
+        self.senders: list = []
+        for i in range(self.ctx.ws_subscribers):
+            room_id = self.rooms[i % len(self.rooms)]
+            ws = await websockets.connect(f"{self.ctx.ws_url}/api/ws?rooms={room_id}&user_id=sub{i}", max_queue=None)
+            self.subscribers.append(ws)
+            self.per_room[room_id] += 1
+            self.readers.append(asyncio.create_task(self._read(ws)))
+
+    async def _read(self, ws):
+        try:
+            async for raw in ws:
+                self.frames += 1
+                msg = json.loads(raw)
+                if msg.get("type") != "message:new":
+                    continue
+                entry = self.pending.get(msg["data"].get("client_id"))
+                if entry is None:
+                    continue
+                entry.remaining -= 1
+                if entry.remaining == 0:
+                    self.rec.add("fanout", time.perf_counter() - entry.t0)
+                    entry.done.set()
+        except websockets.ConnectionClosed:
+            pass
+
+    async def step(self, rng, state):
+        if "ws" not in state:
+            state["ws"] = await websockets.connect(f"{self.ctx.ws_url}/api/ws?rooms={','.join(map(str, self.rooms))}")
+            self.senders.append(state["ws"])
+        ws = state["ws"]
+        room_id = rng.choice(self.rooms)
+        client_id = uuid.uuid4().hex
+        entry = self.pending[client_id] = _Pending(self.per_room[room_id])
+        await ws.send(json.dumps({
+            "type": "message:send", "room_id": room_id, "client_id": client_id,
+            "sender_id": self.ctx.user(rng), "sender_name": "bench", "content": " ".join(rng.sample(WORDS, 6)),
+        }))
+        try:
+            while True:
+                msg = json.loads(await asyncio.wait_for(ws.recv(), 10))
+                if msg.get("client_id") == client_id and msg.get("type") in ("message:ack", "message:error"):
+                    break
+            if msg["type"] == "message:ack":
+                self.rec.add("ack", time.perf_counter() - entry.t0)
+            else:
+                self.rec.error("ack")
+            if entry.remaining > 0:
+                await asyncio.wait_for(entry.done.wait(), 10)
+        except asyncio.TimeoutError:
+            self.rec.error("fanout")
+        finally:
+            self.pending.pop(client_id, None)
+
+    async def teardown(self):
+        for ws in self.subscribers + self.senders:
+            await ws.close()
+        for task in self.readers:
+            task.cancel()
+        await super().teardown()
+
+    def extra(self) -> dict:
+        return {"subscribers": len(self.subscribers), "rooms": len(self.rooms), "frames_received": self.frames}
+
+SCENARIOS = {cls.name: cls for cls in (History, Search, WsFanout, LeaveBoard, Dashboard)}
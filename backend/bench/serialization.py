@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import httpx
+
+from bench.datagen import DB_PATH
+
+# Normal vs fast (MYCAMPUS_FAST_JSON) serialization on the list endpoints, in process
+# and on the same data: the app is called through httpx's ASGI transport with the
+# response cache off (a cache hit would skip the work being measured) and the fast path
+# switched per request set, alternating rounds so drift hits both sides alike. Every
+# case first checks that both paths return the same bytes. Run from backend/ after
+# bench.datagen:
+#   python -m bench.serialization --rounds 20
+# For the end-to-end view, run bench.suite twice with and without MYCAMPUS_FAST_JSON=1
+# and compare the reports.
+
+def _cases(rows: int) -> list[tuple[str, str, dict]]:
+    import sqlite3
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    try:
+        room = conn.execute("SELECT room_id FROM room_counters ORDER BY message_count DESC LIMIT 1").fetchone()[0]
+    finally:
+        conn.close()
+    return [
+        ("messages", f"/api/messages/{room}", {"before_id": 2 ** 62, "limit": rows}),
+        ("leaves", "/api/leaves", {"limit": min(rows, 500)}),
+        ("leaves_all_pending", "/api/leaves", {"status": "Pending"}),
+        ("events", "/api/events", {}),
+        ("announcements", "/api/announcements", {}),
+    ]
+
+async def _time(client: httpx.AsyncClient, url: str, params: dict, n: int) -> list[float]:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        r = await client.get(url, params=params)
+        samples.append(time.perf_counter() - t0)
+        r.raise_for_status()
+    return samples
+
+async def _compare(client: httpx.AsyncClient, name: str, url: str, params: dict, rounds: int, per_round: int) -> dict:
+    from app import fastjson
+    bodies = {}
+    for fast in (False, True):
+        fastjson.enabled = fast
+        r = await client.get(url, params=params)
+        r.raise_for_status()
+        bodies[fast] = r.content
+    if json.loads(bodies[False]) != json.loads(bodies[True]):
+        raise SystemExit(f"{name}: fast path returned a different body")
+    samples = {False: [], True: []}
+    for i in range(rounds):
+        # Alternate which side goes first
+        for fast in ((False, True) if i % 2 == 0 else (True, False)):
+            fastjson.enabled = fast
+            samples[fast] += await _time(client, url, params, per_round)
+    normal, fast = (statistics.median(samples[k]) * 1000 for k in (False, True))
+    return {
+        "rows": len(json.loads(bodies[True])),
+        "bytes": len(bodies[True]),
+        "identical_bytes": bodies[False] == bodies[True],
+        "normal_p50_ms": round(normal, 3),
+        "fast_p50_ms": round(fast, 3),
+        "speedup": round(normal / fast, 2) if fast else None,
+    }
+
+async def run(rounds: int, per_round: int, rows: int) -> dict:
+    from app.cache import cache
+    from app.db import async_engine
+    from app.main import app
+    cache.enabled = False
+    report = {}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, url, params in _cases(rows):
+                res = report[name] = await _compare(client, name, url, params, rounds, per_round)
+                print(f"{name:>20}: {res['rows']:6d} rows  normal {res['normal_p50_ms']:8.2f} ms  "
+                      f"fast {res['fast_p50_ms']:8.2f} ms  x{res['speedup']}", file=sys.stderr)
+    finally:
+        # aiosqlite's connection threads keep the interpreter alive until disposed
+        await async_engine.dispose()
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare normal and fast JSON serialization on list endpoints")
+    ap.add_argument("--rounds", type=int, default=10)
+    ap.add_argument("--per-round", type=int, default=5, help="requests per side per round")
+    ap.add_argument("--rows", type=int, default=1000, help="page size for the paged endpoints")
+    args = ap.parse_args(argv)
+    if not DB_PATH.exists():
+        raise SystemExit(f"{DB_PATH} does not exist; run python -m bench.datagen --reset first")
+    json.dump(asyncio.run(run(args.rounds, args.per_round, args.rows)), sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from app import migrations
+from app.db import Base, apply_pragmas, db_pragmas
+
+# Cold-start cost of the schema step on a populated database (a scratch file, not
+# app/database.db): the previous on_startup (create_all, five ALTER TABLEs with the
+# errors swallowed, COUNT(*) on the seeded tables) against migrations.upgrade on a
+# database that is already current. Every boot uses a fresh engine, as a new worker does.
+# Run from backend/:
+#   python -m bench.startup_time --messages 500000 --leaves 200000
+
+def _engine(path: str):
+    eng = create_engine(f"sqlite:///{path}")
+    apply_pragmas(eng, db_pragmas())
+    return eng
+
+def _populate(eng, messages: int, leaves: int):
+    Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO chat_rooms (id, name, type, visibility) VALUES (1, 'General', 'group', 'all')")
+        conn.exec_driver_sql(
+            "INSERT INTO messages (room_id, sender_id, sender_name, type, content, timestamp, deleted) VALUES (1, ?, ?, 'text', ?, ?, 0)",
+            [(f"u{i % 500}", f"User {i % 500}", f"message number {i} about the timetable", "2025-08-01T10:00:00Z") for i in range(messages)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO leaves VALUES (?, 'S', ?, 'CSE', 'M', '1', 'Sick', '2025-01-01', '2025-01-02', 1, 'r', 'Pending')",
+            [(i, f"s{i % 5000}") for i in range(1, leaves + 1)],
+        )
+
+def _legacy_startup(eng):
+    from app import models
+    from sqlalchemy.orm import Session
+    Base.metadata.create_all(bind=eng)
+    with eng.connect() as conn:
+        for sql in (
+            "ALTER TABLE chat_rooms ADD COLUMN visibility VARCHAR(32) NOT NULL DEFAULT 'all'",
+            "ALTER TABLE chat_rooms ADD COLUMN meta TEXT",
+            "ALTER TABLE messages ADD COLUMN type VARCHAR(16) NOT NULL DEFAULT 'text'",
+            "ALTER TABLE messages ADD COLUMN meta TEXT",
+            "ALTER TABLE messages ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0",
+        ):
+            try:
+                conn.exec_driver_sql(sql)
+            except Exception:
+                pass
+    with Session(eng) as db:
+        for model in (models.Announcement, models.Event, models.Subject, models.Timetable, models.ChatRoom):
+            db.query(model).count()
+
+def _time(path: str, fn, repeat: int) -> list[float]:
+    out = []
+    for _ in range(repeat):
+        eng = _engine(path)
+        t0 = time.perf_counter()
+        fn(eng)
+        out.append((time.perf_counter() - t0) * 1000)
+        eng.dispose()
+    return out
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        eng = _engine(path)
+        _populate(eng, args.messages, args.leaves)
+        t0 = time.perf_counter()
+        applied = migrations.upgrade(eng)
+        print(f"first upgrade (one-off, {len(applied)} steps incl. FTS backfill): {(time.perf_counter() - t0) * 1000:8.1f} ms")
+        eng.dispose()
+        for name, fn in (('previous on_startup', _legacy_startup), ('migrations.upgrade', migrations.upgrade)):
+            times = _time(path, fn, args.repeat)
+            print(f"{name:>20}: median {statistics.median(times):8.2f} ms  max {max(times):8.2f} ms  over {args.repeat} boots")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--messages', type=int, default=500_000)
+    ap.add_argument('--leaves', type=int, default=200_000)
+    ap.add_argument('--repeat', type=int, default=20)
+    main(ap.parse_args())
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+from app.static import AttachmentFiles
+
+# Attachment delivery: plain StaticFiles vs AttachmentFiles on the same set of image /
+# voice / video blobs. Each simulated user views a chat history several times with a
+# browser-like cache: fresh immutable entries are served from cache, stale ones are
+# revalidated with If-None-Match. Video views also scrub with Range requests.
+# Run from backend/:
+#   python -m bench.static_delivery --users 50 --views 5
+
+KINDS = (('jpg', 200_000), ('ogg', 600_000), ('mp4', 8_000_000))
+
+def _make_blobs(root: str, per_kind: int) -> list[str]:
+    rels = []
+    for ext, size in KINDS:
+        for _ in range(per_kind):
+            data = os.urandom(size)
+            sha = hashlib.sha256(data).hexdigest()
+            rel = f'cas/{sha[:2]}/{sha[2:4]}/{sha}.{ext}'
+            os.makedirs(os.path.join(root, os.path.dirname(rel)), exist_ok=True)
+            with open(os.path.join(root, rel), 'wb') as f:
+                f.write(data)
+            rels.append(rel)
+    return rels
+
+class BrowserCache:
+    def __init__(self):
+        self.entries: dict[str, tuple[str, bool]] = {}
+
+    def headers_for(self, url: str) -> tuple[bool, dict]:
+        # (serve from cache without a request, conditional headers)
+        entry = self.entries.get(url)
+        if entry is None:
+            return False, {}
+        etag, immutable = entry
+        if immutable:
+            return True, {}
+        return False, {'if-none-match': etag} if etag else {}
+
+    def store(self, url: str, response: httpx.Response):
+        etag = response.headers.get('etag')
+        immutable = 'immutable' in response.headers.get('cache-control', '')
+        if etag or immutable:
+            self.entries[url] = (etag, immutable)
+
+async def _run(app: FastAPI, rels: list[str], users: int, views: int, scrubs: int) -> dict:
+    stats = {'requests': 0, 'cache_hits': 0, 'not_modified': 0, 'partial': 0, 'bytes': 0, 'bytes_saved': 0}
+    sizes = {rel: os.path.getsize(os.path.join(app.state.root, rel)) for rel in rels}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def user(seed: int):
+            rng = random.Random(seed)
+            cache = BrowserCache()
+            for _ in range(views):
+                for rel in rels:
+                    url = f'/uploads/{rel}'
+                    cached, headers = cache.headers_for(url)
+                    if cached:
+                        stats['cache_hits'] += 1
+                        stats['bytes_saved'] += sizes[rel]
+                        continue
+                    r = await client.get(url, headers=headers)
+                    stats['requests'] += 1
+                    stats['bytes'] += len(r.content)
+                    if r.status_code == 304:
+                        stats['not_modified'] += 1
+                        stats['bytes_saved'] += sizes[rel]
+                    else:
+                        cache.store(url, r)
+                    if rel.endswith('.mp4'):
+                        # Seeking: the player asks for 512 KiB windows
+                        for _ in range(scrubs):
+                            start = rng.randrange(0, sizes[rel] - 524288)
+                            r = await client.get(url, headers={'range': f'bytes={start}-{start + 524287}'})
+                            stats['requests'] += 1
+                            stats['bytes'] += len(r.content)
+                            if r.status_code == 206:
+                                stats['partial'] += 1
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        stats['elapsed_s'] = time.perf_counter() - t0
+    stats['mb_per_s'] = stats['bytes'] / stats['elapsed_s'] / 1e6
+    return stats
+
+def _app(root: str, files_cls) -> FastAPI:
+    app = FastAPI()
+    app.state.root = root
+    app.mount('/uploads', files_cls(directory=root), name='uploads')
+    return app
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        rels = _make_blobs(root, args.per_kind)
+        for name, cls in (('static', StaticFiles), ('attachments', AttachmentFiles)):
+            res = await _run(_app(root, cls), rels, args.users, args.views, args.scrubs)
+            print(f"{name:>11}: {res['requests']:6d} requests  {res['bytes'] / 1e6:9.1f} MB sent  "
+                  f"{res['bytes_saved'] / 1e6:9.1f} MB saved  {res['cache_hits']:5d} cache hits  "
+                  f"{res['not_modified']:5d} 304  {res['partial']:5d} 206  "
+                  f"{res['elapsed_s']:6.2f} s  {res['mb_per_s']:7.1f} MB/s")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--users', type=int, default=50)
+    ap.add_argument('--views', type=int, default=5)
+    ap.add_argument('--per-kind', type=int, default=3)
+    ap.add_argument('--scrubs', type=int, default=2)
+    asyncio.run(main(ap.parse_args()))
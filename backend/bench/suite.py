@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from bench.datagen import DB_PATH
+from bench.scenarios import SCENARIOS, Context, Recorder
+
+# Benchmark suite for the API against SQLite. Fill the database first with
+# bench.datagen, then run scenarios against a real uvicorn server (its own process, one
+# fresh server per scenario so peak RSS is that scenario's). The database is snapshotted
+# before the first scenario and restored before each one, so scenarios that write do
+# not change what the next one reads. Results are JSON: per scenario p50/p95/p99 (overall
+# and per op), throughput and the server's peak RSS. Run from backend/:
+#   python -m bench.datagen --reset
+#   python -m bench.suite run --duration 10 --concurrency 16 --out before.json
+#   ...change something...
+#   python -m bench.suite run --duration 10 --concurrency 16 --out after.json
+#   python -m bench.suite compare before.json after.json --threshold 10
+# MYCAMPUS_* variables in the environment are passed to the server, so configurations
+# can be compared the same way.
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _percentile(ordered: list[float], p: float) -> float:
+    # Nearest rank on an already sorted list
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, math.ceil(p * len(ordered) / 100) - 1))
+    return ordered[k]
+
+def _latency(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(ordered),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    # High-water mark of the server process (Linux); None elsewhere
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+class Server:
+    def __init__(self, port: int):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 30.0):
+        env = {**os.environ, "PYTHONPATH": str(BACKEND)}
+        env.pop("MYCAMPUS_SEED", None)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND, env=env,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                urllib.request.urlopen(f"{self.url}/api/chatrooms", timeout=1).read()
+                return
+            except Exception:
+                time.sleep(0.1)
+        raise RuntimeError("server did not start")
+
+    def stop(self) -> Optional[float]:
+        rss = _peak_rss_mb(self.proc.pid)
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        return rss
+
+def _snapshot(dest: Path):
+    # Consistent copy even with a WAL file next to the database
+    src = sqlite3.connect(DB_PATH)
+    dst = sqlite3.connect(dest)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def _restore(snapshot: Path):
+    for suffix in ("-wal", "-shm"):
+        Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(snapshot, DB_PATH)
+
+def _dataset() -> dict:
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    try:
+        count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        rooms = conn.execute(
+            "SELECT c.id, COALESCE(rc.message_count, 0) FROM chat_rooms c "
+            "LEFT JOIN room_counters rc ON rc.room_id = c.id ORDER BY c.id"
+        ).fetchall()
+        users = conn.execute("SELECT COUNT(DISTINCT user_id) FROM room_members").fetchone()[0]
+        return {
+            "rooms": rooms,
+            "users": users,
+            "counts": {t: count(t) for t in ("chat_rooms", "messages", "leaves", "events", "timetable_cells")},
+        }
+    finally:
+        conn.close()
+
+async def _drive(scenario, concurrency: int, duration: float, warmup: float, seed: int) -> float:
+    rec = scenario.rec
+
+    async def worker(n: int, until: float):
+        rng = random.Random(seed * 1000 + n)
+        state: dict = {}
+        while time.perf_counter() < until:
+            await scenario.step(rng, state)
+            if rec.enabled:
+                rec.steps += 1
+
+    await scenario.setup()
+    try:
+        if warmup > 0:
+            rec.enabled = False
+            await asyncio.gather(*(worker(n, time.perf_counter() + warmup) for n in range(concurrency)))
+            rec.enabled = True
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(n, t0 + duration) for n in range(concurrency)))
+        return time.perf_counter() - t0
+    finally:
+        await scenario.teardown()
+
+def run_scenario(name: str, args) -> dict:
+    server = Server(_free_port())
+    server.start()
+    try:
+        data = _dataset()
+        ctx = Context(server.url, [tuple(r) for r in data["rooms"]], data["users"], args.pages,
+                      args.ws_subscribers, args.ws_rooms)
+        rec = Recorder()
+        scenario = SCENARIOS[name](ctx, rec, args.concurrency)
+        elapsed = asyncio.run(_drive(scenario, args.concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        rss = server.stop()
+    samples = [s for op in rec.samples.values() for s in op]
+    return {
+        "duration_s": round(elapsed, 3),
+        "concurrency": args.concurrency,
+        "steps": rec.steps,
+        "steps_per_s": round(rec.steps / elapsed, 2),
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "errors": sum(rec.errors.values()),
+        "latency": _latency(samples),
+        "ops": {op: {**_latency(s), "errors": rec.errors.get(op, 0)} for op, s in sorted(rec.samples.items())},
+        "server_peak_rss_mb": rss,
+        **scenario.extra(),
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(args) -> dict:
+    if not DB_PATH.exists():
+        raise SystemExit(f"{DB_PATH} does not exist; run python -m bench.datagen --reset first")
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "settings": {k: v for k, v in sorted(os.environ.items()) if k.startswith("MYCAMPUS_")},
+            "args": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+            "dataset": _dataset()["counts"],
+        },
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(tmp) / "snapshot.db"
+        _snapshot(snapshot)
+        for name in names:
+            _restore(snapshot)
+            report["scenarios"][name] = run_scenario(name, args)
+            res = report["scenarios"][name]
+            print(f"{name:>12}: {res['throughput_rps']:9.1f} req/s  p50 {res['latency']['p50_ms']:8.2f} ms  "
+                  f"p95 {res['latency']['p95_ms']:8.2f} ms  p99 {res['latency']['p99_ms']:8.2f} ms  "
+                  f"errors {res['errors']}  rss {res['server_peak_rss_mb']} MB", file=sys.stderr)
+        _restore(snapshot)
+    report["meta"]["client_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+def compare(base: dict, new: dict, threshold: float) -> tuple[list[str], bool]:
+    # Regression: p95 up or throughput down by more than `threshold` percent
+    lines = [f"{'scenario':>12}  {'metric':<16} {'base':>10} {'new':>10} {'change':>8}"]
+    regressed = False
+    for name, b in base["scenarios"].items():
+        n = new["scenarios"].get(name)
+        if n is None:
+            continue
+        for label, bv, nv, higher_is_worse in (
+            ("p50_ms", b["latency"]["p50_ms"], n["latency"]["p50_ms"], True),
+            ("p95_ms", b["latency"]["p95_ms"], n["latency"]["p95_ms"], True),
+            ("p99_ms", b["latency"]["p99_ms"], n["latency"]["p99_ms"], True),
+            ("throughput_rps", b["throughput_rps"], n["throughput_rps"], False),
+            ("peak_rss_mb", b["server_peak_rss_mb"], n["server_peak_rss_mb"], True),
+        ):
+            if bv is None or nv is None:
+                continue
+            change = (nv - bv) / bv * 100 if bv else 0.0
+            flag = ""
+            if label in ("p95_ms", "throughput_rps") and (change if higher_is_worse else -change) > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            lines.append(f"{name:>12}  {label:<16} {bv:>10.2f} {nv:>10.2f} {change:>+7.1f}%{flag}")
+    return lines, regressed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MyCampus API benchmark suite")
+    sub = ap.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="run scenarios against a fresh server")
+    r.add_argument("--scenarios", default="all", help=f"comma-separated: {', '.join(SCENARIOS)} (default all)")
+    r.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    r.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--pages", type=int, default=5, help="history pages per room visit")
+    r.add_argument("--ws-subscribers", type=int, default=200)
+    r.add_argument("--ws-rooms", type=int, default=4)
+    r.add_argument("--seed", type=int, default=1)
+    r.add_argument("--out", help="write the JSON report here instead of stdout")
+    c = sub.add_parser("compare", help="compare two reports")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = ap.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        lines, regressed = compare(base, new, args.threshold)
+        print("\n".join(lines))
+        sys.exit(1 if regressed else 0)
+
+    report = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
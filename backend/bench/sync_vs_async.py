@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+import anyio
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, get_db
+from app.main import app as async_app
+from app.models import ChatRoom as ChatRoomModel, Message as MessageModel
+from app.routers import chat
+
+# Same mix of chat requests against the async routers and against the previous sync
+# handlers (threadpool + anyio.from_thread.run for the broadcast), at equal concurrency.
+# Run from backend/:
+#   python -m bench.sync_vs_async --concurrency 200 --requests 4000
+
+sync_app = FastAPI()
+
+@sync_app.get('/api/messages/{room_id}')
+def sync_list_messages(room_id: int, limit: int = 50, db: Session = Depends(get_db)):
+    return (db.query(MessageModel)
+            .filter(MessageModel.room_id == room_id, MessageModel.deleted == 0)
+            .order_by(MessageModel.id.desc()).limit(limit).all())
+
+@sync_app.post('/api/messages/{room_id}')
+def sync_send_message(room_id: int, payload: chat.SendMessage, db: Session = Depends(get_db)):
+    row = MessageModel(room_id=room_id, sender_id=payload.sender_id, sender_name=payload.sender_name,
+                       type='text', content=payload.content,
+                       timestamp=datetime.utcnow().isoformat(timespec='seconds') + 'Z')
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    data = {'id': row.id, 'room_id': room_id, 'content': row.content}
+    async def _notify():
+        await chat.manager.broadcast(room_id, {'type': 'message:new', 'data': data})
+    anyio.from_thread.run(_notify)
+    return data
+
+def _bench_room() -> int:
+    db = SessionLocal()
+    try:
+        room = db.query(ChatRoomModel).filter(ChatRoomModel.name == 'bench-sync-async').first()
+        if not room:
+            room = ChatRoomModel(name='bench-sync-async', type='group')
+            db.add(room)
+            db.commit()
+        return room.id
+    finally:
+        db.close()
+
+async def _run(app: FastAPI, room_id: int, concurrency: int, total: int, write_ratio: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+    writes_every = max(1, round(1 / write_ratio)) if write_ratio > 0 else 0
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                t0 = time.perf_counter()
+                if writes_every and i % writes_every == 0:
+                    r = await client.post(f'/api/messages/{room_id}', json={'sender_id': 'bench', 'sender_name': 'bench', 'content': f'msg {i}'})
+                else:
+                    r = await client.get(f'/api/messages/{room_id}', params={'limit': 50})
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code != 200:
+                    errors += 1
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100)
+    return {'rps': total / elapsed, 'p50_ms': q[49] * 1000, 'p95_ms': q[94] * 1000, 'p99_ms': q[98] * 1000, 'errors': errors}
+
+async def main(args):
+    # Startup hooks (schema, broker) come from the real app
+    async with async_app.router.lifespan_context(async_app):
+        room_id = _bench_room()
+        for name, app in (('sync', sync_app), ('async', async_app)):
+            res = await _run(app, room_id, args.concurrency, args.requests, args.write_ratio)
+            print(f"{name:>5}: {res['rps']:8.0f} req/s  p50 {res['p50_ms']:7.1f} ms  "
+                  f"p95 {res['p95_ms']:7.1f} ms  p99 {res['p99_ms']:7.1f} ms  errors {res['errors']}")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--concurrency', type=int, default=200)
+    ap.add_argument('--requests', type=int, default=4000)
+    ap.add_argument('--write-ratio', type=float, default=0.1)
+    asyncio.run(main(ap.parse_args()))
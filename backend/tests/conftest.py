@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The suite runs against a scratch database and uploads directory (app/database.db and
+# app/uploads are not touched), with the opt-in features at their defaults and no
+# background GC. Run from backend/:
+#   pip install -r requirements.txt -r tests/requirements.txt
+#   python -m pytest -q
+# The app is shared by the whole session, so tests make their own rooms, events and
+# users instead of expecting empty tables.
+
+_SCRATCH = tempfile.mkdtemp(prefix="mycampus-tests-")
+os.environ.update({
+    "MYCAMPUS_DB_PATH": os.path.join(_SCRATCH, "test.db"),
+    "MYCAMPUS_UPLOADS_DIR": os.path.join(_SCRATCH, "uploads"),
+    "MYCAMPUS_BROKER": "memory",
+    "MYCAMPUS_SEED": "0",
+    "MYCAMPUS_GROUP_COMMIT": "0",
+    "MYCAMPUS_RESPONSE_CACHE": "0",
+    "MYCAMPUS_FAST_JSON": "0",
+    "MYCAMPUS_SQL_PROFILE": "0",
+    "MYCAMPUS_BLOB_GC_INTERVAL": "0",
+})
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+_rooms = 0
+
+@pytest.fixture
+def room(client) -> int:
+    # A new group room per test
+    global _rooms
+    _rooms += 1
+    r = client.post("/api/chatrooms", json={"name": f"test-room-{_rooms}", "type": "group"})
+    r.raise_for_status()
+    return r.json()["id"]
+
+@pytest.fixture
+def send(client):
+    # send(room_id, content, sender="u1", **extra) -> the stored message
+    def _send(room_id: int, content: str, sender: str = "u1", **extra) -> dict:
+        r = client.post(f"/api/messages/{room_id}", json={
+            "sender_id": sender, "sender_name": sender.upper(), "content": content, **extra,
+        })
+        r.raise_for_status()
+        return r.json()
+    return _send
+
+_sections = 0
+
+@pytest.fixture
+def timetable(client) -> dict:
+    # A new section with a two-day week, imported through the bulk endpoint
+    global _sections
+    _sections += 1
+    week = {
+        "Monday": [{"subjectId": "1", "faculty": "Dr. A"}, "Break", {"subjectId": "2", "faculty": "Dr. B"}],
+        "Tuesday": [{"subjectId": "2", "faculty": "Dr. B"}],
+    }
+    section = f"TEST-{_sections}"
+    r = client.post("/api/import/timetables?format=ndjson", content=json.dumps({"section": section, "data": week}) + "\n")
+    assert r.json()["inserted"] == 1, r.text
+    return client.get("/api/timetables", params={"section": section}).json()
@@ -0,0 +1,35 @@
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.routing import APIRoute
+
+from app.db import get_async_db, get_db
+from app.main import app
+
+ASYNC_ROUTERS = {"announcements", "chat", "events", "leaves", "subjects", "timetable"}
+
+def _routes():
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.endpoint.__module__.rsplit(".", 1)[-1] in ASYNC_ROUTERS:
+            yield route
+
+def _dependencies(dependant):
+    for dep in dependant.dependencies:
+        yield dep.call
+        yield from _dependencies(dep)
+
+def test_router_handlers_run_on_the_event_loop_with_async_sessions():
+    routes = list(_routes())
+    assert routes
+    for route in routes:
+        assert inspect.iscoroutinefunction(route.endpoint), route.path
+        assert get_db not in set(_dependencies(route.dependant)), route.path
+    assert any(get_async_db in set(_dependencies(r.dependant)) for r in routes)
+
+def test_concurrent_sends_all_land(client, room, send):
+    with ThreadPoolExecutor(8) as pool:
+        sent = list(pool.map(lambda n: send(room, f"m{n}"), range(40)))
+    assert len({m["id"] for m in sent}) == 40
+    history = client.get(f"/api/messages/{room}", params={"limit": 100}).json()
+    assert sorted(m["id"] for m in history) == sorted(m["id"] for m in sent)
+    assert sorted(m["content"] for m in history) == sorted(f"m{n}" for n in range(40))
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from bench.datagen import generate
+from bench.suite import _latency, _percentile, compare
+
+# The generator and the report maths; driving scenarios needs a live server (bench.suite run)
+
+SMALL = dict(rooms=4, messages=300, users=30, leaves=120, events=40, timetables=2)
+
+def _dump(path) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return [conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+                for table in ("messages", "leaves", "events", "timetable_cells")]
+    finally:
+        conn.close()
+
+def test_same_seed_same_data(tmp_path):
+    a, b = tmp_path / "a.db", tmp_path / "b.db"
+    report = generate(**SMALL, seed=7, path=a)
+    generate(**SMALL, seed=7, path=b)
+    assert (report["messages"], report["leaves"], report["events"]) == (300, 120, 40)
+    # Timestamps of read states differ; the data the scenarios read does not
+    assert _dump(a) == _dump(b)
+    generate(**SMALL, seed=8, path=b, reset=True)
+    assert _dump(a) != _dump(b)
+
+def test_derived_tables_match_what_the_api_keeps(tmp_path):
+    path = tmp_path / "d.db"
+    generate(**SMALL, path=path)
+    conn = sqlite3.connect(path)
+    try:
+        counted = conn.execute(
+            "SELECT room_id, count(*), max(id), max(seq) FROM messages GROUP BY room_id ORDER BY 1").fetchall()
+        kept = conn.execute(
+            "SELECT room_id, message_count, last_message_id, event_seq FROM room_counters WHERE message_count > 0 ORDER BY 1"
+        ).fetchall()
+        assert counted == kept
+        by_status = conn.execute("SELECT status, count(*) FROM leaves GROUP BY status ORDER BY 1").fetchall()
+        assert by_status == conn.execute(
+            "SELECT status, count FROM leave_counters WHERE dimension = 'all' ORDER BY 1").fetchall()
+        assert conn.execute("SELECT count(*) FROM messages_fts WHERE messages_fts MATCH 'exam'").fetchone()[0] > 0
+    finally:
+        conn.close()
+
+def test_refuses_to_add_to_a_chat_database(tmp_path):
+    path = tmp_path / "r.db"
+    generate(**SMALL, path=path)
+    with pytest.raises(SystemExit):
+        generate(**SMALL, path=path)
+
+def test_percentiles_are_nearest_rank():
+    samples = [n / 1000 for n in range(1, 101)]  # 1..100 ms
+    assert [_percentile(samples, p) for p in (50, 95, 99)] == [0.05, 0.095, 0.099]
+    stats = _latency(list(reversed(samples)))
+    assert (stats["count"], stats["p50_ms"], stats["p99_ms"], stats["max_ms"]) == (100, 50.0, 99.0, 100.0)
+    assert _latency([])["p95_ms"] == 0.0
+
+def _run(p95: float, rps: float) -> dict:
+    latency = {"p50_ms": 1.0, "p95_ms": p95, "p99_ms": p95 * 2}
+    return {"scenarios": {"history": {"latency": latency, "throughput_rps": rps, "server_peak_rss_mb": 80.0}}}
+
+def test_compare_flags_p95_and_throughput_regressions():
+    _, regressed = compare(_run(10.0, 1000.0), _run(10.5, 980.0), threshold=10)
+    assert not regressed
+    lines, regressed = compare(_run(10.0, 1000.0), _run(12.0, 1000.0), threshold=10)
+    assert regressed and any("p95_ms" in line and "REGRESSION" in line for line in lines)
+    _, regressed = compare(_run(10.0, 1000.0), _run(10.0, 800.0), threshold=10)
+    assert regressed
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+
+from app import attachments
+from app.db import engine
+
+# collect_garbage(grace=-60) treats every unreferenced blob as past its grace period
+
+def _upload(client, data: bytes, name="file.bin") -> dict:
+    r = client.post("/api/uploads", files={"file": (name, data, "application/octet-stream")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def _row(sha: str):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(
+            "SELECT path, ref_count FROM attachment_blobs WHERE sha256 = ?", (sha,)
+        ).first()
+
+def _on_disk(stored_as: str) -> bool:
+    return os.path.exists(os.path.join(attachments.UPLOADS_DIR, stored_as))
+
+def test_same_content_is_stored_once(client):
+    data = os.urandom(2048)
+    first, second = _upload(client, data, "a.bin"), _upload(client, data, "b.bin")
+    assert first["url"] == second["url"]
+    assert first["filename"] == "a.bin" and second["filename"] == "b.bin"
+    shard = attachments.blob_dir(first["sha256"])
+    assert [n for n in os.listdir(shard) if n.startswith(first["sha256"])] == [first["sha256"] + ".bin"]
+    assert _row(first["sha256"]) == (first["stored_as"], 0)
+
+def test_gc_keeps_referenced_blobs_and_removes_the_rest(client, room, send):
+    kept, dropped = _upload(client, os.urandom(1024)), _upload(client, os.urandom(1024))
+    msg = send(room, "see attached", meta={"attachment": {"url": kept["url"], "sha256": kept["sha256"]}})
+    assert _row(kept["sha256"])[1] == 1
+    attachments.collect_garbage(grace=-60)
+    assert _on_disk(kept["stored_as"]) and _row(kept["sha256"]) is not None
+    assert not _on_disk(dropped["stored_as"]) and _row(dropped["sha256"]) is None
+    assert client.get(dropped["url"]).status_code == 404
+    client.delete(f"/api/messages/{msg['id']}").raise_for_status()
+    assert _row(kept["sha256"])[1] == 0
+    attachments.collect_garbage(grace=-60)
+    assert not _on_disk(kept["stored_as"])
+
+def test_recent_uploads_wait_out_the_grace_period(client):
+    blob = _upload(client, os.urandom(512))
+    attachments.collect_garbage(grace=3600)
+    assert _on_disk(blob["stored_as"])
+
+def test_reupload_after_gc_stores_the_content_again(client):
+    data = os.urandom(1024)
+    blob = _upload(client, data)
+    attachments.collect_garbage(grace=-60)
+    assert _row(blob["sha256"]) is None
+    again = _upload(client, data)
+    assert again["url"] == blob["url"]
+    assert client.get(again["url"]).content == data
+    assert _row(blob["sha256"]) is not None
+
+def test_rows_and_files_agree_while_gc_races_uploads(client):
+    data = os.urandom(1024)
+    sha = hashlib.sha256(data).hexdigest()
+    stop = threading.Event()
+
+    def collect():
+        while not stop.is_set():
+            attachments.collect_garbage(grace=-60)
+    gc = threading.Thread(target=collect)
+    gc.start()
+    try:
+        for _ in range(30):
+            _upload(client, data)
+    finally:
+        stop.set()
+        gc.join()
+    # Whatever the interleaving: a registered blob has its file and vice versa
+    row = _row(sha)
+    assert (row is not None) == (attachments.find_blob(sha) is not None)
+
+def test_a_known_hash_does_not_skip_the_upload(client):
+    data = os.urandom(1024)
+    blob = _upload(client, data)
+    r = client.post("/api/uploads/sessions", json={"filename": "copy.bin", "size": len(data), "sha256": blob["sha256"]})
+    assert r.status_code == 200
+    session = r.json()
+    assert session["upload_id"] and session["offset"] == 0 and "complete" not in session
+    upload_id = session["upload_id"]
+    # The declared hash is checked against the bytes that arrive
+    client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=os.urandom(1024)).raise_for_status()
+    assert client.post(f"/api/uploads/sessions/{upload_id}/finalize").status_code == 422
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.broker import SQLiteLogBroker
+
+# Two brokers on one log file stand in for two uvicorn workers
+
+async def _pair(path, deliver_a, deliver_b):
+    a = SQLiteLogBroker(path, poll_interval=0.005)
+    b = SQLiteLogBroker(path, poll_interval=0.005)
+    await a.start(deliver_a)
+    await b.start(deliver_b)
+    return a, b
+
+async def _until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_events_reach_the_other_worker_once(tmp_path):
+    async def run():
+        got_a, got_b = [], []
+
+        async def deliver_a(room_id, event):
+            got_a.append((room_id, event["n"]))
+
+        async def deliver_b(room_id, event):
+            got_b.append((room_id, event["n"]))
+
+        a, b = await _pair(str(tmp_path / "broker.db"), deliver_a, deliver_b)
+        try:
+            for n in range(3):
+                await a.publish(7, {"n": n})
+            await _until(lambda: len(got_b) == 3)
+            await asyncio.sleep(0.05)
+        finally:
+            await a.stop()
+            await b.stop()
+        # Delivered locally at publish time, not again from the log
+        assert got_a == [(7, 0), (7, 1), (7, 2)]
+        assert got_b == [(7, 0), (7, 1), (7, 2)]
+    asyncio.run(run())
+
+def test_a_failed_delivery_does_not_drop_the_rest_of_the_batch(tmp_path):
+    async def run():
+        got = []
+
+        async def deliver_a(room_id, event):
+            pass
+
+        async def deliver_b(room_id, event):
+            if event["n"] == 1:
+                raise RuntimeError("socket went away")
+            got.append(event["n"])
+
+        a, b = await _pair(str(tmp_path / "broker.db"), deliver_a, deliver_b)
+        try:
+            # Written while b is not polling, so b reads all of them in one batch
+            b._task.cancel()
+            for n in range(5):
+                await a.publish(1, {"n": n})
+            b._task = asyncio.create_task(b._poll_loop())
+            await _until(lambda: len(got) == 4)
+            await asyncio.sleep(0.05)
+        finally:
+            await a.stop()
+            await b.stop()
+        assert got == [0, 2, 3, 4]
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app import cache as cache_module
+from app.cache import ResponseCache, cache
+
+# The suite runs with the cache off (the default); these tests turn it on for themselves
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(cache, "enabled", True)
+    return cache
+
+def _subject(client, subject_id: int, chapters: str = "1-2"):
+    line = json.dumps({"id": subject_id, "name": f"S{subject_id}", "faculty": "Dr. C",
+                       "ongoingChapters": chapters, "type": "Theory"})
+    client.post("/api/import/subjects?format=ndjson", content=line + "\n").raise_for_status()
+
+def test_off_by_default_and_for_several_workers(client, monkeypatch):
+    assert "etag" not in client.get("/api/subjects").headers
+    monkeypatch.setenv("MYCAMPUS_RESPONSE_CACHE", "1")
+    assert cache_module._enabled_from_env()
+    monkeypatch.setenv("MYCAMPUS_BROKER", "sqlite")
+    assert not cache_module._enabled_from_env()
+
+def test_hits_and_not_modified(client, cached):
+    _subject(client, 9001)
+    first = client.get("/api/subjects")
+    etag = first.headers["etag"]
+    hits = cached.stats["hits"]
+    second = client.get("/api/subjects")
+    assert second.content == first.content and second.headers["etag"] == etag
+    assert cached.stats["hits"] == hits + 1
+    r = client.get("/api/subjects", headers={"if-none-match": f"W/{etag}"})
+    assert r.status_code == 304 and r.content == b""
+
+def test_writes_bump_the_version(client, cached):
+    _subject(client, 9002)
+    etag = client.get("/api/subjects").headers["etag"]
+    client.put("/api/subjects/9002/ongoing", json={"ongoingChapters": "5-6"}).raise_for_status()
+    r = client.get("/api/subjects", headers={"if-none-match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert next(s for s in r.json() if s["id"] == 9002)["ongoingChapters"] == "5-6"
+
+def test_timetable_patch_invalidates_its_section(client, cached, timetable):
+    params = {"section": timetable["section"]}
+    etag = client.get("/api/timetables", params=params).headers["etag"]
+    client.patch(f"/api/timetables/{timetable['id']}/cell",
+                 json={"day": "Monday", "periodIndex": 0, "subjectId": "7", "faculty": "Dr. Z"}).raise_for_status()
+    r = client.get("/api/timetables", params=params, headers={"if-none-match": etag})
+    assert r.status_code == 200
+    assert r.json()["data"]["Monday"][0] == {"subjectId": "7", "faculty": "Dr. Z"}
+
+def test_least_recently_used_bodies_are_dropped():
+    small = ResponseCache(enabled=True, max_entries=2)
+    request = Request({"type": "http", "method": "GET", "headers": [], "query_string": b""})
+    loads = []
+
+    def loader(key):
+        async def load():
+            loads.append(key)
+            return key.encode()
+        return load
+
+    async def run():
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            await small.respond(request, "r", key, loader(key))
+    asyncio.run(run())
+    # "b" was evicted by "c" while "a" stayed warm
+    assert loads == ["a", "b", "c", "b"]
+    assert list(k for _, k in small.entries) == ["a", "b"]
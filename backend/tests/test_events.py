@@ -0,0 +1,88 @@
+import itertools
+from datetime import date
+
+from sqlalchemy import select
+
+from app.db import engine
+from app.ics import feed
+from app.models import Event as EventModel
+from app.routers.events import _overlapping
+
+# Events live in a far-off year per test so the shared table does not get in the way;
+# the API stores the id the client sends
+_ids = itertools.count(910_000)
+
+def _event(client, title, start, end=None, **extra):
+    r = client.post("/api/events", json={"id": next(_ids), "title": title, "type": "Exam", "start": start, "end": end, **extra})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def _titles(client, **params):
+    return sorted(e["title"] for e in client.get("/api/events", params=params).json())
+
+def test_range_returns_overlapping_events(client):
+    _event(client, "long", "2091-01-01", "2091-06-30")
+    _event(client, "march", "2091-03-10")
+    _event(client, "spans-april", "2091-03-25", "2091-04-05")
+    _event(client, "may", "2091-05-01", "2091-05-02")
+    assert _titles(client, from_="2091-04-01", to="2091-04-30") == ["long", "spans-april"]
+    assert _titles(client, from_="2091-03-10", to="2091-03-10") == ["long", "march"]
+    assert _titles(client, from_="2091-07-01", to="2091-07-31") == []
+
+def test_range_query_is_bounded_on_both_sides_of_the_index():
+    q = _overlapping(select(EventModel.id), date(2025, 1, 1), date(2025, 1, 31))
+    sql = str(q.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+    assert "SEARCH events USING COVERING INDEX ix_events_start_end (start>? AND start<?)" in plan
+    # The longest span is one seek on the expression index, not a scan
+    assert any(p.startswith("SEARCH events USING INDEX ix_events_span") for p in plan), plan
+
+def test_end_before_start_is_rejected(client):
+    r = client.post("/api/events", json={"id": next(_ids), "title": "x", "type": "Exam", "start": "2092-02-02", "end": "2092-02-01"})
+    assert r.status_code == 422
+
+def test_calendar_counts_every_day(client):
+    _event(client, "a", "2093-02-27", "2093-03-02")
+    _event(client, "b", "2093-03-02")
+    days = client.get("/api/events/calendar", params={"month": "2093-03"}).json()["days"]
+    assert len(days) == 31
+    assert (days["2093-03-01"], days["2093-03-02"], days["2093-03-03"]) == (1, 2, 0)
+    week = client.get("/api/events/calendar", params={"week": "2093-03-04"}).json()
+    assert (week["start"], week["end"]) == ("2093-03-02", "2093-03-08")
+    assert client.get("/api/events/calendar").status_code == 400
+
+def _ics(client) -> str:
+    r = client.get("/api/events.ics")
+    assert r.headers["content-type"].startswith("text/calendar")
+    return r.text
+
+def test_ics_feed_rerenders_only_what_changed(client):
+    # The response cache is off in the suite: incremental builds must not depend on it
+    event = _event(client, "Feed exam", "2094-01-10", "2094-01-11", description="Hall 1; bring ID")
+    body = _ics(client)
+    assert f"UID:event-{event['id']}@mycampus" in body
+    assert "DTSTART;VALUE=DATE:20940110\r\nDTEND;VALUE=DATE:20940112" in body
+    assert "DESCRIPTION:Hall 1\\; bring ID" in body
+    rendered = feed.stats["events_rendered"]
+    assert _ics(client) == body
+    assert feed.stats["events_rendered"] == rendered
+    client.put(f"/api/events/{event['id']}", json={**event, "title": "Feed exam (moved)"}).raise_for_status()
+    assert "SUMMARY:Feed exam (moved)" in _ics(client)
+    assert feed.stats["events_rendered"] == rendered + 1
+    client.delete(f"/api/events/{event['id']}").raise_for_status()
+    assert f"UID:event-{event['id']}@mycampus" not in _ics(client)
+
+def test_ics_feed_sees_writes_from_elsewhere(client):
+    _ics(client)
+    builds = feed.stats["full_builds"]
+    # Another worker's write, or a bulk import: nothing in this process is told about it
+    with engine.begin() as conn:
+        event_id = conn.exec_driver_sql(
+            "INSERT INTO events (title, type, start) VALUES ('Other worker', 'Fest', '2094-05-05')"
+        ).lastrowid
+    assert f"UID:event-{event_id}@mycampus" in _ics(client)
+    client.post("/api/import/events?format=ndjson",
+                content='{"title": "Imported", "type": "Fest", "start": "2094-06-06"}\n').raise_for_status()
+    assert "SUMMARY:Imported" in _ics(client)
+    assert feed.stats["full_builds"] == builds
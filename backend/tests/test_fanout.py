@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from app.realtime import RESYNC_FRAME, ConnectionManager
+
+class FakeSocket:
+    # Records what is sent; a "stuck" socket never finishes its first send
+    def __init__(self, stuck: bool = False):
+        self.sent: list[str] = []
+        self.closed_with = None
+        self.stuck = stuck
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        if self.stuck:
+            await asyncio.Event().wait()
+        self.sent.append(frame)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+async def _flood(policy: str, frames: int = 5):
+    manager = ConnectionManager(queue_size=2, slow_policy=policy)
+    slow, fast = FakeSocket(stuck=True), FakeSocket()
+    slow_conn = await manager.connect(slow, [1])
+    await manager.connect(fast, [1])
+    for n in range(frames):
+        await manager.deliver(1, {"type": "message", "n": n})
+        # Let the writers pick up what they can
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    return manager, slow, slow_conn, fast
+
+def _ns(frames) -> list[int]:
+    return [json.loads(f)["n"] for f in frames]
+
+def test_one_encoding_is_shared_by_every_recipient():
+    async def run():
+        manager = ConnectionManager(queue_size=8, slow_policy="disconnect")
+        conns = [await manager.connect(FakeSocket(stuck=True), [3]) for _ in range(3)]
+        await asyncio.sleep(0)
+        await manager.deliver(3, {"type": "message", "content": "hi"})
+        frames = [c.queue.get_nowait() for c in conns]
+        assert json.loads(frames[0]) == {"type": "message", "content": "hi", "room_id": 3}
+        assert all(f is frames[0] for f in frames)
+        assert manager.stats["broadcasts"] == 1
+    asyncio.run(run())
+
+@pytest.mark.parametrize("policy", ["disconnect", "drop_oldest", "resync"])
+def test_a_slow_client_does_not_hold_up_the_others(policy):
+    async def run():
+        manager, _, _, fast = await _flood(policy, frames=10)
+        assert _ns(fast.sent) == list(range(10))
+        assert manager.stats["frames_dropped"] > 0
+    asyncio.run(run())
+
+def test_drop_oldest_keeps_the_newest_frames():
+    async def run():
+        manager, _, slow_conn, _ = await _flood("drop_oldest")
+        # Frame 0 is stuck in send_text; 1 and 2 made room for 3 and 4
+        assert _ns(slow_conn.queue._queue) == [3, 4]
+        assert manager.stats["frames_dropped"] == 2
+        assert not slow_conn.closed
+    asyncio.run(run())
+
+def test_resync_replaces_the_backlog():
+    async def run():
+        manager, _, slow_conn, _ = await _flood("resync")
+        assert list(slow_conn.queue._queue)[0] == RESYNC_FRAME
+        assert manager.stats["resyncs"] >= 1
+        assert not slow_conn.closed
+    asyncio.run(run())
+
+def test_disconnect_closes_the_slow_client():
+    async def run():
+        manager, slow, slow_conn, _ = await _flood("disconnect")
+        assert slow_conn.closed
+        assert slow not in manager.connections
+        assert slow.closed_with == 1013
+        assert manager.stats["slow_disconnects"] == 1
+        assert len(manager.rooms[1]) == 1
+    asyncio.run(run())
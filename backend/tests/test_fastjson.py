@@ -0,0 +1,64 @@
+import itertools
+
+import pytest
+
+from app import fastjson
+from app.db import engine
+
+# The fast path must send exactly what the normal path sends; each test fetches the same
+# URL both ways
+
+_ids = itertools.count(940_000)
+
+def _both(client, monkeypatch, url: str, **params):
+    responses = []
+    for enabled in (False, True):
+        monkeypatch.setattr(fastjson, "enabled", enabled)
+        r = client.get(url, params=params)
+        assert r.status_code == 200, r.text
+        responses.append(r)
+    normal, fast = responses
+    assert fast.content == normal.content
+    assert dict(fast.headers) == dict(normal.headers)
+    return normal
+
+def test_messages(client, monkeypatch, room, send):
+    send(room, 'plain')
+    send(room, 'ünïcödé "quoted" \\ back\nslash ✓', client_id="fast-1")
+    send(room, "third")
+    r = _both(client, monkeypatch, f"/api/messages/{room}")
+    assert [m["content"] for m in r.json()][0] == "plain"
+    assert "✓".encode() in r.content  # UTF-8 as is, not \u escapes
+    page = _both(client, monkeypatch, f"/api/messages/{room}", before_id=2 ** 62, limit=2)
+    assert page.headers["x-prev-cursor"]
+    _both(client, monkeypatch, f"/api/messages/{room}", cursor=page.headers["x-prev-cursor"])
+
+def test_leaves(client, monkeypatch):
+    dept = f"FAST-{next(_ids)}"
+    for status in ("Pending", "Approved", "Pending"):
+        client.post("/api/leaves", json={
+            "id": next(_ids), "studentName": "Zoë", "studentId": "S1", "department": dept, "mentorName": "Dr. M",
+            "parentPhone": "0", "leaveType": "Medical", "fromDate": "2025-01-01", "toDate": "2025-01-02",
+            "totalDays": 2, "reason": "fever", "status": status,
+        }).raise_for_status()
+    r = _both(client, monkeypatch, "/api/leaves", department=dept, limit=1)
+    assert r.headers["x-next-cursor"]
+    _both(client, monkeypatch, "/api/leaves", board=True, department=dept)
+
+def test_events_and_announcements(client, monkeypatch):
+    client.post("/api/events", json={"id": next(_ids), "title": "Fête", "type": "Fest", "start": "2096-01-01",
+                                     "end": "2096-01-03", "description": None}).raise_for_status()
+    r = _both(client, monkeypatch, "/api/events", from_="2096-01-01", to="2096-12-31")
+    assert r.json()[0]["start"] == "2096-01-01" and r.json()[0]["description"] is None
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO announcements (title, content, date, "postedBy") VALUES (?, ?, ?, ?)',
+            ("Notice ✓", "Line one\nline two", "2096-02-02", "Office"),
+        )
+    r = _both(client, monkeypatch, "/api/announcements")
+    assert r.json()[0]["date"] == "2096-02-02"
+
+@pytest.mark.parametrize("path", ["/api/messages/{room_id}", "/api/leaves", "/api/events", "/api/announcements"])
+def test_schema_keeps_the_response_model(client, path):
+    schema = client.get("/openapi.json").json()["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["type"] == "array" and "$ref" in schema["items"]
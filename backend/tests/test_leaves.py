@@ -0,0 +1,88 @@
+import itertools
+import json
+
+from sqlalchemy import select
+
+from app.db import engine
+from app.models import Leave as LeaveModel
+
+# Each test works in its own department; the API stores the id the client sends
+_ids = itertools.count(920_000)
+_departments = itertools.count(1)
+
+def _department() -> str:
+    return f"DEPT-{next(_departments)}"
+
+def _leave(department: str, status: str = "Pending", mentor: str = "Dr. M", leave_type: str = "Medical") -> dict:
+    return {
+        "id": next(_ids), "studentName": "Student", "studentId": "S1", "department": department,
+        "mentorName": mentor, "parentPhone": "000", "leaveType": leave_type, "fromDate": "2025-01-01",
+        "toDate": "2025-01-02", "totalDays": 2, "reason": "r", "status": status,
+    }
+
+def _create(client, *args, **kwargs) -> dict:
+    r = client.post("/api/leaves", json=_leave(*args, **kwargs))
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def test_cursor_pages_newest_first(client):
+    dept = _department()
+    ids = [_create(client, dept)["id"] for _ in range(5)]
+    seen, cursor = [], None
+    while True:
+        params = {"department": dept, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/api/leaves", params=params)
+        seen += [leave["id"] for leave in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+    assert client.get("/api/leaves", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_board_pages_the_pending_queue(client):
+    dept = _department()
+    pending = _create(client, dept)
+    _create(client, dept, status="Approved")
+    r = client.get("/api/leaves", params={"board": True, "department": dept})
+    assert [leave["id"] for leave in r.json()] == [pending["id"]]
+    assert "x-next-cursor" not in r.headers
+    # Without limit or board the whole filtered list comes back
+    assert len(client.get("/api/leaves", params={"department": dept}).json()) == 2
+
+def test_filters_use_their_index():
+    q = (select(LeaveModel).where(LeaveModel.department == "X", LeaveModel.status == "Pending")
+         .order_by(LeaveModel.id.desc()).limit(50))
+    sql = str(q.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = " ".join(row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+    assert "ix_leaves_department_status_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+def _counted(dept: str) -> dict:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT status, count(*) FROM leaves WHERE department = ? GROUP BY status", (dept,)
+        ).all()
+    return dict(rows)
+
+def test_stats_follow_creates_status_changes_and_imports(client):
+    dept = _department()
+    first = _create(client, dept, mentor="Dr. Stats", leave_type="Casual")
+    _create(client, dept, mentor="Dr. Stats")
+    client.patch(f"/api/leaves/{first['id']}/status", json={"status": "Approved"}).raise_for_status()
+    # Same status again is not counted twice
+    client.patch(f"/api/leaves/{first['id']}/status", json={"status": "Approved"}).raise_for_status()
+    lines = "".join(json.dumps(_leave(dept, status="Rejected")) + "\n" for _ in range(3))
+    client.post("/api/import/leaves?format=ndjson", content=lines).raise_for_status()
+
+    stats = client.get("/api/leaves/stats", params={"department": dept}).json()
+    assert stats["byStatus"] == {"Pending": 1, "Approved": 1, "Rejected": 3} == _counted(dept)
+    assert stats["total"] == 5
+    assert stats["byDepartment"] == {dept: stats["byStatus"]}
+    assert stats["byMentor"]["Dr. Stats"]["Approved"] >= 1
+    assert stats["byLeaveType"]["Casual"]["Approved"] >= 1
+
+    overall = client.get("/api/leaves/stats").json()
+    assert overall["total"] == sum(overall["byStatus"].values())
+    assert overall["byDepartment"][dept] == stats["byStatus"]
+    assert client.patch("/api/leaves/999999999/status", json={"status": "Approved"}).status_code == 404
@@ -0,0 +1,61 @@
+import re
+
+from app.metrics import Histogram, Metrics, metrics
+
+def _sample(text: str, name: str, **labels) -> float:
+    # Value of one series in the exposition text (labels must match exactly)
+    for line in text.splitlines():
+        m = re.fullmatch(r"([a-z_]+)(?:\{(.*)\})? (\S+)", line)
+        if m and m.group(1) == name and dict(re.findall(r'(\w+)="([^"]*)"', m.group(2) or "")) == labels:
+            return float(m.group(3))
+    raise AssertionError(f"no {name}{labels}")
+
+def test_requests_are_filed_under_their_route_template(client, room):
+    route = {"method": "GET", "route": "/api/messages/{room_id}"}
+    before = client.get("/metrics").text
+
+    def _before(name: str, **labels) -> float:
+        # Earlier tests may or may not have used the route already
+        try:
+            return _sample(before, name, **labels)
+        except AssertionError:
+            return 0
+    client.get(f"/api/messages/{room}")
+    client.get(f"/api/messages/{room}")
+    client.get("/api/no-such-thing")
+    text = client.get("/metrics").text
+    assert _sample(text, "mycampus_http_requests_total", status="200", **route) == \
+        _before("mycampus_http_requests_total", status="200", **route) + 2
+    assert _sample(text, "mycampus_http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert f"/api/messages/{room}\"" not in text
+    # Each request ran SQL, counted against it
+    assert _sample(text, "mycampus_http_request_db_queries_count", **route) == \
+        _before("mycampus_http_request_db_queries_count", **route) + 2
+    assert _sample(text, "mycampus_http_request_db_queries_sum", **route) >= \
+        _before("mycampus_http_request_db_queries_sum", **route) + 2
+    assert _sample(text, "mycampus_db_queries_total") >= _sample(text, "mycampus_http_request_db_queries_sum", **route)
+
+def test_websocket_gauges(client, room, send):
+    with client.websocket_connect(f"/api/ws?rooms={room}") as ws:
+        send(room, "counted")
+        ws.receive_json()
+        text = client.get("/metrics").text
+        assert _sample(text, "mycampus_ws_room_connections", room=str(room)) == 1
+        assert _sample(text, "mycampus_ws_connections") >= 1
+        assert _sample(text, "mycampus_ws_broadcast_duration_seconds_count") >= 1
+        assert _sample(text, "mycampus_ws_broadcasts_total") >= 1
+    assert f'room="{room}"' not in client.get("/metrics").text
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    h = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        h.observe(value)
+    text = "\n".join(Metrics._histogram("t", "test", [((), h)]))
+    assert _sample(text, "t_bucket", le="0.1") == 2
+    assert _sample(text, "t_bucket", le="1.0") == 3
+    assert _sample(text, "t_bucket", le="+Inf") == 4 == _sample(text, "t_count")
+    assert _sample(text, "t_sum") == 3.65
+
+def test_can_be_turned_off(client, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, event
+
+from app import migrations
+
+# Each test upgrades its own database file, separate from the suite's
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def _make(name: str = "m.db"):
+        eng = create_engine(f"sqlite:///{tmp_path / name}")
+        engines.append(eng)
+        return eng
+    yield _make
+    for eng in engines:
+        eng.dispose()
+
+def _rows(eng, sql: str, *params):
+    with eng.connect() as conn:
+        return conn.exec_driver_sql(sql, params).all()
+
+# Tables as the pre-migration startup code left them (before its ALTER TABLEs ran)
+_LEGACY = [
+    "CREATE TABLE chat_rooms (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL UNIQUE, type VARCHAR(32) NOT NULL)",
+    "CREATE TABLE messages (id INTEGER PRIMARY KEY, room_id INTEGER NOT NULL REFERENCES chat_rooms (id), "
+    "sender_id VARCHAR(128) NOT NULL, sender_name VARCHAR(255) NOT NULL, content TEXT NOT NULL, timestamp VARCHAR(32) NOT NULL)",
+    'CREATE TABLE events (id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, type VARCHAR(64) NOT NULL, '
+    'start VARCHAR(32) NOT NULL, "end" VARCHAR(32), description TEXT)',
+    "CREATE TABLE leaves (id INTEGER PRIMARY KEY, studentName VARCHAR(255) NOT NULL, studentId VARCHAR(64) NOT NULL, "
+    "department VARCHAR(128) NOT NULL, mentorName VARCHAR(255) NOT NULL, parentPhone VARCHAR(32) NOT NULL, "
+    "leaveType VARCHAR(32) NOT NULL, fromDate VARCHAR(16) NOT NULL, toDate VARCHAR(16) NOT NULL, "
+    "totalDays INTEGER NOT NULL, reason TEXT NOT NULL, status VARCHAR(16) NOT NULL)",
+    "CREATE TABLE timetables (id INTEGER PRIMARY KEY, section VARCHAR(64) NOT NULL UNIQUE, data TEXT NOT NULL)",
+]
+
+def _legacy(eng, timetables: int = 1):
+    with eng.begin() as conn:
+        for sql in _LEGACY:
+            conn.exec_driver_sql(sql)
+        conn.exec_driver_sql("INSERT INTO chat_rooms VALUES (1, 'General', 'group')")
+        conn.exec_driver_sql("INSERT INTO messages VALUES (1, 1, 'u1', 'U1', 'hello legacy world', '2024-01-01T00:00:00')")
+        conn.exec_driver_sql("INSERT INTO events VALUES (1, 'Fest', 'Fest', '2024-03-01T10:00:00', '2024-02-30', NULL)")
+        conn.exec_driver_sql("INSERT INTO events VALUES (2, 'Later', 'Exam', 'TBD', NULL, NULL)")
+        conn.exec_driver_sql("INSERT INTO leaves VALUES (1, 'S', 'S1', 'CSE', 'Dr. M', '0', 'Medical', "
+                             "'2024-01-01', '2024-01-02', 2, 'r', 'Pending')")
+        week = {"Monday": [{"subjectId": "1", "faculty": "Dr. A"}, "Break"], "Friday": []}
+        for n in range(timetables):
+            conn.exec_driver_sql("INSERT INTO timetables (section, data) VALUES (?, ?)", (f"S{n}", json.dumps(week)))
+
+def test_fresh_database_then_nothing_to_do(make_engine):
+    eng = make_engine()
+    assert migrations.current_version(eng) == 0
+    assert migrations.upgrade(eng) == [s.name for s in migrations.STEPS]
+    assert migrations.current_version(eng) == migrations.LATEST
+    assert migrations.upgrade(eng) == []
+    assert all(applied_at for _, _, applied_at in migrations.status(eng))
+
+def test_current_database_costs_one_query(make_engine):
+    eng = make_engine()
+    migrations.upgrade(eng)
+    statements = []
+
+    @event.listens_for(eng, "before_cursor_execute")
+    def _log(conn, cursor, statement, *args):
+        statements.append(statement)
+    migrations.upgrade(eng)
+    assert statements == ["SELECT COALESCE(MAX(version), 0) FROM schema_version"]
+
+def test_legacy_database_is_brought_up_to_date(make_engine):
+    eng = make_engine()
+    _legacy(eng)
+    assert [name for _, name, applied in migrations.status(eng) if applied] == []
+    migrations.upgrade(eng)
+    assert {"visibility", "meta"} <= {r[1] for r in _rows(eng, "PRAGMA table_info(chat_rooms)")}
+    assert _rows(eng, "SELECT type, deleted, seq FROM messages") == [("text", 0, 0)]
+    # Old messages are searchable and counted
+    assert _rows(eng, "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'legacy'") == [(1,)]
+    assert _rows(eng, "SELECT room_id, message_count, last_message_id FROM room_counters") == [(1, 1, 1)]
+    # Timestamps trimmed to dates, impossible end dropped, undated event set aside
+    assert _rows(eng, 'SELECT id, start, "end" FROM events') == [(1, "2024-03-01", None)]
+    assert _rows(eng, "SELECT id, start FROM events_rejected") == [(2, "TBD")]
+    assert ("all", "", "Pending", 1) in _rows(eng, "SELECT dimension, value, status, count FROM leave_counters")
+    cells = _rows(eng, "SELECT day, period, subject_id, label FROM timetable_cells ORDER BY day_order, period")
+    assert cells == [("Monday", 0, "1", None), ("Monday", 1, None, "Break"), ("Friday", -1, None, None)]
+
+def test_backfills_resume_where_they_stopped(make_engine, monkeypatch):
+    eng = make_engine()
+    _legacy(eng, timetables=3)
+    real = migrations.timetables.migrate_json_rows
+    calls = []
+
+    def crash_on_second_batch(conn, ids=None):
+        calls.append(ids)
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        return real(conn, ids=ids)
+    monkeypatch.setattr(migrations.timetables, "migrate_json_rows", crash_on_second_batch)
+    # A batch of 10 rows is one timetable per transaction
+    with pytest.raises(RuntimeError):
+        migrations.upgrade(eng, batch_size=10)
+    assert migrations.current_version(eng) == 8
+    assert _rows(eng, "SELECT position FROM schema_backfill WHERE name = 'timetable_cells'") == [(1,)]
+    assert _rows(eng, "SELECT DISTINCT timetable_id FROM timetable_cells") == [(1,)]
+
+    monkeypatch.setattr(migrations.timetables, "migrate_json_rows", real)
+    applied = migrations.upgrade(eng, batch_size=10)
+    assert applied[0] == "timetable_cells"
+    assert migrations.current_version(eng) == migrations.LATEST
+    assert _rows(eng, "SELECT DISTINCT timetable_id FROM timetable_cells ORDER BY 1") == [(1,), (2,), (3,)]
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from app.broker import Broker
+from app.realtime import ConnectionManager
+from test_fanout import FakeSocket
+
+# Several workers on one in-memory bus; presence ticks are driven by hand with flush()
+
+TTL = 0.06
+
+class Bus:
+    def __init__(self):
+        self.workers: list[ConnectionManager] = []
+
+    def crash(self, manager: ConnectionManager):
+        # Gone without sending its leaves
+        self.workers.remove(manager)
+
+class BusBroker(Broker):
+    def __init__(self, bus: Bus):
+        self.bus = bus
+
+    async def publish(self, room_id: int, message: dict) -> None:
+        for manager in list(self.bus.workers):
+            await manager.deliver(room_id, message)
+
+def _worker(bus: Bus) -> ConnectionManager:
+    manager = ConnectionManager(broker=BusBroker(bus), queue_size=64, slow_policy="disconnect")
+    manager.presence.grace = 0
+    manager.presence.ttl = TTL
+    bus.workers.append(manager)
+    return manager
+
+async def _user(manager: ConnectionManager, user_id: str, room_id: int = 5) -> FakeSocket:
+    sock = FakeSocket()
+    await manager.connect(sock, [room_id], user={"id": user_id, "name": user_id.upper()})
+    return sock
+
+async def _presence(sock: FakeSocket) -> list[dict]:
+    await asyncio.sleep(0.005)
+    frames = [json.loads(f) for f in sock.sent]
+    sock.sent.clear()
+    return [{"joined": sorted(u["id"] for u in f["joined"]), "left": f["left"]} for f in frames if f["type"] == "presence"]
+
+def test_users_of_a_crashed_worker_go_offline_after_the_ttl():
+    async def run():
+        bus = Bus()
+        a, b = _worker(bus), _worker(bus)
+        await _user(a, "ua")
+        watcher = await _user(b, "ub")
+        await a.presence.flush()
+        await b.presence.flush()
+        assert await _presence(watcher) == [{"joined": ["ua"], "left": []}, {"joined": ["ub"], "left": []}]
+        assert b.presence.is_online("ua")
+
+        bus.crash(a)
+        await b.presence.flush()
+        assert b.presence.is_online("ua")
+        await asyncio.sleep(TTL * 1.5)
+        await b.presence.flush()
+        assert await _presence(watcher) == [{"joined": [], "left": ["ua"]}]
+        assert not b.presence.is_online("ua") and b.presence.room_count(5) == 1
+        assert b.presence.snapshot()["presence_expired_workers"] == 1
+        # Its own users never expire
+        assert b.presence.is_online("ub")
+    asyncio.run(run())
+
+def test_heartbeats_keep_a_quiet_worker_alive():
+    async def run():
+        bus = Bus()
+        a, b = _worker(bus), _worker(bus)
+        await _user(a, "ua")
+        await a.presence.flush()
+        for _ in range(6):
+            await asyncio.sleep(TTL / 3)
+            await a.presence.flush()
+            await b.presence.flush()
+        assert b.presence.is_online("ua")
+        assert a.presence.snapshot()["presence_heartbeats"] >= 3
+        assert b.presence.snapshot()["presence_expired_workers"] == 0
+    asyncio.run(run())
+
+def test_a_user_on_two_workers_stays_online_when_one_dies():
+    async def run():
+        bus = Bus()
+        a, b = _worker(bus), _worker(bus)
+        await _user(a, "u")
+        watcher = await _user(b, "u")
+        await a.presence.flush()
+        await b.presence.flush()
+        assert await _presence(watcher) == [{"joined": ["u"], "left": []}]
+        bus.crash(a)
+        await asyncio.sleep(TTL * 1.5)
+        await b.presence.flush()
+        assert await _presence(watcher) == []
+        assert b.presence.is_online("u")
+    asyncio.run(run())
+
+def test_a_stalled_worker_announces_its_users_again():
+    async def run():
+        bus = Bus()
+        a, b = _worker(bus), _worker(bus)
+        await _user(a, "ua")
+        await a.presence.flush()
+        await asyncio.sleep(TTL * 1.5)
+        await b.presence.flush()
+        assert not b.presence.is_online("ua")
+        # a's tick comes round late: it knows it was silent past the TTL
+        await a.presence.flush()
+        assert b.presence.is_online("ua")
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+import pytest
+
+from app.profiler import query_budget, assert_query_budget, statement_shape
+
+def test_statement_shape_folds_in_lists():
+    sql = "SELECT id FROM messages\n  WHERE room_id IN (?, ?,?)  AND id > ?"
+    assert statement_shape(sql) == "SELECT id FROM messages WHERE room_id IN (?, ...) AND id > ?"
+
+def test_query_budget_reports_every_statement_when_exceeded(client, room):
+    with pytest.raises(AssertionError) as exc:
+        with query_budget(0):
+            client.get(f"/api/messages/{room}")
+    assert "budget is 0" in str(exc.value)
+    assert "FROM messages" in str(exc.value)
+
+def test_list_messages_budget(client, room, send):
+    for i in range(5):
+        send(room, f"message {i}")
+    r = assert_query_budget(client, "GET", f"/api/messages/{room}", 1, params={"limit": 3})
+    assert len(r.json()) == 3
+    # Per-user view: the cleared-at lookup plus the page; hidden messages are a correlated EXISTS
+    r = assert_query_budget(client, "GET", f"/api/messages/{room}", 2, params={"user_id": "u2", "limit": 3})
+    assert len(r.json()) == 3
+
+def test_update_members_budget_does_not_grow_with_the_list(client, room):
+    users = [f"member-{i}" for i in range(20)]
+    # One SELECT of the existing members, one executemany INSERT
+    r = assert_query_budget(client, "POST", f"/api/chatrooms/{room}/members", 2, json={"add": users})
+    assert r.status_code == 200
+    # Plus one DELETE for the removals
+    assert_query_budget(client, "POST", f"/api/chatrooms/{room}/members", 3,
+                        json={"add": users + ["member-new"], "remove": ["member-0"]})
+
+def test_timetable_reads_budget(client, timetable):
+    section = timetable["section"]
+    # The section row, then one range scan over its cells
+    r = assert_query_budget(client, "GET", "/api/timetables", 2, params={"section": section})
+    assert r.json()["data"]["Monday"][1] == "Break"
+    r = assert_query_budget(client, "GET", "/api/timetables/bulk", 2, params={"sections": f"{section},CSBS"})
+    assert [t["section"] for t in r.json()] == [section]
+    assert_query_budget(client, "GET", "/api/timetables/faculty", 1, params={"name": "Dr. B"})
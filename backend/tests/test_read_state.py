@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+def _read(client, room, user, up_to=None):
+    body = {"user_id": user} if up_to is None else {"user_id": user, "up_to_id": up_to}
+    r = client.post(f"/api/chatrooms/{room}/read", json=body)
+    assert r.status_code == 200, r.text
+    return r.json()["last_read_id"]
+
+def _unread(client, room, user):
+    return client.get("/api/unread", params={"user_id": user}).json()["rooms"][str(room)]["unread"]
+
+def test_unread_counts_follow_the_watermark(client, room, send):
+    ids = [send(room, f"m{i}", sender="alice")["id"] for i in range(5)]
+    assert _unread(client, room, "bob") == 5
+    assert _unread(client, room, "alice") == 0
+    assert _read(client, room, "bob", ids[2]) == ids[2]
+    assert _unread(client, room, "bob") == 2
+    # Never moves back
+    assert _read(client, room, "bob", ids[0]) == ids[2]
+    assert _read(client, room, "bob") == ids[-1]
+    assert _unread(client, room, "bob") == 0
+    seen = client.get(f"/api/messages/{ids[3]}/seen").json()["seen_by"]
+    assert seen == ["bob"]
+
+def test_deleting_read_and_unread_messages(client, room, send):
+    ids = [send(room, f"m{i}", sender="alice")["id"] for i in range(4)]
+    _read(client, room, "bob", ids[1])
+    client.delete(f"/api/messages/{ids[0]}").raise_for_status()
+    client.delete(f"/api/messages/{ids[3]}").raise_for_status()
+    assert _unread(client, room, "bob") == 1
+    _read(client, room, "bob")
+    assert _unread(client, room, "bob") == 0
+
+def test_watermark_is_clamped_to_the_latest_message(client, room, send):
+    last = send(room, "m0", sender="alice")["id"]
+    assert _read(client, room, "bob", last + 1000) == last
+    later = [send(room, f"m{i}", sender="alice")["id"] for i in range(1, 4)]
+    assert _unread(client, room, "bob") == 3
+    client.delete(f"/api/messages/{later[0]}").raise_for_status()
+    assert _unread(client, room, "bob") == 2
+    assert _read(client, room, "bob") == later[-1]
+    assert _unread(client, room, "bob") == 0
+
+def test_concurrent_first_reads_of_a_room(client, room, send):
+    last = send(room, "m0", sender="alice")["id"]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: _read(client, room, "carol"), range(16)))
+    assert results == [last] * 16
+    assert _unread(client, room, "carol") == 0
+
+def test_read_of_a_missing_room(client):
+    r = client.post("/api/chatrooms/999999/read", json={"user_id": "bob"})
+    assert r.status_code == 404
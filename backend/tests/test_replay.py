@@ -0,0 +1,72 @@
+from app.realtime import ReplayBuffer
+from app.routers.chat import manager
+
+def _frames(buffer: ReplayBuffer, room_id: int, seqs) -> None:
+    for seq in seqs:
+        buffer.record(room_id, seq, f"f{seq}")
+
+def test_buffer_answers_only_gaps_it_fully_covers():
+    buffer = ReplayBuffer(size=4, max_rooms=2)
+    _frames(buffer, 1, [1, 2, 4, 3, 5])  # commits may be broadcast out of order
+    assert buffer.since(1, 3) == ["f4", "f5"]
+    assert buffer.since(1, 5) == []
+    assert buffer.since(1, 1) == ["f2", "f3", "f4", "f5"]
+    assert buffer.since(1, 0) is None  # seq 1 fell out of the ring
+    assert buffer.since(1, 9) is None  # client is ahead of this worker
+    _frames(buffer, 2, [7, 9])
+    assert buffer.since(2, 7) is None  # 8 never reached this buffer
+    # A third room evicts the least recently active one
+    _frames(buffer, 1, [6])
+    _frames(buffer, 3, [1])
+    assert list(buffer.rooms) == [1, 3]
+
+def _next(ws, type_: str) -> dict:
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == type_:
+            return frame
+
+def _sent(client, room: int, contents) -> list[dict]:
+    # Send through the socket to learn each message's seq
+    with client.websocket_connect(f"/api/ws?rooms={room}") as ws:
+        events = []
+        for n, content in enumerate(contents):
+            ws.send_json({"type": "message:send", "room_id": room, "client_id": f"replay-{room}-{n}",
+                          "sender_id": "u1", "sender_name": "U1", "content": content})
+            events.append(_next(ws, "message:new"))
+    return events
+
+def _resume(client, room: int, since: int) -> list[dict]:
+    with client.websocket_connect(f"/api/ws/{room}?since={since}") as ws:
+        frames = [ws.receive_json()]
+        while frames[-1]["type"] not in ("resumed", "resync"):
+            frames.append(ws.receive_json())
+    return frames
+
+def test_reconnect_gets_only_what_it_missed(client, room):
+    first, second, third = _sent(client, room, ["one", "two", "three"])
+    assert second["seq"] == first["seq"] + 1 and third["seq"] == first["seq"] + 2
+    frames = _resume(client, room, first["seq"])
+    assert [f["data"]["content"] for f in frames[:-1]] == ["two", "three"]
+    assert frames[-1] == {"type": "resumed", "room_id": room, "since": first["seq"], "replayed": 2, "source": "buffer"}
+
+def test_database_fills_in_when_the_buffer_is_gone(client, room, monkeypatch):
+    first, second, third = _sent(client, room, ["one", "two", "three"])
+    client.patch(f"/api/messages/{second['data']['id']}", json={"content": "two, edited"}).raise_for_status()
+    client.delete(f"/api/messages/{third['data']['id']}").raise_for_status()
+    monkeypatch.setattr(manager.replay, "rooms", type(manager.replay.rooms)())
+    frames = _resume(client, room, first["seq"])
+    assert frames[-1]["source"] == "database"
+    # Current state, one event per changed message
+    assert [(f["type"], f.get("id") or f["data"]["id"]) for f in frames[:-1]] == [
+        ("message:new", second["data"]["id"]),
+        ("message:edited", second["data"]["id"]),
+        ("message:deleted", third["data"]["id"]),
+    ]
+    assert frames[1]["data"]["content"] == "two, edited"
+
+def test_too_large_a_gap_asks_for_a_reload(client, room, monkeypatch):
+    first, *_ = _sent(client, room, ["one", "two", "three"])
+    monkeypatch.setattr(manager.replay, "rooms", type(manager.replay.rooms)())
+    monkeypatch.setattr(manager, "queue_size", 2)  # database replay is capped at half the queue
+    assert _resume(client, room, first["seq"] - 1) == [{"type": "resync", "room_id": room}]
@@ -0,0 +1,75 @@
+from app.pagination import decode_cursor
+
+def _walk(client, url, params):
+    # Every page until the server stops handing out cursors
+    seen, cursor = [], None
+    while True:
+        r = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        seen += [m["id"] for m in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            return seen
+
+def test_prefix_search_ranks_and_marks_hits(client, room, send):
+    send(room, "the quarterly exam timetable is out")
+    send(room, "exam exam exam")
+    send(room, "nothing relevant here")
+    hits = client.get(f"/api/messages/{room}/search", params={"q": "exa"}).json()
+    assert [h["content"] for h in hits] == ["exam exam exam", "the quarterly exam timetable is out"]
+    assert "<mark>exam</mark>" in hits[1]["snippet"]
+    assert hits[0]["rank"] <= hits[1]["rank"]
+
+def test_edits_and_deletes_reach_the_index(client, room, send):
+    a = send(room, "zebra crossing")
+    b = send(room, "zebra stripes")
+    client.patch(f"/api/messages/{a['id']}", json={"content": "giraffe neck"})
+    client.delete(f"/api/messages/{b['id']}")
+    assert client.get(f"/api/messages/{room}/search", params={"q": "zebra"}).json() == []
+    assert [h["id"] for h in client.get(f"/api/messages/{room}/search", params={"q": "giraffe"}).json()] == [a["id"]]
+
+def test_pages_neither_skip_nor_repeat_while_the_corpus_changes(client, room, send, request):
+    # Different lengths give every hit its own BM25 score
+    ids = [send(room, "quokka " + "filler " * (i % 7) + f"n{i}")["id"] for i in range(12)]
+    url = f"/api/messages/{room}/search"
+    first = client.get(url, params={"q": "quokka", "limit": 4})
+    seen = [h["id"] for h in first.json()]
+    cursor = first.headers["x-next-cursor"]
+    # Sends elsewhere change N and the term's document frequency, so every rank moves
+    other = client.post("/api/chatrooms", json={"name": f"{request.node.name}-other", "type": "group"}).json()["id"]
+    for i in range(15):
+        send(other, "quokka quokka elsewhere" if i % 2 else "unrelated chatter")
+    while cursor:
+        r = client.get(url, params={"q": "quokka", "limit": 4, "cursor": cursor})
+        seen += [h["id"] for h in r.json()]
+        cursor = r.headers.get("x-next-cursor")
+    assert sorted(seen) == sorted(ids)
+
+def test_cursor_survives_the_anchor_hit_going_away(client, room, send):
+    ids = [send(room, "wombat " + "x " * i)["id"] for i in range(6)]
+    url = f"/api/messages/{room}/search"
+    first = client.get(url, params={"q": "wombat", "limit": 3})
+    last = first.json()[-1]["id"]
+    client.delete(f"/api/messages/{last}")
+    rest = client.get(url, params={"q": "wombat", "limit": 3, "cursor": first.headers["x-next-cursor"]}).json()
+    assert sorted([h["id"] for h in first.json()] + [h["id"] for h in rest]) == sorted(ids)
+
+def test_unsearchable_query_pages_latest_messages(client, room, send):
+    ids = [send(room, f"m{i}")["id"] for i in range(5)]
+    seen = _walk(client, f"/api/messages/{room}/search", {"q": "?!", "limit": 2})
+    assert seen == ids[::-1]
+    r = client.get(f"/api/messages/{room}/search", params={"q": "?!", "limit": 2})
+    assert decode_cursor(r.headers["x-next-cursor"]) == {"id": ids[3]}
+
+def test_search_all_only_covers_visible_rooms(client, send):
+    public = client.post("/api/chatrooms", json={"name": "search-public", "type": "group"}).json()["id"]
+    teachers = client.post("/api/chatrooms", json={"name": "search-teachers", "type": "group", "visibility": "teacher"}).json()["id"]
+    send(public, "platypus sighting")
+    send(teachers, "platypus grading")
+    student = client.get("/api/search/messages", params={"q": "platypus", "user_id": "s1", "role": "student"}).json()
+    teacher = client.get("/api/search/messages", params={"q": "platypus", "user_id": "t1", "role": "teacher"}).json()
+    assert {h["room_id"] for h in student} == {public}
+    assert {h["room_id"] for h in teacher} == {public, teachers}
+
+def test_bad_search_cursor_is_a_400(client, room):
+    assert client.get(f"/api/messages/{room}/search", params={"q": "a", "cursor": "e30"}).status_code == 400
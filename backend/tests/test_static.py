@@ -0,0 +1,60 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app import attachments
+from app.static import CACHE_CONTROL, AttachmentFiles
+
+def _upload(client, data: bytes) -> dict:
+    r = client.post("/api/uploads", files={"file": ("doc.txt", data, "text/plain")})
+    r.raise_for_status()
+    return r.json()
+
+def test_blobs_are_immutable_with_their_hash_as_etag(client):
+    data = os.urandom(4096)
+    blob = _upload(client, data)
+    r = client.get(blob["url"])
+    assert r.status_code == 200 and r.content == data
+    assert r.headers["cache-control"] == CACHE_CONTROL
+    assert r.headers["etag"] == f'"{blob["sha256"]}"'
+    assert r.headers["content-type"].startswith("text/plain")
+    r = client.get(blob["url"], headers={"if-none-match": f'"{blob["sha256"]}"'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == f'"{blob["sha256"]}"'
+
+def test_ranges(client):
+    data = os.urandom(4096)
+    blob = _upload(client, data)
+    etag = f'"{blob["sha256"]}"'
+    r = client.get(blob["url"], headers={"range": "bytes=100-199"})
+    assert r.status_code == 206
+    assert r.content == data[100:200]
+    assert r.headers["content-range"] == "bytes 100-199/4096"
+    r = client.get(blob["url"], headers={"range": "bytes=-10"})
+    assert r.content == data[-10:]
+    # If-Range: the range only applies while the validator still matches
+    r = client.get(blob["url"], headers={"range": "bytes=0-9", "if-range": etag})
+    assert r.status_code == 206 and r.content == data[:10]
+    r = client.get(blob["url"], headers={"range": "bytes=0-9", "if-range": '"other"'})
+    assert r.status_code == 200 and r.content == data
+    r = client.get(blob["url"], headers={"range": "bytes=0-9,20-29"})
+    assert r.status_code == 206
+    assert r.headers["content-type"].startswith("multipart/byteranges")
+    assert data[:10] in r.content and data[20:30] in r.content
+
+def test_partial_and_temp_files_are_not_served(client):
+    r = client.post("/api/uploads/sessions", json={"filename": "x.bin", "size": 3})
+    upload_id = r.json()["upload_id"]
+    client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=b"abc").raise_for_status()
+    assert client.get(f"/uploads/.partial/{upload_id}.part").status_code == 404
+    assert client.get(f"/uploads/.partial/{upload_id}.json").status_code == 404
+
+def test_accel_redirect_leaves_the_body_to_the_proxy(client):
+    blob = _upload(client, os.urandom(100))
+    files = AttachmentFiles(directory=attachments.UPLOADS_DIR, accel_prefix="/internal-uploads/")
+    r = TestClient(files).get("/" + blob["stored_as"])
+    assert r.status_code == 200
+    assert r.headers["x-accel-redirect"] == "/internal-uploads/" + blob["stored_as"]
+    assert r.content == b""
+    assert r.headers["etag"] == f'"{blob["sha256"]}"'
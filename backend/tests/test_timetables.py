@@ -0,0 +1,67 @@
+import json
+
+from app.db import engine
+from app.timetables import migrate_json_rows
+
+def _patch(client, tt, day, period, subject, faculty):
+    return client.patch(f"/api/timetables/{tt['id']}/cell",
+                        json={"day": day, "periodIndex": period, "subjectId": subject, "faculty": faculty})
+
+def test_week_round_trips_through_cells(client, timetable):
+    assert timetable["data"] == {
+        "Monday": [{"subjectId": "1", "faculty": "Dr. A"}, "Break", {"subjectId": "2", "faculty": "Dr. B"}],
+        "Tuesday": [{"subjectId": "2", "faculty": "Dr. B"}],
+    }
+
+def test_empty_days_are_kept(client):
+    line = json.dumps({"section": "TT-EMPTY", "data": {"Monday": [], "Friday": ["Library"]}})
+    client.post("/api/import/timetables?format=ndjson", content=line + "\n").raise_for_status()
+    assert client.get("/api/timetables", params={"section": "TT-EMPTY"}).json()["data"] == {"Monday": [], "Friday": ["Library"]}
+
+def test_patch_changes_one_period(client, timetable):
+    r = _patch(client, timetable, "Tuesday", 0, "9", "Dr. Patch")
+    assert r.status_code == 200, r.text
+    assert r.json()["data"]["Tuesday"] == [{"subjectId": "9", "faculty": "Dr. Patch"}]
+    assert r.json()["data"]["Monday"] == timetable["data"]["Monday"]
+    # A period past the end leaves gaps as null; a new day goes last
+    data = _patch(client, timetable, "Tuesday", 2, "3", "Dr. Patch").json()["data"]
+    assert data["Tuesday"][1:] == [None, {"subjectId": "3", "faculty": "Dr. Patch"}]
+    data = _patch(client, timetable, "Saturday", 0, "4", "Dr. Patch").json()["data"]
+    assert list(data) == ["Monday", "Tuesday", "Saturday"]
+    assert client.get("/api/timetables", params={"section": timetable["section"]}).json()["data"] == data
+
+def test_patch_rejects_bad_cells(client, timetable):
+    assert _patch(client, timetable, "Monday", -1, "1", "X").status_code == 422
+    assert client.patch("/api/timetables/999999/cell",
+                        json={"day": "Monday", "periodIndex": 0, "subjectId": "1", "faculty": "X"}).status_code == 404
+
+def test_bulk_keeps_the_requested_order(client, timetable):
+    line = json.dumps({"section": "TT-BULK", "data": {"Monday": ["Sports"]}})
+    client.post("/api/import/timetables?format=ndjson", content=line + "\n").raise_for_status()
+    r = client.get("/api/timetables/bulk", params={"sections": f"TT-BULK,{timetable['section']}"})
+    assert [t["section"] for t in r.json()] == ["TT-BULK", timetable["section"]]
+    assert r.json()[0]["data"] == {"Monday": ["Sports"]}
+
+def test_faculty_week_and_clashes(client, timetable):
+    _patch(client, timetable, "Monday", 0, "5", "Dr. Clash")
+    week = client.get("/api/timetables/faculty", params={"name": "Dr. Clash"}).json()
+    assert week["data"] == {"Monday": [{"period": 0, "section": timetable["section"], "subjectId": "5"}]}
+    # Would booking the same slot in another section clash?
+    r = client.get("/api/timetables/clashes", params={
+        "faculty": "Dr. Clash", "day": "Monday", "periodIndex": 0, "section": "TT-OTHER"})
+    assert r.json() == [{"faculty": "Dr. Clash", "day": "Monday", "periodIndex": 0,
+                         "sections": sorted([timetable["section"], "TT-OTHER"])}]
+    assert client.get("/api/timetables/clashes", params={"faculty": "Dr. Clash"}).json() == []
+    line = json.dumps({"section": "TT-CLASH", "data": {"Monday": [{"subjectId": "6", "faculty": "Dr. Clash"}]}})
+    client.post("/api/import/timetables?format=ndjson", content=line + "\n").raise_for_status()
+    clashes = client.get("/api/timetables/clashes", params={"faculty": "Dr. Clash"}).json()
+    assert clashes == [{"faculty": "Dr. Clash", "day": "Monday", "periodIndex": 0,
+                        "sections": sorted([timetable["section"], "TT-CLASH"])}]
+    assert client.get("/api/timetables/clashes", params={"section": "X"}).status_code == 400
+
+def test_json_rows_are_exploded_once():
+    week = {"Monday": [{"subjectId": "1", "faculty": "Dr. J"}], "Sunday": []}
+    with engine.begin() as conn:
+        tid = conn.exec_driver_sql("INSERT INTO timetables (section, data) VALUES ('TT-JSON', ?)", (json.dumps(week),)).lastrowid
+        assert migrate_json_rows(conn, ids=[tid]) == 2
+        assert migrate_json_rows(conn, ids=[tid]) == 0
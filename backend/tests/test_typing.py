@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.realtime import ConnectionManager
+from test_fanout import FakeSocket
+
+# The coalescer is driven by hand: flush() stands in for the tick
+
+def _typing(user_id: str, stop: bool = False) -> dict:
+    return {"type": "typing:stop" if stop else "typing:start", "user": {"id": user_id, "name": user_id.upper()}}
+
+async def _room(sockets: int = 3, tick: float = 0.25, ttl: float = 3.0):
+    manager = ConnectionManager(queue_size=64, slow_policy="disconnect")
+    manager.typing.tick, manager.typing.ttl = tick, ttl
+    socks = [FakeSocket() for _ in range(sockets)]
+    for sock in socks:
+        await manager.connect(sock, [7])
+    return manager, socks
+
+async def _frames(sock: FakeSocket) -> list[dict]:
+    await asyncio.sleep(0.01)
+    frames, sock.sent[:] = [json.loads(f) for f in sock.sent], []
+    return frames
+
+def _names(frames) -> list[list[str]]:
+    return [sorted(u["id"] for u in f["users"]) for f in frames]
+
+def test_one_frame_per_room_and_tick():
+    async def run():
+        manager, socks = await _room()
+        for user_id in ["a", "b", "a", "a"]:
+            await manager.deliver(7, _typing(user_id))
+        assert await _frames(socks[0]) == []
+        manager.typing.flush()
+        frames = await _frames(socks[0])
+        assert _names(frames) == [["a", "b"]] and frames[0]["room_id"] == 7
+        # Nothing changed: nothing sent
+        await manager.deliver(7, _typing("b"))
+        manager.typing.flush()
+        assert await _frames(socks[0]) == []
+        await manager.deliver(7, _typing("a", stop=True))
+        await manager.deliver(7, _typing("a", stop=True))
+        manager.typing.flush()
+        assert _names(await _frames(socks[0])) == [["b"]]
+        stats = manager.typing.snapshot()
+        assert (stats["typing_updates"], stats["typing_duplicates"]) == (7, 4)
+        # 7 updates relayed to 3 sockets would have been 21 frames; 2 ticks sent 6
+        assert (stats["typing_frames_sent"], stats["typing_frames_saved"]) == (6, 15)
+    asyncio.run(run())
+
+def test_silent_typists_expire():
+    async def run():
+        manager, socks = await _room(sockets=1, ttl=0.02)
+        await manager.deliver(7, _typing("a"))
+        manager.typing.flush()
+        assert _names(await _frames(socks[0])) == [["a"]]
+        await asyncio.sleep(0.03)
+        manager.typing.flush()
+        assert _names(await _frames(socks[0])) == [[]]
+        assert manager.typing.snapshot()["typing_expired"] == 1
+        assert manager.typing.rooms == {}
+    asyncio.run(run())
+
+def test_tick_zero_relays_every_frame():
+    async def run():
+        manager, socks = await _room(sockets=1, tick=0)
+        await manager.deliver(7, _typing("a"))
+        await manager.deliver(7, _typing("a"))
+        assert [f["type"] for f in await _frames(socks[0])] == ["typing:start", "typing:start"]
+    asyncio.run(run())
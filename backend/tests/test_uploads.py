@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+
+from app import attachments
+
+def _session(client, data: bytes, name="notes.txt") -> str:
+    r = client.post("/api/uploads/sessions", json={"filename": name, "size": len(data), "mime": "text/plain"})
+    assert r.status_code == 200, r.text
+    return r.json()["upload_id"]
+
+def test_single_shot_upload_is_served_back(client):
+    data = os.urandom(3000)
+    r = client.post("/api/uploads", files={"file": ("photo.png", data, "image/png")})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["size"] == 3000
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert body["url"].startswith("/uploads/cas/") and body["url"].endswith(".png")
+    assert client.get(body["url"]).content == data
+
+def test_single_shot_limit_is_enforced_while_streaming(client, monkeypatch):
+    monkeypatch.setattr(attachments, "MAX_UPLOAD_BYTES", 1000)
+    monkeypatch.setattr("app.routers.uploads.MULTIPART_SLACK", 100)
+    boundary = "testboundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.bin\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode()
+    chunks = [head] + [b"x" * 1000] * 50 + [f"\r\n--{boundary}--\r\n".encode()]
+    # A generator body goes out chunked, without Content-Length
+    r = client.post("/api/uploads", content=iter(chunks), headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+    assert r.status_code == 413
+    # With Content-Length the request is refused up front
+    r = client.post("/api/uploads", files={"file": ("big.bin", b"x" * 5000)})
+    assert r.status_code == 413
+
+def test_resumable_upload_in_chunks(client):
+    data = os.urandom(10_000)
+    upload_id = _session(client, data)
+    assert client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=data[:4000]).json()["offset"] == 4000
+    # A resend of the first chunk (the response was lost) is refused with the real offset
+    r = client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=data[:4000])
+    assert r.status_code == 409
+    assert r.json()["detail"]["offset"] == 4000
+    assert client.get(f"/api/uploads/sessions/{upload_id}").json()["offset"] == 4000
+    r = client.post(f"/api/uploads/sessions/{upload_id}/finalize")
+    assert r.status_code == 409
+    client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 4000}, content=data[4000:]).raise_for_status()
+    r = client.post(f"/api/uploads/sessions/{upload_id}/finalize", json={"sha256": hashlib.sha256(data).hexdigest()})
+    assert r.status_code == 200, r.text
+    assert client.get(r.json()["url"]).content == data
+    assert client.get(f"/api/uploads/sessions/{upload_id}").status_code == 404
+
+def test_chunk_past_the_declared_size(client):
+    upload_id = _session(client, b"abc")
+    r = client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=b"abcdef")
+    assert r.status_code == 413
+    client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=b"abd").raise_for_status()
+    r = client.post(f"/api/uploads/sessions/{upload_id}/finalize", json={"sha256": hashlib.sha256(b"abc").hexdigest()})
+    assert r.status_code == 422
+
+def test_overlapping_retries_write_a_chunk_once(client):
+    chunk = os.urandom(64 * 1024)
+    rounds = 20
+    upload_id = _session(client, chunk * rounds)
+    for n in range(rounds):
+        barrier = threading.Barrier(4)
+        outcomes = []
+
+        def retry():
+            barrier.wait()
+            try:
+                outcomes.append(attachments.write_chunk(upload_id, n * len(chunk), chunk))
+            except attachments.OffsetMismatch as exc:
+                outcomes.append(("mismatch", exc.expected))
+        threads = [threading.Thread(target=retry) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        end = (n + 1) * len(chunk)
+        assert sorted(outcomes, key=str) == sorted([end] + [("mismatch", end)] * 3, key=str)
+    done = attachments.finalize_session(upload_id)
+    assert done["sha256"] == hashlib.sha256(chunk * rounds).hexdigest()
+
+def test_aborted_session_is_gone(client):
+    upload_id = _session(client, b"abc")
+    assert client.delete(f"/api/uploads/sessions/{upload_id}").status_code == 200
+    r = client.put(f"/api/uploads/sessions/{upload_id}", params={"offset": 0}, content=b"abc")
+    assert r.status_code == 404
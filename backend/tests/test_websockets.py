@@ -0,0 +1,92 @@
+from app.routers.chat import manager
+
+# Sockets go through the session's TestClient; anonymous connections (no user_id) so no
+# presence frames are mixed in
+
+def _next(ws, type_: str) -> dict:
+    # Skip frames of other kinds (e.g. presence from other tests' users)
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == type_:
+            return frame
+
+def test_one_socket_follows_many_rooms(client, send):
+    a = client.post("/api/chatrooms", json={"name": "ws-mux-a", "type": "group"}).json()["id"]
+    b = client.post("/api/chatrooms", json={"name": "ws-mux-b", "type": "group"}).json()["id"]
+    with client.websocket_connect(f"/api/ws?rooms={a}") as ws:
+        ws.send_json({"type": "subscribe", "rooms": [b, a]})
+        assert _next(ws, "subscribed")["rooms"] == sorted([a, b])
+        send(b, "to b")
+        frame = _next(ws, "message:new")
+        assert (frame["room_id"], frame["data"]["content"]) == (b, "to b")
+        ws.send_json({"type": "unsubscribe", "rooms": [a]})
+        assert _next(ws, "unsubscribed")["rooms"] == [b]
+        send(a, "not for us")
+        send(b, "still for us")
+        assert _next(ws, "message:new")["data"]["content"] == "still for us"
+
+def test_subscriptions_are_indexed_both_ways_and_cleaned_up(client, room):
+    before = manager.snapshot()
+    with client.websocket_connect(f"/api/ws?rooms={room}") as ws:
+        ws.send_json({"type": "ping"})
+        assert _next(ws, "pong") == {"type": "pong"}
+        conn = next(c for c in manager.connections.values() if room in c.rooms)
+        assert conn in manager.rooms[room]
+        stats = manager.snapshot()
+        assert stats["connections"] == before["connections"] + 1
+        assert stats["memory_bytes_per_connection"] > 0
+        assert conn.memory() <= stats["max_memory_bytes_per_connection"]
+    stats = client.get("/api/realtime/stats").json()
+    assert stats["connections"] == before["connections"]
+    assert room not in manager.rooms
+
+def test_room_limit(client, room, monkeypatch):
+    monkeypatch.setattr(manager, "max_rooms", 2)
+    with client.websocket_connect("/api/ws") as ws:
+        ws.send_json({"type": "subscribe", "rooms": [room, room + 1000, room + 2000]})
+        reply = _next(ws, "subscribed")
+        assert reply["rooms"] == [room, room + 1000]
+        assert (reply["refused"], reply["max_rooms"]) == ([room + 2000], 2)
+
+def _send_frame(ws, room_id: int, client_id: str, content: str, **extra):
+    ws.send_json({"type": "message:send", "room_id": room_id, "client_id": client_id,
+                  "sender_id": "ws-u1", "sender_name": "WS U1", "content": content, **extra})
+
+def test_send_over_the_socket_is_acked_then_fanned_out(client, room):
+    with client.websocket_connect(f"/api/ws?rooms={room}") as sender, \
+            client.websocket_connect(f"/api/ws?rooms={room}") as other:
+        _send_frame(sender, room, "c-1", "over the socket")
+        ack = _next(sender, "message:ack")
+        assert (ack["client_id"], ack["room_id"], ack["duplicate"]) == ("c-1", room, False)
+        assert ack["timestamp"] and ack["seq"] > 0
+        frame = _next(other, "message:new")
+        assert frame["data"]["id"] == ack["id"] and frame["data"]["client_id"] == "c-1"
+        # The ack goes out before the broadcast, so the sender sees it first
+        assert _next(sender, "message:new")["data"]["id"] == ack["id"]
+    stored = client.get(f"/api/messages/{room}").json()
+    assert [(m["id"], m["content"]) for m in stored] == [(ack["id"], "over the socket")]
+
+def test_a_retried_client_id_is_stored_once(client, room, send):
+    with client.websocket_connect(f"/api/ws?rooms={room}") as ws:
+        _send_frame(ws, room, "c-retry", "once")
+        first = _next(ws, "message:ack")
+        assert _next(ws, "message:new")["data"]["id"] == first["id"]
+        _send_frame(ws, room, "c-retry", "once")
+        again = ws.receive_json()
+        assert again["type"] == "message:ack"
+        assert again["id"] == first["id"] and again["duplicate"] is True
+        # Same id through HTTP too, and neither retry is broadcast again
+        r = client.post(f"/api/messages/{room}", json={
+            "sender_id": "ws-u1", "sender_name": "WS U1", "content": "once", "client_id": "c-retry"})
+        assert r.json()["id"] == first["id"]
+        send(room, "next")
+        assert ws.receive_json()["data"]["content"] == "next"
+    assert len(client.get(f"/api/messages/{room}").json()) == 2
+
+def test_sends_are_rejected_with_the_client_id(client, room):
+    with client.websocket_connect(f"/api/ws?rooms={room}") as ws:
+        _send_frame(ws, room + 1000, "c-elsewhere", "x")
+        error = _next(ws, "message:error")
+        assert (error["client_id"], error["error"]) == ("c-elsewhere", "Not subscribed to room")
+        ws.send_json({"type": "message:send", "room_id": room, "content": "no client id"})
+        assert _next(ws, "message:error")["error"] == "client_id is required"
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db_pragmas, engine
+from app.writer import GroupCommitWriter
+
+def test_default_profile_is_applied_to_connections():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+
+def test_profiles_and_overrides(monkeypatch):
+    monkeypatch.setenv("MYCAMPUS_DB_PROFILE", "durable")
+    monkeypatch.setenv("MYCAMPUS_DB_MMAP_SIZE", "0")
+    pragmas = db_pragmas()
+    assert pragmas["synchronous"] == "FULL"
+    assert pragmas["mmap_size"] == "0"
+    monkeypatch.setenv("MYCAMPUS_DB_PROFILE", "legacy")
+    monkeypatch.delenv("MYCAMPUS_DB_MMAP_SIZE")
+    assert db_pragmas() == {}
+    monkeypatch.setenv("MYCAMPUS_DB_PROFILE", "fast")
+    with pytest.raises(ValueError):
+        db_pragmas()
+
+@pytest.fixture
+def scratch_table():
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS writer_test")
+        conn.exec_driver_sql("CREATE TABLE writer_test (id INTEGER PRIMARY KEY, v TEXT NOT NULL UNIQUE)")
+    yield "writer_test"
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE writer_test")
+
+def _insert(v: str):
+    async def job(session):
+        await session.execute(text("INSERT INTO writer_test (v) VALUES (:v)"), {"v": v})
+        return v
+    return job
+
+def test_group_commit_batches_jobs_and_isolates_failures(scratch_table):
+    async def run():
+        writer = GroupCommitWriter(max_batch=64, max_delay=0.01)
+        await writer.start()
+        try:
+            values = [f"v{n}" for n in range(20)] + ["v3"]
+            results = await asyncio.gather(*(writer.submit(_insert(v)) for v in values), return_exceptions=True)
+        finally:
+            await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(run())
+    assert results[:20] == [f"v{n}" for n in range(20)]
+    assert isinstance(results[20], IntegrityError)
+    assert writer.stats["jobs"] == 21
+    assert writer.stats["failed_jobs"] == 1
+    assert writer.stats["batches"] < 21
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM writer_test").scalar() == 20
@@ -138,8 +138,15 @@ const QuickChatPage = ({ currentUser }: { currentUser: User }) => {
         try {
             const apiBase = (import.meta as any).env?.VITE_API_URL as string | undefined;
             const wsBase = apiBase ? apiBase.replace(/^http/, 'ws').replace(/\/api$/, '') : 'ws://localhost:8000';
-            const ws = new WebSocket(`${wsBase}/ws/${selectedRoomId}`);
+            const identity = `user_id=${encodeURIComponent(currentUser.id)}&user_name=${encodeURIComponent(currentUser.name)}`;
+            const ws = new WebSocket(`${wsBase}/ws/${selectedRoomId}?${identity}`);
             wsRef.current = ws;
+            // Heartbeat so the server keeps our presence and notices dead sockets
+            const heartbeat = window.setInterval(() => {
+                if (ws.readyState === WebSocket.OPEN) {
+                    try { ws.send(JSON.stringify({ type: 'ping' })); } catch {}
+                }
+            }, 25000);
             ws.onmessage = (ev) => {
                 try {
                     const msg = JSON.parse(ev.data);
@@ -159,6 +166,16 @@ const QuickChatPage = ({ currentUser }: { currentUser: User }) => {
                         setMessages(prev => prev.map(m => m.id === msg.data.id ? { ...m, text: msg.data.content } : m));
                     } else if (msg.type === 'message:deleted' && msg.id) {
                         setMessages(prev => prev.filter(m => m.id !== msg.id));
+                    } else if (msg.type === 'typing' && Array.isArray(msg.users)) {
+                        // Server sends the full set of people typing whenever it changes
+                        const now = Date.now();
+                        const next: Record<string, number> = {};
+                        for (const u of msg.users) {
+                            const user = u?.name || u?.id;
+                            if (user) next[user] = typingUsersRef.current[user] ?? now;
+                        }
+                        typingUsersRef.current = next;
+                        setTypingUsersTick(t => t + 1);
                     } else if (msg.type === 'typing:start' || msg.type === 'typing:stop') {
                         const user = msg.user?.name || msg.user?.id;
                         if (!user) return;
@@ -173,6 +190,7 @@ const QuickChatPage = ({ currentUser }: { currentUser: User }) => {
             };
             ws.onclose = () => { wsRef.current = null; };
             return () => {
+                window.clearInterval(heartbeat);
                 try { ws.close(); } catch {}
                 wsRef.current = null;
                 typingUsersRef.current = {};